@@ -1,28 +1,64 @@
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import List, Optional
-import sqlite3
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.datastructures import MutableHeaders
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Literal, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
+import base64
+import binascii
+import contextvars
+import functools
 import json
-import threading
-import time
-from datetime import datetime
+import logging
+import math
+import re
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from email.utils import formatdate, parsedate_to_datetime
 import uuid
-import uvicorn
 from dotenv import load_dotenv
 import os
-import google.generativeai as genai
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from nltk.sentiment import SentimentIntensityAnalyzer
-import nltk
+import time
+import db
+import gemini
+import metrics
+import structured_log
+from outbox import OutboxDispatcher, PermanentDeliveryError
+from mailer import MailDispatcher, PreparedTemplate, SMTPConnectionPool
+from classification_batcher import MicroBatcher
+from classification_cache import ClassificationCache
+from dedup import Duplicate, IncidentDeduplicator
+from fast_classifier import FastClassifier
+from intake import IntakeQueue
+from leases import LeaseCoordinator
+from llm_scheduler import ELEVATED, ROUTINE, URGENT, LLMScheduler, SchedulerBusy
+from reminders import ReminderScheduler
+from response_cache import CachedResponse, ResponseCache
+from sentiment import SentimentEngine
+from ticketing import LOCAL_TICKET_PREFIX, CircuitBreaker, TicketClient, TicketReconciler
 
 # Load .env file
 load_dotenv()
 
-# Set Google API key
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+log = logging.getLogger("incidents")
+
+# Raw customer messages and Gemini responses are only logged when this is on (and LOG_LEVEL=DEBUG)
+LOG_DEBUG_PAYLOADS = os.getenv("LOG_DEBUG_PAYLOADS", "false").lower() == "true"
+
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup and shutdown (see LIFECYCLE below)"""
+    await start_up()
+    try:
+        yield
+    finally:
+        await shut_down()
+
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -30,7 +66,8 @@ app = FastAPI(
     description="Automates customer support incidents across Email, SMS, WhatsApp channels",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -40,9 +77,99 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Next-Offset", "X-Duplicate-Of", "Location", "Server-Timing",
+                    "ETag", "Last-Modified"],
 )
 
 
+HTTP_REQUEST_SECONDS = metrics.REGISTRY.histogram(
+    "http_request_seconds", "Time from request start to response headers", ("method", "route", "status"))
+
+
+class ServerTimingMiddleware:
+    """Collect per-stage timings for each request and return them as a Server-Timing header.
+
+    Plain ASGI rather than @app.middleware, so streaming request bodies and
+    responses pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = []
+        token = metrics.request_timings.set(timings)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - start
+                MutableHeaders(scope=message).append("Server-Timing", metrics.server_timing(timings, elapsed))
+                route = scope.get("route")
+                HTTP_REQUEST_SECONDS.observe(elapsed, method=scope["method"],
+                                             route=route.path if route else "unmatched",
+                                             status=message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            metrics.request_timings.reset(token)
+
+
+app.add_middleware(ServerTimingMiddleware)
+
+
+@app.exception_handler(SchedulerBusy)
+async def scheduler_busy_handler(request: Request, exc: SchedulerBusy):
+    """Gemini's queue is too long to wait in: ask the caller to come back instead of timing out"""
+    return JSONResponse({"detail": str(exc)}, status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))})
+
+
+@app.exception_handler(db.PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: db.PoolTimeout):
+    """Every database connection stayed busy: shed the request rather than queue behind them"""
+    return JSONResponse({"detail": "Database busy, retry shortly"}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        headers={"Retry-After": "1"})
+
+
+# ============================================================================
+# STAGE EXECUTORS (keep blocking calls off the event loop)
+# ============================================================================
+
+# Each blocking pipeline stage gets its own bounded pool so a slow backend
+# (Gemini, ticket API, SMTP) can only exhaust its own workers.
+STAGE_WORKERS = {
+    "sentiment": int(os.getenv("SENTIMENT_WORKERS", "4")),
+    "ticket": int(os.getenv("TICKET_WORKERS", "16")),
+    "db": int(os.getenv("DB_WORKERS", "4")),
+}
+
+stage_executors = {
+    stage: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{stage}-stage")
+    for stage, workers in STAGE_WORKERS.items()
+}
+
+
+async def timed_stage(name: str, awaitable):
+    """Await something under a metrics.stage timer (for stages run inside gather)"""
+    with metrics.stage(name):
+        return await awaitable
+
+
+async def run_stage(stage: str, func, *args, **kwargs):
+    """Run a blocking function on the executor reserved for a pipeline stage"""
+    loop = asyncio.get_running_loop()
+    # Carry context variables (the bound incident ID) into the worker thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(stage_executors[stage], functools.partial(context.run, func, *args, **kwargs))
+
+
 # ============================================================================
 # PYDANTIC MODELS (for API validation & Swagger docs)
 # ============================================================================
@@ -53,6 +180,9 @@ class IncidentRequest(BaseModel):
     message: str = Field(..., description="Customer's issue description", example="My credit card payment was deducted twice yesterday.")
     channel: str = Field(default="email", description="Communication channel", example="whatsapp")
     email: str = Field(default=None, description="Customer email address", example="customer@example.com")  # ← ADD THIS
+    idempotency_key: Optional[str] = Field(default=None, max_length=255,
+                                           description="Client-chosen key; resubmissions with it return the original incident",
+                                           example="webhook-delivery-7f3a9c")
 
 
 class ClassificationResult(BaseModel):
@@ -72,23 +202,53 @@ class IncidentResponse(BaseModel):
     message: str = Field(..., description="Response message")
 
 
+class IncidentAccepted(BaseModel):
+    """Incident accepted for background processing"""
+    incident_id: str = Field(..., description="Unique incident ID")
+    status: str = Field(..., description="`received`; poll GET /api/incidents/{incident_id} for progress")
+    message: str = Field(..., description="Response message")
+
+
+class BatchItemResult(BaseModel):
+    """Outcome of one incident in a bulk submission"""
+    index: int = Field(..., description="Position of the incident in the submitted batch")
+    status: int = Field(..., description="HTTP-style status for this item: 201, 200 for a repeat of an "
+                                         "earlier incident (returned as-is), 400, 409, 429 (Gemini busy, "
+                                         "resubmit later) or 500")
+    incident: Optional[IncidentResponse] = None
+    error: Optional[str] = None
+
+
+class BatchIncidentResponse(BaseModel):
+    """Bulk incident creation response"""
+    created: int = Field(..., description="Number of incidents created")
+    duplicates: int = Field(..., description="Number of repeats answered with an earlier incident")
+    failed: int = Field(..., description="Number of incidents rejected or failed")
+    results: List[BatchItemResult]
+
+
 class IncidentDetail(BaseModel):
-    """Incident details"""
+    """Incident details (classification, sentiment and ticket are null until an accepted incident is processed)"""
     id: str
     customer_id: str
     channel: str
     message: str
-    classification: str
-    confidence: float
-    sentiment: str              # ← ADD THIS
-    polarity: float             # ← ADD THIS
-    ticket_id: str
-    status: str
+    classification: Optional[str] = None
+    confidence: Optional[float] = None
+    sentiment: Optional[str] = None
+    polarity: Optional[float] = None
+    ticket_id: Optional[str] = None
+    status: str = Field(..., description="received | processing | failed (accepted with 202), open | resolved")
     created_at: str
     resolved_at: Optional[str] = None
     reminder_sent: int
 
 
+class IncidentSearchHit(IncidentDetail):
+    """Incident matching a full-text search"""
+    score: float = Field(..., description="Relevance (negated FTS5 bm25); higher is better")
+
+
 class NotificationRecord(BaseModel):
     """Notification record"""
     id: str
@@ -97,93 +257,59 @@ class NotificationRecord(BaseModel):
     message: str
     status: str
     sent_at: str
+    created_at: Optional[str] = None
 
 
 # ============================================================================
-# DATABASE SETUP
+# MOCK NOTIFICATION SYSTEM
 # ============================================================================
 
-def init_db():
-    """Initialize SQLite database with required tables"""
-    conn = sqlite3.connect('incidents.db')
-    c = conn.cursor()
-
-    c.execute('''CREATE TABLE IF NOT EXISTS incidents (
-        id TEXT PRIMARY KEY,
-        customer_id TEXT NOT NULL,
-        channel TEXT NOT NULL,
-        message TEXT NOT NULL,
-        classification TEXT NOT NULL,
-        confidence REAL NOT NULL,
-        sentiment TEXT,
-        polarity REAL,
-        ticket_id TEXT,
-        status TEXT DEFAULT 'open',
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        resolved_at TIMESTAMP,
-        reminder_sent BOOLEAN DEFAULT 0
-    )''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS notifications (
-        id TEXT PRIMARY KEY,
-        incident_id TEXT NOT NULL,
-        channel TEXT NOT NULL,
-        message TEXT NOT NULL,
-        status TEXT DEFAULT 'sent',
-        sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY(incident_id) REFERENCES incidents(id)
-    )''')
-
-    conn.commit()
-    conn.close()
-
-
-init_db()
+NOTIFICATION_CHANNELS = ('email', 'sms', 'whatsapp')
 
 
-# ============================================================================
-# MOCK NOTIFICATION SYSTEM
-# ============================================================================
+def build_notification(incident_id: str, ticket_id: str, channel: str, message: str,
+                       customer_email: str = None) -> tuple:
+    """Outbox row for one notification: (id, incident_id, channel, message, recipient, ticket_id)"""
+    return (str(uuid.uuid4()), incident_id, channel.lower(), message, customer_email, ticket_id)
+
 
 def send_notification(incident_id: str, ticket_id: str, channel: str, message: str, customer_email: str = None) -> str:
-    """Send notifications across different channels"""
-    notification_id = str(uuid.uuid4())
-
-    # Store in database
-    conn = sqlite3.connect('incidents.db')
-    c = conn.cursor()
-    c.execute('''INSERT INTO notifications (id, incident_id, channel, message, status)
-                 VALUES (?, ?, ?, ?, 'sent')''',
-              (notification_id, incident_id, channel, message))
-    conn.commit()
-    conn.close()
-
-    # Send actual notification based on channel
-    if channel.lower() == 'email' and customer_email:
-        send_email(customer_email, incident_id, ticket_id, message)  # ← Added ticket_id
-    elif channel.lower() == 'sms':
+    """Queue a notification in the outbox; the channel's workers send it"""
+    if channel.lower() not in NOTIFICATION_CHANNELS:
+        log.warning("unsupported notification channel", extra={"channel": channel})
+        return None
+
+    row = build_notification(incident_id, ticket_id, channel, message, customer_email)
+    db.enqueue_notifications([row])
+    notification_outbox.wake([row[2]])
+    return row[0]
+
+
+def deliver_notification(channel: str, recipient: str, incident_id: str, ticket_id: str, message: str):
+    """Send one outbox notification; raising lets the outbox retry or fail it"""
+    if channel == 'email':
+        if not recipient:
+            raise PermanentDeliveryError("no customer email address")
+        future = send_email(recipient, incident_id, ticket_id, message)
+        if future is None:
+            raise PermanentDeliveryError("email credentials not configured")
+        import smtplib  # already loaded by the mail pool that ran the send
+        try:
+            future.result()
+        except smtplib.SMTPAuthenticationError:
+            raise PermanentDeliveryError("email auth error: check SENDER_EMAIL and SENDER_PASSWORD in .env")
+    elif channel == 'sms':
         send_sms_mock(message)
-    elif channel.lower() == 'whatsapp':
+    elif channel == 'whatsapp':
         send_whatsapp_mock(message)
+    else:
+        raise PermanentDeliveryError(f"unsupported channel {channel}")
 
-    print(f"[{channel.upper()}] Sent to customer: {message[:50]}...")
-    return notification_id
-
-
-def send_email(recipient_email: str, incident_id: str, ticket_id: str, message: str) -> bool:
-    """Send actual email to customer"""
-    try:
-        sender_email = os.getenv("SENDER_EMAIL")
-        sender_password = os.getenv("SENDER_PASSWORD")
-
-        if not sender_email or not sender_password:
-            print(f"⚠️  Email credentials not configured in .env")
-            return False
+    log.info("notification sent", extra={"incident_id": incident_id, "channel": channel})
 
-        # Create professional email
-        subject = f"Support Ticket #{ticket_id} - Issue Received"
 
-        body = f"""Hello,
+# Ticket acknowledgement email, split into static and variable parts once at import
+TICKET_EMAIL_TEMPLATE = PreparedTemplate("""Hello,
 
 Thank you for reaching out to us. We have received your support request and we're here to help.
 
@@ -194,7 +320,7 @@ TICKET DETAILS
 Ticket ID: {ticket_id}
 Incident Reference: {incident_id}
 Status: Open (Under Investigation)
-Received: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}
+Received: {received}
 
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 YOUR ISSUE
@@ -219,111 +345,126 @@ We appreciate your patience and will resolve this as quickly as possible.
 
 Best regards,
 Customer Support Team
-support@company.com"""
-
-        # Setup email
-        msg = MIMEMultipart('alternative')
-        msg['From'] = sender_email
-        msg['To'] = recipient_email
-        msg['Subject'] = subject
+support@company.com""")
+
+mail_dispatcher = MailDispatcher(
+    SMTPConnectionPool(
+        host=os.getenv("SMTP_HOST", "smtp.gmail.com"),
+        port=int(os.getenv("SMTP_PORT", "465")),
+        username=os.getenv("SENDER_EMAIL"),
+        password=os.getenv("SENDER_PASSWORD"),
+        use_ssl=os.getenv("SMTP_USE_SSL", "true").lower() == "true",
+        size=int(os.getenv("SMTP_POOL_SIZE", "4")),
+    ),
+    sender=os.getenv("SENDER_EMAIL"),
+    concurrency=int(os.getenv("MAIL_CONCURRENCY", "4")),
+)
 
-        # Attach plain text
-        msg.attach(MIMEText(body, 'plain'))
 
-        # Send email via Gmail SMTP
-        server = smtplib.SMTP_SSL('smtp.gmail.com', 465)
-        server.login(sender_email, sender_password)
-        server.send_message(msg)
-        server.quit()
+def send_email(recipient_email: str, incident_id: str, ticket_id: str, message: str):
+    """Queue an email to the customer on the pooled SMTP dispatcher.
 
-        print(f"✅ Email sent successfully to {recipient_email}")
-        return True
+    Returns the dispatcher Future, or None when credentials are missing.
+    """
+    if not mail_dispatcher.sender or not mail_dispatcher.pool.password:
+        log.warning("email credentials not configured in .env", extra={"incident_id": incident_id})
+        return None
+
+    # Create professional email
+    subject = f"Support Ticket #{ticket_id} - Issue Received"
+    body = TICKET_EMAIL_TEMPLATE.render(
+        ticket_id=ticket_id,
+        incident_id=incident_id,
+        received=datetime.now().strftime('%B %d, %Y at %I:%M %p'),
+        message=message,
+    )
 
-    except smtplib.SMTPAuthenticationError:
-        print(f"❌ Email Auth Error: Check SENDER_EMAIL and SENDER_PASSWORD in .env")
-        return False
-    except Exception as e:
-        print(f"❌ Email Error: {e}")
-        return False
+    return mail_dispatcher.submit(recipient_email, subject, body)
 
 def send_sms_mock(message: str) -> bool:
     """Mock SMS sending (for production, use Twilio)"""
-    print(f"📱 SMS (Mock): {message[:50]}...")
+    log.debug("sms (mock) sent")
     return True
 
 
 def send_whatsapp_mock(message: str) -> bool:
     """Mock WhatsApp sending (for production, use Twilio)"""
-    print(f"💬 WhatsApp (Mock): {message[:50]}...")
+    log.debug("whatsapp (mock) sent")
     return True
 
 
-def send_multi_channel(incident_id: str, customer_id: str,
-                       ticket_id: str,
-                       customer_email: str = None,
-                       channels: List[str] = None):
-    """Send acknowledgment across multiple channels"""
+def acknowledgement_notifications(incident_id: str, ticket_id: str,
+                                  customer_email: str = None,
+                                  channels: List[str] = None) -> list:
+    """Outbox rows acknowledging a new incident across multiple channels"""
     if channels is None:
         channels = ['email', 'sms']
 
     message = (f"Payment issue reported. Ticket #{ticket_id} created. Our team is investigating."
                f" We will contact you within 24 hours.")
 
-    for channel in channels:
-        send_notification(incident_id, ticket_id, channel, message, customer_email=customer_email)  # ← Added ticket_id
+    return [build_notification(incident_id, ticket_id, channel, message, customer_email=customer_email)
+            for channel in channels if channel.lower() in NOTIFICATION_CHANNELS]
+
+
+notification_outbox = OutboxDispatcher(
+    deliver_notification,
+    workers_per_channel={
+        'email': int(os.getenv("OUTBOX_EMAIL_WORKERS", "4")),
+        'sms': int(os.getenv("OUTBOX_SMS_WORKERS", "4")),
+        'whatsapp': int(os.getenv("OUTBOX_WHATSAPP_WORKERS", "4")),
+    },
+    max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5")),
+)
 
 ## ============================================================================
 # Sentiment Analysis
 # ============================================================================
 
+sentiment_engine = SentimentEngine(memo_size=int(os.getenv("SENTIMENT_MEMO_SIZE", "4096")))
+
+
 def analyze_sentiment(message: str) -> dict:
     """Analyze customer sentiment using VADER"""
 
     try:
-        try:
-            nltk.data.find('sentiment/vader_lexicon')
-        except LookupError:
-            nltk.download('vader_lexicon', quiet=True)
-
-        sia = SentimentIntensityAnalyzer()
-        scores = sia.polarity_scores(message)
-        compound = scores['compound']
-
-        if compound >= 0.05:
-            sentiment = "positive"
-        elif compound <= -0.05:
-            sentiment = "negative"
-        else:
-            sentiment = "neutral"
-
-        return {
-            "sentiment": sentiment,
-            "compound": round(compound, 2)
-        }
+        return sentiment_engine.score(message)
     except Exception as e:
-        print(f"❌ Sentiment Analysis Error: {e}")
+        log.error("sentiment analysis error: %s", e)
         return {
             "sentiment": "neutral",
             "compound": 0.0
         }
 
+
+def analyze_sentiment_batch(messages: List[str]) -> List[dict]:
+    """Score a list of messages with the shared VADER engine"""
+    try:
+        return sentiment_engine.score_batch(messages)
+    except Exception as e:
+        log.error("sentiment analysis error: %s", e)
+        return [{"sentiment": "neutral", "compound": 0.0} for _ in messages]
+
 # ============================================================================
 # LLM CLASSIFICATION (MAIN INTELLIGENCE)
 # ============================================================================
 
-def classify_incident(message: str) -> dict:
-    """Use Google Gemini to classify the incident and extract details"""
-
-    prompt = f"""You are an incident classification expert for a fintech customer service team.
+MODEL_NAME = 'gemini-2.0-flash'  # the free Gemini model
+PROMPT_VERSION = "v2"            # bump whenever the instructions below change
 
-Classify the following customer message into ONE category and provide a confidence score between 0.0 and 1.0.
-
-Customer Message: "{message}"
+classification_cache = ClassificationCache(
+    memory_size=int(os.getenv("CLASSIFY_CACHE_MEMORY_SIZE", "10000")),
+    max_rows=int(os.getenv("CLASSIFY_CACHE_MAX_ROWS", "100000")),
+    ttl_seconds=int(os.getenv("CLASSIFY_CACHE_TTL_SECONDS", str(7 * 86400))),
+)
 
-CLASSIFICATION TASK:
-Analyze the customer message and classify it into ONE of these categories:
+# Local rules/model answer confident cases in microseconds, skipping Gemini
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "false").lower() == "true"
+fast_classifier = FastClassifier.load(os.getenv("FAST_PATH_MODEL", "fast_classifier_model.json"),
+                                      threshold=float(os.getenv("FAST_PATH_THRESHOLD", "0.9")))
 
-1. duplicate_payment - Customer was charged multiple times for the same transaction/service
+# Category taxonomy shared by the single-message and batch prompts
+CATEGORY_GUIDE = """1. duplicate_payment - Customer was charged multiple times for the same transaction/service
    Examples: "charged twice", "double billed", "money deducted twice"
 
 2. failed_payment - Payment transaction failed but money was still deducted from account
@@ -341,26 +482,104 @@ Analyze the customer message and classify it into ONE of these categories:
 6. statement_error - Discrepancy in account balance or statement
    Examples: "balance is wrong", "statement doesn't match", "missing transaction"
 
-7. other - Message doesn't fit any of the above categories
+7. other - Message doesn't fit any of the above categories"""
+
+# The static part of both prompts lives on the model handle (see gemini.py), so
+# each request carries only the customer message(s)
+CLASSIFY_INSTRUCTIONS = f"""You are an incident classification expert for a fintech customer service team.
+
+Classify the customer message into ONE of these categories and provide a confidence score between 0.0 and 1.0:
+
+{CATEGORY_GUIDE}
 
 Respond with ONLY valid JSON, no markdown, no extra text:
 {{"category": "one_of_the_categories_above", "confidence": 0.95, "reason": "2-3 word explanation"}}"""
 
+CLASSIFY_BATCH_INSTRUCTIONS = f"""You are an incident classification expert for a fintech customer service team.
+
+Classify EACH of the numbered customer messages into ONE of these categories and provide a confidence score between 0.0 and 1.0:
+
+{CATEGORY_GUIDE}
+
+Respond with ONLY a valid JSON array containing one object per message, no markdown, no extra text:
+[{{"index": 1, "category": "one_of_the_categories_above", "confidence": 0.95, "reason": "2-3 word explanation"}}]"""
+
+classifier_model = gemini.InstructedModel("classify", MODEL_NAME, CLASSIFY_INSTRUCTIONS,
+                                          {"temperature": 0.1, "max_output_tokens": 200})
+batch_classifier_model = gemini.InstructedModel("classify_batch", MODEL_NAME, CLASSIFY_BATCH_INSTRUCTIONS,
+                                                {"temperature": 0.1})
+
+
+def warm_gemini():
+    """Import the SDK and create both model handles"""
+    classifier_model.handle()
+    batch_classifier_model.handle()
+
+
+# Every Gemini request takes a slot from the scheduler: a token bucket for the model's quota
+# plus a cap on requests in flight, granted to the most urgent waiter first (see llm_scheduler.py)
+CLASSIFY_CONCURRENCY = int(os.getenv("CLASSIFY_CONCURRENCY", "16"))
+# The quota is per API key and each worker process has its own bucket, so every worker gets an equal share.
+# uvicorn and gunicorn both take their worker count from WEB_CONCURRENCY when --workers is not given.
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+gemini_scheduler = LLMScheduler(
+    rate_per_minute=float(os.getenv("GEMINI_RATE_PER_MINUTE", "0")) / WEB_CONCURRENCY,
+    burst=int(os.getenv("GEMINI_RATE_BURST", "1")),
+    concurrency=CLASSIFY_CONCURRENCY,
+)
+# A request that would queue longer than this for Gemini is answered 429 instead
+GEMINI_MAX_WAIT_SECONDS = float(os.getenv("GEMINI_MAX_WAIT_SECONDS", "10"))
+# After Gemini answers 429, nothing is sent for this long; the request is retried once
+GEMINI_RATE_LIMIT_PAUSE_SECONDS = float(os.getenv("GEMINI_RATE_LIMIT_PAUSE_SECONDS", "5"))
+
+# Fraud reports jump the queue, then negative messages
+URGENT_MESSAGE = re.compile(r"\b(fraud\w*|unauthori[sz]ed|stolen|scam\w*|hacked|phishing|identity theft)\b",
+                            re.IGNORECASE)
+
+# Optional micro-batching: one Gemini request for messages arriving together
+CLASSIFY_BATCH_ENABLED = os.getenv("CLASSIFY_BATCH_ENABLED", "false").lower() == "true"
+CLASSIFY_BATCH_MAX_SIZE = int(os.getenv("CLASSIFY_BATCH_MAX_SIZE", "8"))
+CLASSIFY_BATCH_WINDOW_MS = int(os.getenv("CLASSIFY_BATCH_WINDOW_MS", "50"))
+_classification_batcher = None
+
+
+def classification_priority(message: str, sentiment: dict) -> int:
+    """Scheduler priority of a message's Gemini request"""
+    if URGENT_MESSAGE.search(message):
+        return URGENT
+    return ELEVATED if sentiment['sentiment'] == 'negative' else ROUTINE
+
+
+async def _scheduled_generate(model: gemini.InstructedModel, service: str, content: str, priority: int,
+                              max_wait: Optional[float], **generation_config):
+    """Call Gemini in a scheduler slot; a rate-limit reply pauses the scheduler and is retried once"""
+    for attempt in (1, 2):
+        async with gemini_scheduler.slot(priority, max_wait):
+            try:
+                with metrics.external_call(service):
+                    return await model.generate(content, **generation_config)
+            except Exception as e:
+                if attempt == 2 or not gemini.is_rate_limited(e):
+                    raise
+                log.warning("gemini rate limited, pausing for %ss", GEMINI_RATE_LIMIT_PAUSE_SECONDS)
+                gemini_scheduler.penalize(GEMINI_RATE_LIMIT_PAUSE_SECONDS)
+
+
+async def _classify_with_gemini(message: str, priority: int = ROUTINE, max_wait: Optional[float] = None):
+    """Use Google Gemini to classify the incident and extract details.
+
+    Returns (ok, result); ok is False for the "other"/0.3 error fallbacks.
+    Raises SchedulerBusy if no Gemini slot frees up within max_wait seconds.
+    """
+
     try:
-        # Use the free gemini-2.0-flash model
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.1,
-                max_output_tokens=200,
-            )
-        )
+        response = await _scheduled_generate(classifier_model, "gemini", f'Customer Message: "{message}"',
+                                             priority, max_wait)
 
         # Check if response is empty
         if not response or not response.candidates or len(response.candidates) == 0:
-            print(f"❌ Empty response from Gemini")
-            return {
+            log.error("empty response from Gemini")
+            return False, {
                 "category": "other",
                 "confidence": 0.3,
                 "reason": "Empty response"
@@ -368,84 +587,182 @@ Respond with ONLY valid JSON, no markdown, no extra text:
 
         # Get text safely
         if not response.candidates[0].content or not response.candidates[0].content.parts:
-            print(f"❌ No content in response")
-            return {
+            log.error("no content in Gemini response")
+            return False, {
                 "category": "other",
                 "confidence": 0.3,
                 "reason": "No content"
             }
 
         response_text = response.candidates[0].content.parts[0].text.strip()
-        print(f"[DEBUG] Google Gemini Response: {response_text}")
+        if LOG_DEBUG_PAYLOADS:
+            log.debug("gemini response", extra={"payload": response_text})
 
         # Remove markdown code blocks if present
         if response_text.startswith("```"):
             # Remove ```json or ``` at start
             response_text = response_text.replace("```json", "").replace("```", "").strip()
 
-        print(f"[DEBUG] Cleaned Response: {response_text}")
-
         # Try to parse JSON
         result = json.loads(response_text)
 
         # Validate response
         if "category" in result and "confidence" in result:
-            return result
+            return True, result
         else:
-            return {
+            return False, {
                 "category": "other",
                 "confidence": 0.3,
                 "reason": "Invalid response format"
             }
 
+    except SchedulerBusy:
+        raise
     except json.JSONDecodeError as e:
-        print(f"❌ JSON Parse Error: {e}")
-        print(f"   Response was: {response_text if 'response_text' in locals() else 'N/A'}")
-        return {
+        log.error("gemini JSON parse error: %s", e,
+                  extra={"payload": response_text} if LOG_DEBUG_PAYLOADS else None)
+        return False, {
             "category": "other",
             "confidence": 0.3,
             "reason": "Parse failed"
         }
     except IndexError as e:
-        print(f"❌ Index Error (Empty Response): {e}")
-        return {
+        log.error("empty response from Gemini: %s", e)
+        return False, {
             "category": "other",
             "confidence": 0.3,
             "reason": "Empty response from API"
         }
     except Exception as e:
-        print(f"❌ Google Gemini API Error: {e}")
-        print(f"   Error type: {type(e).__name__}")
-        return {
+        log.error("gemini API error: %s", e, extra={"error_type": type(e).__name__})
+        return False, {
             "category": "other",
             "confidence": 0.3,
             "reason": "API error"
         }
+
+
+def _parse_batch_response(response_text: str, count: int) -> list:
+    """Map a JSON array reply onto message positions; unusable items become None"""
+    if response_text.startswith("```"):
+        response_text = response_text.replace("```json", "").replace("```", "").strip()
+    try:
+        items = json.loads(response_text)
+    except json.JSONDecodeError as e:
+        log.error("gemini batch JSON parse error: %s", e,
+                  extra={"payload": response_text} if LOG_DEBUG_PAYLOADS else None)
+        return [None] * count
+    if not isinstance(items, list):
+        return [None] * count
+
+    results = [None] * count
+    for position, item in enumerate(items):
+        if not isinstance(item, dict) or "category" not in item or "confidence" not in item:
+            continue
+        index = item.get("index", position + 1)
+        if isinstance(index, int) and 1 <= index <= count and results[index - 1] is None:
+            results[index - 1] = {
+                "category": item["category"],
+                "confidence": item["confidence"],
+                "reason": item.get("reason", ""),
+            }
+    return results
+
+
+async def _classify_batch_with_gemini(items: list) -> list:
+    """Classify several (message, priority, max_wait) items with a single Gemini request"""
+    messages = [message for message, _, _ in items]
+    numbered = "\n".join(f'{i}. {json.dumps(m, ensure_ascii=False)}' for i, m in enumerate(messages, start=1))
+    # The batch goes at its most urgent member's priority, waiting as long as its most patient member
+    waits = [max_wait for _, _, max_wait in items]
+    try:
+        response = await _scheduled_generate(batch_classifier_model, "gemini_batch", f"Customer Messages:\n{numbered}",
+                                             min(priority for _, priority, _ in items),
+                                             None if None in waits else max(waits),
+                                             max_output_tokens=200 * len(messages))
+    except SchedulerBusy:
+        return [None] * len(messages)  # each message retries alone, with its own wait limit
+
+    if not response or not response.candidates or not response.candidates[0].content \
+            or not response.candidates[0].content.parts:
+        return [None] * len(messages)
+    return _parse_batch_response(response.candidates[0].content.parts[0].text.strip(), len(messages))
+
+
+def _get_classification_batcher() -> MicroBatcher:
+    """Create the batcher lazily, inside the running event loop"""
+    global _classification_batcher
+    if _classification_batcher is None:
+        _classification_batcher = MicroBatcher(_classify_batch_with_gemini,
+                                               max_batch=CLASSIFY_BATCH_MAX_SIZE,
+                                               window_seconds=CLASSIFY_BATCH_WINDOW_MS / 1000)
+    return _classification_batcher
+
+
+async def classify_incident(message: str, priority: int = ROUTINE,
+                            max_wait: Optional[float] = GEMINI_MAX_WAIT_SECONDS) -> dict:
+    """Classify an incident: local fast path, then the cache, then Gemini.
+
+    The result's "source" key records which of them answered. A Gemini
+    request queues at `priority`; SchedulerBusy is raised if it would wait
+    longer than `max_wait` seconds (None: wait as long as it takes).
+    """
+    result = await _classify(message, priority, max_wait)
+    metrics.CLASSIFICATIONS.inc(source=result["source"])
+    return result
+
+
+async def _classify(message: str, priority: int, max_wait: Optional[float]) -> dict:
+    if FAST_PATH_ENABLED:
+        local = fast_classifier.classify(message)
+        if local is not None:
+            return {**local, "source": "fast_path"}
+
+    key = classification_cache.make_key(message, PROMPT_VERSION, MODEL_NAME)
+    cached = classification_cache.get_memory(key)
+    if cached is None:
+        cached = await run_stage("db", classification_cache.get_persistent, key)
+    if cached is not None:
+        return {**cached, "source": "cache"}
+
+    result = None
+    if CLASSIFY_BATCH_ENABLED:
+        result = await _get_classification_batcher().submit((message, priority, max_wait))
+    if result is not None:
+        ok = True
+    else:
+        # Batching disabled, or this message came back malformed from its batch
+        ok, result = await _classify_with_gemini(message, priority, max_wait)
+
+    # Error fallbacks are never cached, so the next attempt retries Gemini
+    if ok:
+        await run_stage("db", classification_cache.put, key, result)
+    return {**result, "source": "gemini" if ok else "fallback"}
+
 # ============================================================================
 # MOCK TICKET CREATION
 # ============================================================================
 
-def create_ticket_mock(incident_id: str, classification: str, message: str) -> str:
-    """Simulate ticket creation (in real world, POST to external API)"""
-    import requests
-
-    payload = {
-        "name": f"Incident {incident_id}: {classification}",
-        "description": message,
-        "status": "open"
-    }
+ticket_client = TicketClient(
+    os.getenv("TICKET_API_URL", "https://reqres.in/api/tickets"),
+    timeout=float(os.getenv("TICKET_TIMEOUT_SECONDS", "5")),
+    pool_size=STAGE_WORKERS["ticket"],
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("TICKET_BREAKER_FAILURES", "5")),
+        reset_seconds=float(os.getenv("TICKET_BREAKER_RESET_SECONDS", "30")),
+    ),
+)
+ticket_reconciler = TicketReconciler(
+    ticket_client,
+    interval_seconds=float(os.getenv("TICKET_RECONCILE_INTERVAL_SECONDS", "60")),
+)
 
-    try:
-        response = requests.post('https://reqres.in/api/tickets', json=payload, timeout=5)
-        if response.status_code == 201:
-            ticket_data = response.json()
-            ticket_id = str(ticket_data.get('id', str(uuid.uuid4())))
-            print(f"✓ Ticket created: {ticket_id}")
-            return ticket_id
-    except Exception as e:
-        print(f"Ticket API error: {e}")
 
-    ticket_id = f"TKT-{str(uuid.uuid4())[:8]}"
+def create_ticket_mock(incident_id: str, classification: str, message: str) -> str:
+    """Create a ticket in the external system, or a local TKT- ID if it is unavailable"""
+    ticket_id = ticket_client.create_ticket(incident_id, classification, message)
+    if not ticket_id.startswith(LOCAL_TICKET_PREFIX):
+        log.info("ticket created", extra={"incident_id": incident_id, "ticket_id": ticket_id})
     return ticket_id
 
 
@@ -453,38 +770,105 @@ def create_ticket_mock(incident_id: str, classification: str, message: str) -> s
 # 24-HOUR REMINDER SYSTEM
 # ============================================================================
 
-reminder_threads = {}
+def deliver_reminder(incident_id: str, c_email: str, channel: str, ticket_id: str):
+    """Send the reminder for an incident that is still open after 24 hours"""
+    reminder_msg = f"Reminder: Your ticket #{ticket_id} is still open. We're working on resolving your issue."
+    send_notification(incident_id, ticket_id, channel, reminder_msg, customer_email=c_email)
+
+
+reminder_scheduler = ReminderScheduler(
+    deliver_reminder,
+    delay_seconds=int(os.getenv("REMINDER_DELAY_SECONDS", "86400")),  # 40 for testing
+    batch_size=int(os.getenv("REMINDER_BATCH_SIZE", "100")),
+)
+
+# With `uvicorn --workers N` every process serves requests, but each background
+# duty runs in one of them at a time (see leases.py)
+background_leases = LeaseCoordinator(
+    ttl_seconds=float(os.getenv("LEASE_TTL_SECONDS", "30")),
+    renew_seconds=float(os.getenv("LEASE_RENEW_SECONDS", "10")),
+)
+background_leases.add("reminders", reminder_scheduler.start, reminder_scheduler.stop)
+background_leases.add("outbox", notification_outbox.start, notification_outbox.stop)
+background_leases.add("ticket-reconciler", ticket_reconciler.start, ticket_reconciler.stop)
 
 
 def schedule_24h_reminder(incident_id: str, c_email: str, channel: str, ticket_id: str):
     """Schedule a 24-hour reminder for unresolved incidents"""
+    reminder_scheduler.schedule(incident_id, c_email, channel, ticket_id)
+
+
+# ============================================================================
+# LIFECYCLE
+# ============================================================================
 
-    def check_and_remind():
-        time.sleep(86400)  # Wait 24 hours
-        # time.sleep(40)
+# Components warmed at startup: name -> {"status", "seconds", "error"}
+warmup_status = {}
+lifecycle_state = "starting"  # -> "serving" -> "stopping"
 
-        # Check if incident still open
-        conn = sqlite3.connect('incidents.db')
-        c = conn.cursor()
-        c.execute('SELECT status FROM incidents WHERE id = ?', (incident_id,))
-        row = c.fetchone()
-        conn.close()
 
-        if row and row[0] == 'open':
-            reminder_msg = f"Reminder: Your ticket #{ticket_id} is still open. We're working on resolving your issue."
+async def warm_component(name: str, func) -> bool:
+    """Run one blocking initializer on the default executor and record how it went"""
+    warmup_status[name] = {"status": "warming"}
+    start = time.perf_counter()
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, func)
+    except Exception as e:
+        warmup_status[name] = {"status": "failed", "seconds": round(time.perf_counter() - start, 3),
+                               "error": str(e)}
+        log.exception("warmup of %s failed", name)
+        return False
+    warmup_status[name] = {"status": "ready", "seconds": round(time.perf_counter() - start, 3)}
+    return True
+
 
-            # CORRECT call with ticket_id
-            send_notification(incident_id, ticket_id, channel, reminder_msg, customer_email=c_email)
+def configure_logging():
+    """Start the log writer thread; done in the lifespan hook so importing the app starts no threads"""
+    structured_log.configure(level=os.getenv("LOG_LEVEL", "INFO"), fmt=os.getenv("LOG_FORMAT", "json"))
 
-            # Mark reminder as sent
-            conn = sqlite3.connect('incidents.db')
-            c = conn.cursor()
-            c.execute('UPDATE incidents SET reminder_sent = 1 WHERE id = ?', (incident_id,))
-            conn.commit()
-            conn.close()
 
-    thread = threading.Thread(target=check_and_remind, daemon=True)
-    thread.start()
+async def start_up():
+    """Migrate the DB, then warm the VADER lexicon and Gemini handle in parallel.
+
+    Serving starts as soon as the schema is in place; the lexicon and model
+    handle finish in the background. Until they do, /ready answers 503 while
+    /health (liveness) already answers 200, and a request arriving in between
+    initializes whatever it needs itself. The DB step runs alone because
+    both warmers are CPU-bound imports that would hold it up on the GIL.
+    """
+    global lifecycle_state
+    start = time.perf_counter()
+    configure_logging()
+    warmup_status.update((name, {"status": "pending"}) for name in ("db", "sentiment", "gemini"))
+    if not await warm_component("db", db.init_db):
+        raise RuntimeError("database initialization failed")
+    background = [asyncio.create_task(warm_component("sentiment", sentiment_engine.warm)),
+                  asyncio.create_task(warm_component("gemini", warm_gemini))]
+
+    # Background workers run in whichever process holds their lease: reminders persisted
+    # before the last shutdown are resumed, pending notifications sent, accepted incidents
+    # processed, and local TKT- IDs swapped for real tickets
+    intake_queue.bind(asyncio.get_running_loop())
+    await asyncio.get_running_loop().run_in_executor(None, background_leases.start)
+    lifecycle_state = "serving"
+
+    async def report_ready():
+        await asyncio.gather(*background)
+        log.info("ready", extra={"warmup_seconds": round(time.perf_counter() - start, 3),
+                                 "components": warmup_status})
+
+    app.state.warmup = asyncio.create_task(report_ready())
+
+
+async def shut_down():
+    global lifecycle_state
+    lifecycle_state = "stopping"
+    app.state.warmup.cancel()
+    await intake_queue.drain()  # unfinished runs are requeued by the next lease holder
+    background_leases.stop()
+    ticket_client.close()
+    mail_dispatcher.stop()
+    structured_log.shutdown()  # drain queued log records before the process exits
 
 
 # ============================================================================
@@ -493,16 +877,408 @@ def schedule_24h_reminder(incident_id: str, c_email: str, channel: str, ticket_i
 
 @app.get("/health", tags=["Health"])
 async def health_check():
-    """Check if service is running"""
+    """Liveness: the process is up and serving requests"""
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
 
+@app.get("/ready", tags=["Health"])
+async def readiness_check(response: Response):
+    """Readiness: DB migrated, VADER lexicon and Gemini handle warmed, not shutting down"""
+    ready = lifecycle_state == "serving" and all(c["status"] == "ready" for c in warmup_status.values())
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    state = "ready" if ready else "warming" if lifecycle_state == "serving" else lifecycle_state
+    return {"status": state, "components": warmup_status}
+
+
+# ============================================================================
+# BULK INGESTION
+# ============================================================================
+
+INGEST_MAX_BATCH = int(os.getenv("INGEST_MAX_BATCH", "500"))
+INGEST_STREAM_CHUNK = int(os.getenv("INGEST_STREAM_CHUNK", "100"))
+
+# Repeats (same idempotency key, or same customer and message within the window)
+# get the original's response instead of a second run of the pipeline
+incident_dedup = IncidentDeduplicator(
+    window_seconds=float(os.getenv("DEDUP_WINDOW_SECONDS", "3600")),
+    key_ttl_seconds=float(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", "86400")),
+)
+DEDUP_WAIT_SECONDS = float(os.getenv("DEDUP_WAIT_SECONDS", "30"))
+
+
+def incident_response(incident_id: str, ticket_id: str, category: str, confidence: float, sentiment: str) -> dict:
+    """Body returned for a newly created incident"""
+    return {
+        "incident_id": incident_id,
+        "ticket_id": ticket_id,
+        "status": "open",
+        "classification": category,
+        "confidence": confidence,
+        "message": f"Incident received and ticket created. Sentiment: {sentiment}. Acknowledgments queued for email and SMS."
+    }
+
+
+async def wait_for_original(duplicate: Duplicate, keys: list) -> Optional[Duplicate]:
+    """Poll the index until an in-flight original stores its response.
+
+    Returns None if the original failed and released its keys; raises 409
+    if it is still running after DEDUP_WAIT_SECONDS.
+    """
+    deadline = time.monotonic() + DEDUP_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        current = await run_stage("db", incident_dedup.lookup, keys)
+        if current is None or current.incident_id != duplicate.incident_id:
+            return None
+        if current.response is not None:
+            return current
+    raise HTTPException(status_code=409, detail="A matching incident is still being processed",
+                        headers={"Retry-After": "5"})
+
+
+async def claim_incident(incident_id: str, keys: list) -> Optional[Duplicate]:
+    """Claim dedup keys for a new incident; returns the original instead if this one repeats it"""
+    while True:
+        duplicate = (await run_stage("db", incident_dedup.claim, [(incident_id, keys)]))[0]
+        if duplicate is None:
+            return None
+        if duplicate.response is None:
+            duplicate = await wait_for_original(duplicate, keys)
+        if duplicate is not None:
+            return duplicate
+        # The original gave up its claim; try again to become the original
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse whose body generator is still reading the request body.
+
+    Starlette's StreamingResponse listens for a client disconnect on `receive`
+    while streaming, which would steal the request body chunks from the
+    generator. Here the generator owns `receive`; a disconnect surfaces as
+    ClientDisconnect from request.stream() instead.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def parse_ndjson_incident(line: bytes):
+    """Parse one NDJSON line into an IncidentRequest, or return the error text"""
+    try:
+        return IncidentRequest.model_validate_json(line)
+    except ValidationError as e:
+        return f"Invalid incident: {e.errors(include_url=False)[0]['msg']}"
+
+
+async def claim_batch(valid: list, results: list) -> tuple:
+    """Claim dedup keys for a batch's (index, incident_id, incident) items.
+
+    Repeats of incidents from earlier requests are answered in `results`
+    straight away: 200 with the original's response, or 409 while it is
+    still being processed. Returns the items left to process, the keys each
+    one claimed by index, and (index, original index) for repeats of
+    another item in this batch.
+    """
+    keys = {index: incident_dedup.keys(incident.customer_id, incident.message, incident.idempotency_key)
+            for index, _, incident in valid}
+    to_claim = [(incident_id, keys[index]) for index, incident_id, _ in valid if keys[index]]
+    if not to_claim:
+        return valid, {}, []
+    outcomes = iter(await run_stage("db", incident_dedup.claim, to_claim))
+
+    index_by_incident = {incident_id: index for index, incident_id, _ in valid}
+    remaining, claims, repeats = [], {}, []
+    for item in valid:
+        index = item[0]
+        duplicate = next(outcomes) if keys[index] else None
+        if duplicate is None:
+            remaining.append(item)
+            if keys[index]:
+                claims[index] = keys[index]
+        elif duplicate.response is not None:
+            results[index] = {"index": index, "status": 200, "incident": duplicate.response}
+        elif duplicate.incident_id in index_by_incident:
+            repeats.append((index, index_by_incident[duplicate.incident_id]))
+        else:
+            results[index] = {"index": index, "status": 409, "error": "A matching incident is still being processed"}
+    return remaining, claims, repeats
+
+
+async def settle_batch_claims(valid: list, claims: dict, repeats: list, results: list):
+    """Store the response of each created incident under its dedup keys and release the failed ones'.
+
+    Repeats within the batch then get their original's result.
+    """
+    completed, failed = [], []
+    for index, incident_id, _ in valid:
+        if index not in claims:
+            continue
+        if results[index]["status"] == 201:
+            completed.append((incident_id, claims[index], results[index]["incident"]))
+        else:
+            failed.append((incident_id, claims[index]))
+    if completed:
+        await run_stage("db", incident_dedup.complete, completed)
+    if failed:
+        await run_stage("db", incident_dedup.release, failed)
+
+    for index, original in repeats:
+        result = results[original]
+        if result["status"] == 201:
+            results[index] = {"index": index, "status": 200, "incident": result["incident"]}
+        else:
+            results[index] = {**result, "index": index}
+
+
+async def process_incident_batch(incidents: List[IncidentRequest]) -> List[dict]:
+    """Run the incident pipeline over a batch, returning one result dict per item"""
+    results = [None] * len(incidents)
+    valid = []
+    for index, incident in enumerate(incidents):
+        if not incident.customer_id or not incident.message:
+            results[index] = {"index": index, "status": 400, "error": "Missing customer_id or message"}
+        else:
+            valid.append((index, str(uuid.uuid4()), incident))
+
+    claims = {}   # index -> dedup keys claimed for that incident
+    repeats = []  # (index, index of the original) for repeats within this batch
+    if valid:
+        valid, claims, repeats = await claim_batch(valid, results)
+    if not valid:
+        return results
+
+    log.info("batch received", extra={"incidents": len(valid), "rejected": len(incidents) - len(valid)})
+    messages = [incident.message for _, _, incident in valid]
+
+    # Sentiment for the whole batch in one executor hop; it sets each message's Gemini priority.
+    # Classification then runs concurrently (the micro-batcher coalesces these into shared
+    # Gemini calls when enabled)
+    with metrics.stage("sentiment"):
+        sentiments = await run_stage("sentiment", analyze_sentiment_batch, messages)
+    classifications = await timed_stage("classify", asyncio.gather(
+        *(classify_incident(message, classification_priority(message, sentiment))
+          for message, sentiment in zip(messages, sentiments)),
+        return_exceptions=True,
+    ))
+
+    processed = []
+    for (index, incident_id, incident), classification in zip(valid, classifications):
+        if isinstance(classification, SchedulerBusy):
+            results[index] = {"index": index, "status": 429, "error": str(classification)}
+        elif isinstance(classification, Exception):
+            log.error("classification error: %s", classification, extra={"incident_id": incident_id})
+            results[index] = {"index": index, "status": 500, "error": "Classification failed"}
+        else:
+            processed.append((index, incident_id, incident, classification))
+
+    ticket_ids = await timed_stage("ticket", asyncio.gather(
+        *(run_stage("ticket", create_ticket_mock, incident_id, classification['category'], incident.message)
+          for _, incident_id, incident, classification in processed)
+    ))
+
+    incident_rows, notification_rows, reminder_rows = [], [], []
+    sentiment_by_index = {index: sentiment for (index, _, _), sentiment in zip(valid, sentiments)}
+    for (index, incident_id, incident, classification), ticket_id in zip(processed, ticket_ids):
+        sentiment = sentiment_by_index[index]
+        incident_rows.append((incident_id, incident.customer_id, incident.channel, incident.message,
+                              classification['category'], classification['confidence'],
+                              sentiment['sentiment'], sentiment['compound'], ticket_id, classification['source']))
+        notification_rows.extend(acknowledgement_notifications(incident_id, ticket_id,
+                                                               customer_email=incident.email,
+                                                               channels=['email', 'sms']))
+        reminder_rows.append((incident_id, incident.email, incident.channel, ticket_id))
+
+    try:
+        await timed_stage("store", run_stage("db", db.store_incidents, incident_rows, notification_rows))
+    except Exception:
+        log.exception("batch storage error")
+        for index, _, _, _ in processed:
+            results[index] = {"index": index, "status": 500, "error": "Failed to store incident"}
+        await settle_batch_claims(valid, claims, repeats, results)
+        return results
+
+    for (index, incident_id, _, classification), ticket_id in zip(processed, ticket_ids):
+        response = incident_response(incident_id, ticket_id, classification['category'],
+                                     classification['confidence'], sentiment_by_index[index]['sentiment'])
+        results[index] = {"index": index, "status": 201, "incident": response}
+    await settle_batch_claims(valid, claims, repeats, results)
+
+    with metrics.stage("notify"):
+        notification_outbox.wake(['email', 'sms'])
+    await timed_stage("reminder", run_stage("db", reminder_scheduler.schedule_many, reminder_rows))
+
+    log.info("batch stored", extra={"incidents": len(processed), "notifications": len(notification_rows)})
+    return results
+
+
+# ============================================================================
+# ASYNCHRONOUS INTAKE
+# ============================================================================
+
+# With ASYNC_PROCESSING_ENABLED (or `Prefer: respond-async` on a request), POST
+# /api/incidents stores the raw incident and answers 202; the intake workers
+# run the pipeline (see intake.py)
+ASYNC_PROCESSING_ENABLED = os.getenv("ASYNC_PROCESSING_ENABLED", "false").lower() == "true"
+
+
+def accepted_response(incident_id: str) -> dict:
+    """Body returned for an incident accepted for background processing"""
+    return {
+        "incident_id": incident_id,
+        "status": "received",
+        "message": f"Incident received and queued for processing. Track it at /api/incidents/{incident_id}."
+    }
+
+
+def accepted(body: dict, headers: dict = None) -> JSONResponse:
+    return JSONResponse(body, status_code=status.HTTP_202_ACCEPTED,
+                        headers={"Location": f"/api/incidents/{body['incident_id']}", **(headers or {})})
+
+
+async def process_received_incident(incident_id: str, customer_id: str, channel: str, message: str,
+                                    email: Optional[str], created_at: str):
+    """Intake worker: run steps 1-6 of create_incident for an accepted incident"""
+    structured_log.bind_incident(incident_id)
+    # Validated when it was accepted
+    incident_data = IncidentRequest.model_construct(customer_id=customer_id, channel=channel, message=message,
+                                                    email=email, idempotency_key=None)
+    await run_incident_steps(incident_id, incident_data, received_at=created_at)
+    # Stored with its acknowledgements and reminder; all that is left is waking this process's workers
+    response_cache.invalidate(incident_id)
+    notification_outbox.wake(['email', 'sms'])
+
+
+intake_queue = IntakeQueue(
+    process_received_incident,
+    workers=int(os.getenv("INTAKE_WORKERS", "16")),
+    max_attempts=int(os.getenv("INTAKE_MAX_ATTEMPTS", "5")),
+    poll_seconds=float(os.getenv("INTAKE_POLL_SECONDS", "1")),
+)
+background_leases.add("intake", intake_queue.start, intake_queue.stop)
+
+
+# ============================================================================
+# PAGINATION
+# ============================================================================
+
+PAGE_DEFAULT_LIMIT = int(os.getenv("PAGE_DEFAULT_LIMIT", "50"))
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "500"))
+
+# Row tuples come back in the same order as the response model fields
+INCIDENT_FIELDS = tuple(IncidentDetail.model_fields)
+NOTIFICATION_FIELDS = tuple(NotificationRecord.model_fields)
+
+
+def encode_cursor(created_at: str, row_id: str) -> str:
+    """Opaque cursor for the (created_at, id) keyset position of a row"""
+    return base64.urlsafe_b64encode(json.dumps([created_at, row_id]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Inverse of encode_cursor; raises 400 for anything it did not produce"""
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if isinstance(created_at, str) and isinstance(row_id, str):
+            return created_at, row_id
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        pass
+    raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def page_of(rows: list, fields: tuple, limit: int, headers) -> list:
+    """Trim a limit+1 fetch to one page and set X-Next-Cursor in `headers` if more rows follow"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = dict(zip(fields, rows[-1]))
+        headers["X-Next-Cursor"] = encode_cursor(last["created_at"], last["id"])
+    return [dict(zip(fields, row)) for row in rows]
+
+
+SEARCH_MAX_OFFSET = int(os.getenv("SEARCH_MAX_OFFSET", "10000"))
+# Best-match order ranks only the newest this many matches (0: all), bounding common terms
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "10000"))
+SEARCH_HIT_FIELDS = INCIDENT_FIELDS + ("score",)
+
+
+def plain_match_query(text: str) -> str:
+    """FTS5 query requiring every word of `text`, each quoted so no word is read as an operator"""
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", text))
+
+
+def ndjson_rows(batches, fields: tuple):
+    """Encode cursor batches as NDJSON without building the full result or model objects"""
+    for rows in batches:
+        yield "".join(json.dumps(dict(zip(fields, row))) + "\n" for row in rows)
+
+
+# ============================================================================
+# RESPONSE CACHE
+# ============================================================================
+
+response_cache = ResponseCache(
+    max_incidents=int(os.getenv("RESPONSE_CACHE_SIZE", "10000")),
+    sync_seconds=float(os.getenv("RESPONSE_CACHE_SYNC_SECONDS", "0.5")),
+)
+# Clients may keep a copy but must revalidate it; an unchanged one costs a bodyless 304
+RESPONSE_CACHE_CONTROL = "private, no-cache"
+NOT_MODIFIED = {304: {"description": "The client's copy (If-None-Match / If-Modified-Since) is current"}}
+
+
+def render_json(content) -> bytes:
+    """Encode a response body the way JSONResponse does"""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def not_modified(request: Request, entry: CachedResponse, last_modified: Optional[float]) -> bool:
+    """Whether the client's copy is current: If-None-Match if sent, else If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or entry.etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return parsedate_to_datetime(if_modified_since).timestamp() >= last_modified
+        except (TypeError, ValueError):
+            pass
+    return False
+
+
+async def cached_read(request: Request, incident_id: str, variant: tuple, load) -> Response:
+    """Answer a GET about one incident from response_cache, or render `await load()` and cache it.
+
+    `load` returns (content, headers); an HTTPException it raises is not cached.
+    """
+    if response_cache.sync_due():
+        await run_stage("db", response_cache.sync_changes)
+    entry = response_cache.get(incident_id, variant)
+    if entry is None:
+        generation = response_cache.generation
+        content, headers = await load()
+        entry = response_cache.put(incident_id, variant, render_json(content), headers, generation)
+
+    last_modified = entry.last_modified()
+    headers = {"ETag": entry.etag, "Cache-Control": RESPONSE_CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    if not_modified(request, entry, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(entry.body, media_type="application/json", headers={**entry.headers, **headers})
+
+
 # ============================================================================
 # MAIN API ENDPOINTS
 # ============================================================================
 
-@app.post("/api/incidents", response_model=IncidentResponse, status_code=status.HTTP_201_CREATED, tags=["Incidents"])
-async def create_incident(incident_data: IncidentRequest):
+@app.post("/api/incidents", response_model=IncidentResponse, status_code=status.HTTP_201_CREATED, tags=["Incidents"],
+          responses={200: {"description": "Repeat of an earlier incident, answered with its response"},
+                     202: {"model": IncidentAccepted, "description": "Accepted for background processing"}})
+async def create_incident(incident_data: IncidentRequest, response: Response,
+                          idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+                          prefer: Optional[str] = Header(None)):
     """
     Create and process a new incident.
 
@@ -510,9 +1286,20 @@ async def create_incident(incident_data: IncidentRequest):
     1. Receives customer incident via webhook
     2. Classifies using OpenAI LLM
     3. Creates ticket in external system
-    4. Sends multi-channel notifications
+    4. Queues multi-channel notifications
     5. Schedules 24-hour reminder
 
+    A repeat of an earlier incident (same `idempotency_key` field or
+    `Idempotency-Key` header, or the same customer and message within
+    DEDUP_WINDOW_SECONDS) returns the original's response with 200 (202
+    while the original is still queued), with its ID in `X-Duplicate-Of`,
+    and runs none of the steps.
+
+    With `Prefer: respond-async` (or ASYNC_PROCESSING_ENABLED) the incident
+    is stored as `received` and the response is 202 with its ID, before
+    any step runs. Workers then process it; GET /api/incidents/{incident_id}
+    shows received -> processing -> open (or failed).
+
     **Example Request:**
 ```json
     {
@@ -534,120 +1321,253 @@ async def create_incident(incident_data: IncidentRequest):
 
     incident_id = str(uuid.uuid4())
 
-    print(f"\n{'=' * 70}")
-    print(f"[INCIDENT RECEIVED] ID: {incident_id}")
-    print(f"Customer: {customer_id} | Channel: {channel}")
-    print(f"Message: {message}")
-    print(f"{'=' * 70}")
+    structured_log.bind_incident(incident_id)
+    log.info("incident received", extra={"customer_id": customer_id, "channel": channel,
+                                         "payload": message if LOG_DEBUG_PAYLOADS else None})
+
+    dedup_keys = incident_dedup.keys(customer_id, message, incident_data.idempotency_key or idempotency_key)
+    if dedup_keys:
+        original = await claim_incident(incident_id, dedup_keys)
+        if original is not None:
+            log.info("duplicate incident", extra={"duplicate_of": original.incident_id, "matched": original.matched})
+            if original.response["status"] == "received":
+                return accepted(original.response, {"X-Duplicate-Of": original.incident_id})
+            response.status_code = status.HTTP_200_OK  # nothing was created, as for repeats in a batch
+            response.headers["X-Duplicate-Of"] = original.incident_id
+            return original.response
+
+    if "respond-async" in (prefer or "").lower():
+        return await accept_incident(incident_id, incident_data, dedup_keys, {"Preference-Applied": "respond-async"})
+    if ASYNC_PROCESSING_ENABLED:
+        return await accept_incident(incident_id, incident_data, dedup_keys)
+
+    try:
+        result = await run_incident_steps(incident_id, incident_data)
+    except BaseException:
+        if dedup_keys:
+            await run_stage("db", incident_dedup.release, [(incident_id, dedup_keys)])
+        raise
+    if dedup_keys:
+        await run_stage("db", incident_dedup.complete, [(incident_id, dedup_keys, result)])
+
+    await notify_and_remind(incident_id, incident_data, result["ticket_id"])
+    return result
+
+
+async def accept_incident(incident_id: str, incident_data: IncidentRequest, dedup_keys: list,
+                          headers: dict = None) -> JSONResponse:
+    """Queue an incident for the intake workers and answer 202"""
+    try:
+        with metrics.stage("accept"):
+            await run_stage("db", intake_queue.accept, incident_id, incident_data.customer_id,
+                            incident_data.channel, incident_data.message, incident_data.email)
+    except BaseException:
+        if dedup_keys:
+            await run_stage("db", incident_dedup.release, [(incident_id, dedup_keys)])
+        raise
+    body = accepted_response(incident_id)
+    if dedup_keys:
+        await run_stage("db", incident_dedup.complete, [(incident_id, dedup_keys, body)])
+    intake_queue.wake()
+    log.info("incident accepted")
+    return accepted(body, headers)
+
+
+async def notify_and_remind(incident_id: str, incident_data: IncidentRequest, ticket_id: str):
+    """Steps 5-6 of create_incident, after the incident is stored"""
+    # Step 5: Hand notifications to the per-channel outbox workers (no waiting)
+    with metrics.stage("notify"):
+        notification_outbox.wake(['email', 'sms'])
+
+    # Step 6: Schedule 24-hour reminder
+    with metrics.stage("reminder"):
+        await run_stage("db", schedule_24h_reminder, incident_id, incident_data.email, incident_data.channel,
+                        ticket_id)
+
+
+async def run_incident_steps(incident_id: str, incident_data: IncidentRequest, received_at: str = None) -> dict:
+    """Steps 1-4 of create_incident, up to the stored incident; returns its response body.
+
+    `received_at` is set for an incident from the intake queue: it keeps that creation time, and
+    storing it takes it off the queue.
+    """
+    customer_id = incident_data.customer_id
+    message = incident_data.message
+    channel = incident_data.channel
 
     # Step 1: Analyze sentiment
-    print("\n[STEP 1] Analyzing customer sentiment...")
-    sentiment_result = analyze_sentiment(message)
+    with metrics.stage("sentiment"):
+        sentiment_result = await run_stage("sentiment", analyze_sentiment, message)
     sentiment = sentiment_result['sentiment']
     polarity = sentiment_result['compound']
-    print(f"✓ Sentiment: {sentiment} (polarity: {polarity})")
+    log.debug("sentiment scored", extra={"sentiment": sentiment, "polarity": polarity})
 
-    # Step 2: Classify with LLM
-    print("\n[STEP 2] Classifying incident with Google Gemini...")
-    classification_result = classify_incident(message)
+    # Step 2: Classify with LLM. Gemini may be busy: a request answers 429 rather than queue for
+    # long, while the intake workers wait their turn
+    with metrics.stage("classify"):
+        classification_result = await classify_incident(
+            message, classification_priority(message, sentiment_result),
+            max_wait=GEMINI_MAX_WAIT_SECONDS if received_at is None else None)
 
     category = classification_result['category']
     confidence = classification_result['confidence']
     reason = classification_result['reason']
-
-    print(f"✓ Category: {category}")
-    print(f"✓ Confidence: {confidence}")
-    print(f"✓ Reason: {reason}")
+    log.debug("incident classified", extra={"category": category, "confidence": confidence, "reason": reason,
+                                            "source": classification_result['source']})
 
     # Step 3: Create ticket
-    print("\n[STEP 3] Creating ticket...")
-    ticket_id = create_ticket_mock(incident_id, category, message)
-
-    # Step 4: Store in database
-    print("\n[STEP 4] Storing incident in database...")
-    conn = sqlite3.connect('incidents.db')
-    c = conn.cursor()
-    c.execute('''INSERT INTO incidents 
-                 (id, customer_id, channel, message, classification, confidence, sentiment, polarity, ticket_id, status)
-                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'open')''',
-              (incident_id, customer_id, channel, message, category, confidence, sentiment, polarity, ticket_id))
-    conn.commit()
-    conn.close()
-    print("✓ Incident stored")
-
-    # Step 5: Send multi-channel notifications
-    print("\n[STEP 5] Sending multi-channel notifications...")
-    send_multi_channel(incident_id, customer_id, ticket_id,
-                       customer_email=incident_data.email,
-                       channels=['email', 'sms'])
+    with metrics.stage("ticket"):
+        ticket_id = await run_stage("ticket", create_ticket_mock, incident_id, category, message)
+
+    # Step 4: Store in database, queuing acknowledgements in the same transaction
+    acknowledgements = acknowledgement_notifications(incident_id, ticket_id,
+                                                     customer_email=incident_data.email,
+                                                     channels=['email', 'sms'])
+    response = incident_response(incident_id, ticket_id, category, confidence, sentiment)
+    # An accepted incident leaves the queue with its reminder and final dedup response in the same
+    # transaction, so a failure after the commit cannot lose them or send it round again
+    reminder = None
+    if received_at is not None:
+        reminder = reminder_scheduler.reminder_row(incident_id, incident_data.email, channel, ticket_id)
+    with metrics.stage("store"):
+        await run_stage("db", db.store_incident, incident_id, customer_id, channel, message,
+                        category, confidence, sentiment, polarity, ticket_id, classification_result['source'],
+                        acknowledgements, received_at=received_at,
+                        response=response if received_at is not None else None, reminder=reminder)
+    if reminder is not None:
+        reminder_scheduler.scheduled(reminder[4])
+
+    log.info("incident created", extra={"ticket_id": ticket_id, "category": category, "confidence": confidence,
+                                        "source": classification_result['source'], "sentiment": sentiment})
+    return response
 
-    # Step 6: Schedule 24-hour reminder
-    print("\n[STEP 6] Scheduling 24-hour reminder...")
-    schedule_24h_reminder(incident_id, incident_data.email, channel, ticket_id)  # ← Add ticket_id
-    print("✓ Reminder scheduled")
 
-    response = {
-        "incident_id": incident_id,
-        "ticket_id": ticket_id,
-        "status": "open",
-        "classification": category,
-        "confidence": confidence,
-        "message": f"Incident received and ticket created. Sentiment: {sentiment}. Acknowledgments sent via email and SMS."
-    }
+@app.post("/api/incidents/batch", response_model=BatchIncidentResponse, tags=["Incidents"])
+async def create_incidents_batch(incidents: List[IncidentRequest]):
+    """
+    Create and process many incidents in one request.
 
-    print(f"\n[SUCCESS] Response: {json.dumps(response, indent=2)}")
-    return response
+    Sentiment is scored for the whole batch at once, classification and ticket
+    creation run concurrently, and all incidents and acknowledgements are written
+    in a single transaction. Each item gets its own status, so one bad entry does
+    not fail the batch.
+    """
+    if len(incidents) > INGEST_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {INGEST_MAX_BATCH} incidents")
 
+    results = await process_incident_batch(incidents)
+    created = sum(1 for result in results if result["status"] == 201)
+    duplicates = sum(1 for result in results if result["status"] == 200)
+    return {"created": created, "duplicates": duplicates, "failed": len(results) - created - duplicates,
+            "results": results}
 
-@app.get("/api/incidents/{incident_id}", response_model=IncidentDetail, tags=["Incidents"])
-async def get_incident(incident_id: str):
-    """Fetch incident details by ID"""
-    conn = sqlite3.connect('incidents.db')
-    c = conn.cursor()
-
-    # SELECT in EXACT database column order
-    c.execute('''SELECT id, customer_id, channel, message, classification, confidence,
-                        sentiment, polarity, ticket_id, status, created_at, resolved_at, reminder_sent
-                 FROM incidents WHERE id = ?''', (incident_id,))
-    row = c.fetchone()
-    conn.close()
-
-    if not row:
-        raise HTTPException(status_code=404, detail="Incident not found")
-
-    return IncidentDetail(
-        id=row[0],
-        customer_id=row[1],
-        channel=row[2],
-        message=row[3],
-        classification=row[4],
-        confidence=row[5],
-        sentiment=row[6],
-        polarity=row[7],
-        ticket_id=row[8],
-        status=row[9],
-        created_at=row[10],
-        resolved_at=row[11],
-        reminder_sent=row[12]
-    )
 
+@app.post("/api/incidents/stream", tags=["Incidents"])
+async def create_incidents_stream(request: Request):
+    """
+    Create incidents from an NDJSON body (one incident object per line).
 
-@app.get("/api/incidents/customer/{customer_id}", response_model=List[IncidentDetail], tags=["Incidents"])
-async def get_customer_incidents(customer_id: str):
-    """Fetch all incidents for a specific customer"""
-    conn = sqlite3.connect('incidents.db')
-    c = conn.cursor()
-
-    # SELECT in EXACT database column order
-    c.execute('''SELECT id, customer_id, channel, message, classification, confidence,
-                        sentiment, polarity, ticket_id, status, created_at, resolved_at, reminder_sent
-                 FROM incidents WHERE customer_id = ? ORDER BY created_at DESC''', (customer_id,))
-    rows = c.fetchall()
-    conn.close()
-
-    incidents = []
+    Lines are processed in chunks of INGEST_STREAM_CHUNK as they arrive and a
+    result line is streamed back for each incident, in submission order.
+    """
+
+    async def results():
+        index = 0
+        pending = []
+        buffer = b""
+
+        async def flush():
+            items = [item for _, item in pending if isinstance(item, IncidentRequest)]
+            processed = iter(await process_incident_batch(items)) if items else iter(())
+            lines = []
+            for item_index, item in pending:
+                if isinstance(item, IncidentRequest):
+                    result = {**next(processed), "index": item_index}
+                else:
+                    result = {"index": item_index, "status": 400, "error": item}
+                lines.append(json.dumps(result) + "\n")
+            pending.clear()
+            return "".join(lines)
+
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if not line.strip():
+                    continue
+                pending.append((index, parse_ndjson_incident(line)))
+                index += 1
+                if len(pending) >= INGEST_STREAM_CHUNK:
+                    yield await flush()
+
+        if buffer.strip():
+            pending.append((index, parse_ndjson_incident(buffer)))
+        if pending:
+            yield await flush()
+
+    return DuplexStreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@app.get("/api/incidents/search", response_model=List[IncidentSearchHit], tags=["Incidents"])
+async def search_incidents(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=500,
+                   description="Words that must all appear in the message; matching is stemmed and "
+                               "case-insensitive ('charged' finds 'charge')"),
+    syntax: Literal["plain", "fts5"] = Query("plain", description="fts5: q is an FTS5 query, with OR, NOT, "
+                                                                  "\"phrases\", prefix* and NEAR()"),
+    classification: Optional[str] = Query(None),
+    sentiment: Optional[Literal["positive", "neutral", "negative"]] = Query(None),
+    status: Optional[Literal["open", "resolved"]] = Query(None),
+    created_after: Optional[str] = Query(None, description="ISO date/time in UTC, inclusive"),
+    created_before: Optional[str] = Query(None, description="ISO date/time in UTC, exclusive"),
+    sort: Literal["rank", "newest"] = Query("rank", description="rank: best match first, among the newest "
+                                                                 "SEARCH_RANK_WINDOW matches; newest: latest first"),
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX_LIMIT, description=f"Page size (default {PAGE_DEFAULT_LIMIT})"),
+    offset: int = Query(0, ge=0, le=SEARCH_MAX_OFFSET, description="X-Next-Offset value from the previous page"),
+):
+    """Ranked full-text search over incident messages, one page at a time"""
+    match = q if syntax == "fts5" else plain_match_query(q)
+    if not match.strip():
+        raise HTTPException(status_code=400, detail="Query has no searchable words")
+
+    filters = {name: value for name, value in (("classification", classification), ("sentiment", sentiment),
+                                               ("status", status)) if value is not None}
+    for name, value in (("created_after", created_after), ("created_before", created_before)):
+        if value is not None:
+            filters[name] = parse_query_time(value).strftime("%Y-%m-%d %H:%M:%S")
+
+    limit = limit or PAGE_DEFAULT_LIMIT
+    try:
+        rows = await run_stage("db", db.search_incidents, match, filters, sort, limit + 1, offset,
+                               SEARCH_RANK_WINDOW)
+    except sqlite3.OperationalError as e:
+        # A malformed FTS5 query fails at execution; anything else (a locked DB) is a server error
+        if syntax == "fts5" and "locked" not in str(e):
+            raise HTTPException(status_code=400, detail=f"Invalid search query: {e}")
+        raise
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Offset"] = str(offset + limit)
+    hits = []
     for row in rows:
-        incident = IncidentDetail(
+        hit = dict(zip(SEARCH_HIT_FIELDS, row))
+        hit["score"] = -hit["score"]
+        hits.append(hit)
+    return hits
+
+
+@app.get("/api/incidents/{incident_id}", response_model=IncidentDetail, tags=["Incidents"], responses=NOT_MODIFIED)
+async def get_incident(incident_id: str, request: Request):
+    """Fetch incident details by ID"""
+    async def load():
+        row = await run_stage("db", db.fetch_incident, incident_id)
+
+        if not row:
+            raise HTTPException(status_code=404, detail="Incident not found")
+
+        return IncidentDetail(
             id=row[0],
             customer_id=row[1],
             channel=row[2],
@@ -661,86 +1581,183 @@ async def get_customer_incidents(customer_id: str):
             created_at=row[10],
             resolved_at=row[11],
             reminder_sent=row[12]
-        )
-        incidents.append(incident)
+        ).model_dump(), {}
 
-    return incidents
+    return await cached_read(request, incident_id, ("incident",), load)
+
+
+@app.get("/api/incidents/customer/{customer_id}", response_model=List[IncidentDetail], tags=["Incidents"])
+async def get_customer_incidents(
+    customer_id: str,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX_LIMIT,
+                                 description=f"Page size (default {PAGE_DEFAULT_LIMIT}; unlimited when streaming)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    stream: bool = Query(False, description="Stream rows as NDJSON instead of returning one page"),
+):
+    """Fetch a customer's incidents, newest first, one keyset page at a time"""
+    after = decode_cursor(cursor) if cursor else None
+    if stream:
+        return StreamingResponse(ndjson_rows(db.iter_customer_incidents(customer_id, limit, after), INCIDENT_FIELDS),
+                                 media_type="application/x-ndjson")
+
+    limit = limit or PAGE_DEFAULT_LIMIT
+    rows = await run_stage("db", db.fetch_customer_incidents, customer_id, limit + 1, after)
+    return page_of(rows, INCIDENT_FIELDS, limit, response.headers)
 
 
 @app.put("/api/incidents/{incident_id}/resolve", tags=["Incidents"])
 async def resolve_incident(incident_id: str):
     """Mark an incident as resolved"""
-    conn = sqlite3.connect('incidents.db')
-    c = conn.cursor()
-    c.execute('''UPDATE incidents SET status = 'resolved', resolved_at = CURRENT_TIMESTAMP 
-                 WHERE id = ?''', (incident_id,))
-    rows_updated = c.rowcount
-    conn.commit()
-    conn.close()
+    rows_updated = await run_stage("db", db.mark_incident_resolved, incident_id)
 
     if rows_updated == 0:
-        raise HTTPException(status_code=404, detail="Incident not found")
-
+        # Accepted with 202 but not stored yet: there is nothing to resolve until it is open
+        intake_status = await run_stage("db", db.fetch_intake_status, incident_id)
+        if intake_status == "failed":
+            raise HTTPException(status_code=409, detail="Incident could not be processed")
+        if intake_status is not None:
+            raise HTTPException(status_code=409, detail="Incident is still being processed",
+                                headers={"Retry-After": "1"})
+        # An intake worker may have stored it between the two queries
+        rows_updated = await run_stage("db", db.mark_incident_resolved, incident_id)
+        if rows_updated == 0:
+            raise HTTPException(status_code=404, detail="Incident not found")
+
+    response_cache.invalidate(incident_id)
     return {"message": "Incident resolved", "incident_id": incident_id}
 
 
-@app.get("/api/notifications/{incident_id}", response_model=List[NotificationRecord], tags=["Notifications"])
-async def get_incident_notifications(incident_id: str):
-    """Fetch all notifications for an incident"""
-    conn = sqlite3.connect('incidents.db')
-    c = conn.cursor()
-    c.execute(
-        'SELECT id, incident_id, channel, message, status, sent_at FROM notifications WHERE incident_id = ? ORDER BY sent_at DESC',
-        (incident_id,))
-    rows = c.fetchall()
-    conn.close()
+@app.get("/api/notifications/{incident_id}", response_model=List[NotificationRecord], tags=["Notifications"],
+         responses=NOT_MODIFIED)
+async def get_incident_notifications(
+    incident_id: str,
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX_LIMIT,
+                                 description=f"Page size (default {PAGE_DEFAULT_LIMIT}; unlimited when streaming)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    stream: bool = Query(False, description="Stream rows as NDJSON instead of returning one page"),
+):
+    """Fetch an incident's notifications, newest first, one keyset page at a time"""
+    after = decode_cursor(cursor) if cursor else None
+    if stream:
+        return StreamingResponse(ndjson_rows(db.iter_incident_notifications(incident_id, limit, after),
+                                             NOTIFICATION_FIELDS),
+                                 media_type="application/x-ndjson")
 
-    notifications = [
-        NotificationRecord(
-            id=row[0],
-            incident_id=row[1],
-            channel=row[2],
-            message=row[3],
-            status=row[4],
-            sent_at=row[5]
-        )
-        for row in rows
-    ]
+    limit = limit or PAGE_DEFAULT_LIMIT
 
-    return notifications
+    async def load():
+        rows = await run_stage("db", db.fetch_incident_notifications, incident_id, limit + 1, after)
+        headers = {}
+        page = page_of(rows, NOTIFICATION_FIELDS, limit, headers)
+        return [NotificationRecord(**item).model_dump() for item in page], headers
+
+    return await cached_read(request, incident_id, ("notifications", limit, cursor), load)
 
 
 @app.get("/api/stats", tags=["Statistics"])
 async def get_stats():
     """Get incident statistics"""
-    conn = sqlite3.connect('incidents.db')
-    c = conn.cursor()
+    stats = await run_stage("db", db.fetch_stats)
+    stats["fast_path"] = fast_classifier.stats()
+    stats["classification_cache"] = classification_cache.stats()
+    stats["duplicates_suppressed"] = incident_dedup.stats()
+    stats["gemini"] = {model.name: model.stats() for model in (classifier_model, batch_classifier_model)}
+    stats["gemini_scheduler"] = gemini_scheduler.stats()
+    stats["intake"] = await run_stage("db", intake_queue.stats)
+    stats["notifications"] = notification_outbox.stats()
+    stats["tickets"] = {**ticket_client.stats(), "reconciled": ticket_reconciler.reconciled}
+    stats["background"] = {"worker": background_leases.owner, "leases": background_leases.held()}
+    if _classification_batcher is not None:
+        stats["classification_batching"] = _classification_batcher.stats()
+    stats["response_cache"] = response_cache.stats()
+    return stats
 
-    c.execute('SELECT COUNT(*) FROM incidents')
-    total_incidents = c.fetchone()[0]
 
-    c.execute('SELECT COUNT(*) FROM incidents WHERE status = "open"')
-    open_incidents = c.fetchone()[0]
+STATS_DEFAULT_RANGE = {"hour": timedelta(hours=24), "day": timedelta(days=30)}
 
-    c.execute('SELECT COUNT(*) FROM incidents WHERE status = "resolved"')
-    resolved_incidents = c.fetchone()[0]
 
-    c.execute('''SELECT classification, COUNT(*) as count FROM incidents 
-                 GROUP BY classification ORDER BY count DESC''')
-    classification_stats = [{"category": row[0], "count": row[1]} for row in c.fetchall()]
+def parse_query_time(value: str) -> datetime:
+    """Parse an ISO date/time query parameter as naive UTC, like the stored timestamps.
 
-    conn.close()
+    A value with an offset is converted to UTC; one without is taken as UTC.
+    """
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid timestamp: {value}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+@app.get("/api/stats/timeseries", tags=["Statistics"])
+async def get_stats_timeseries(
+    granularity: Literal["hour", "day"] = Query("hour"),
+    dimension: Literal["classification", "sentiment", "channel", "resolved"] = Query(
+        "classification", description="Breakdown of incidents created per bucket, or incidents resolved"),
+    start: Optional[str] = Query(None, description="ISO date/time in UTC (default: 24 hours or 30 days before end)"),
+    end: Optional[str] = Query(None, description="ISO date/time in UTC (default: now)"),
+):
+    """Incident counts per hour or day, read from the rollup buckets"""
+    bucket_format = db.STATS_GRANULARITIES[granularity]
+    end_time = parse_query_time(end) if end else datetime.utcnow()
+    start_time = parse_query_time(start) if start else end_time - STATS_DEFAULT_RANGE[granularity]
+    start_bucket, end_bucket = start_time.strftime(bucket_format), end_time.strftime(bucket_format)
+
+    rows = await run_stage("db", db.fetch_stats_buckets, granularity, dimension, start_bucket, end_bucket)
+
+    buckets = []
+    for bucket, key, count in rows:
+        if not buckets or buckets[-1]["bucket"] != bucket:
+            buckets.append({"bucket": bucket, "total": 0, "counts": {}})
+        buckets[-1]["counts"][key] = count
+        buckets[-1]["total"] += count
 
     return {
-        "total_incidents": total_incidents,
-        "open_incidents": open_incidents,
-        "resolved_incidents": resolved_incidents,
-        "by_classification": classification_stats
+        "granularity": granularity,
+        "dimension": dimension,
+        "start": start_bucket,
+        "end": end_bucket,
+        "buckets": buckets,
     }
 
+metrics.REGISTRY.callback(
+    "notifications_total", "counter", "Outbox deliveries by outcome", ("outcome",),
+    lambda: {(outcome,): count for outcome, count in notification_outbox.stats().items()})
+metrics.REGISTRY.callback(
+    "incident_intake_runs_total", "counter", "Background runs of accepted incidents by outcome", ("outcome",),
+    lambda: {("processed",): intake_queue.processed, ("retried",): intake_queue.retried,
+             ("failed",): intake_queue.failed})
+metrics.REGISTRY.callback(
+    "tickets_total", "counter", "Ticket creations by outcome (created remotely or local fallback ID)", ("outcome",),
+    lambda: {("created",): ticket_client.created, ("fallback",): ticket_client.fallbacks,
+             ("reconciled",): ticket_reconciler.reconciled})
+metrics.REGISTRY.callback(
+    "ticket_breaker_open", "gauge", "1 while the ticket API circuit breaker is not closed", (),
+    lambda: {(): int(ticket_client.breaker.state != "closed")})
+metrics.REGISTRY.callback(
+    "classification_cache_lookups_total", "counter", "Classification cache lookups by result", ("result",),
+    lambda: {("memory_hit",): classification_cache.memory_hits,
+             ("persistent_hit",): classification_cache.persistent_hits,
+             ("miss",): classification_cache.misses})
+metrics.REGISTRY.callback(
+    "response_cache_lookups_total", "counter", "Incident and notification reads by cache result", ("result",),
+    lambda: {("hit",): response_cache.hits, ("miss",): response_cache.misses})
+
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Statistics"])
+async def get_metrics():
+    """Prometheus text-format metrics: stage, DB query and external call latencies plus counters"""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 # ============================================================================
 # RUN SERVER
 # ============================================================================
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,65 @@
+"""
+Gemini request count and prompt size per incident, with and without
+micro-batched classification, for a burst of concurrent distinct messages.
+
+    python benchmarks/bench_batching.py --incidents 200 --batch-size 8 --window-ms 50
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from stubs import StubBackends, load_sample_requests, percentile  # noqa: E402
+
+
+async def burst(app, messages: list) -> list:
+    latencies = []
+
+    async def one(message):
+        start = time.perf_counter()
+        await app.classify_incident(message)
+        latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(m) for m in messages))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--incidents", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--window-ms", type=int, default=50)
+    parser.add_argument("--gemini-latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    stubs = StubBackends(gemini_latency=args.gemini_latency).install()
+    os.chdir(tempfile.mkdtemp(prefix="bench-batching-"))
+    import app
+
+    app.db.init_db()  # normally run by the lifespan hook; this benchmark calls classify directly
+    samples = [body["message"] for body in load_sample_requests()]
+    # Distinct texts so the classification cache never answers
+    messages = [f"{samples[i % len(samples)]} (ref {i})" for i in range(args.incidents)]
+
+    print(f"\n{'mode':<10}{'requests/incident':>20}{'prompt chars/incident':>24}{'p50 (s)':>10}{'p99 (s)':>10}")
+    for mode in ("single", "batched"):
+        app.CLASSIFY_BATCH_ENABLED = mode == "batched"
+        app.CLASSIFY_BATCH_MAX_SIZE = args.batch_size
+        app.CLASSIFY_BATCH_WINDOW_MS = args.window_ms
+        app.classification_cache._memory.clear()
+        stubs.gemini_calls = stubs.gemini_prompt_chars = 0
+        tagged = [f"{m} [{mode}]" for m in messages]
+        latencies = asyncio.run(burst(app, tagged))
+        app._classification_batcher = None  # bound to the finished loop
+        print(f"{mode:<10}{stubs.gemini_calls / args.incidents:>20.3f}"
+              f"{stubs.gemini_prompt_chars / args.incidents:>24.0f}"
+              f"{percentile(latencies, 50):>10.3f}{percentile(latencies, 99):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
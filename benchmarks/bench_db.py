@@ -0,0 +1,106 @@
+"""
+Connect-per-call SQLite access (the original pattern) versus the pooled,
+WAL-mode data-access layer in db.py, under a mixed read/write load.
+
+    python benchmarks/bench_db.py --threads 8 --ops 2000
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from stubs import percentile  # noqa: E402
+
+import db  # noqa: E402
+
+
+def connect_per_call(path):
+    def insert(incident_id):
+        conn = sqlite3.connect(path)
+        conn.execute(db.SQL_INSERT_INCIDENT,
+                     (incident_id, "bench", "email", "charged twice", "duplicate_payment", 0.9, "negative", -0.5, "T",
+                      "gemini"))
+        conn.commit()
+        conn.close()
+
+    def read(incident_id):
+        conn = sqlite3.connect(path)
+        conn.execute(db.SQL_SELECT_INCIDENT, (incident_id,)).fetchone()
+        conn.close()
+
+    return insert, read
+
+
+def pooled(path):
+    db.pool = db.ConnectionPool(path, size=8)
+
+    def insert(incident_id):
+        db.store_incident(incident_id, "bench", "email", "charged twice", "duplicate_payment",
+                          0.9, "negative", -0.5, "T")
+
+    def read(incident_id):
+        db.fetch_incident(incident_id)
+
+    return insert, read
+
+
+def run(label, factory, threads, ops):
+    path = os.path.join(tempfile.mkdtemp(prefix=f"bench-db-{label}-"), "incidents.db")
+    db.pool = db.ConnectionPool(path, size=1)
+    db.init_db()
+    db.pool.close_all()
+    if label == "connect-per-call":
+        # Undo WAL so the original rollback journal is measured
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.close()
+    insert, read = factory(path)
+
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        local = []
+        ids = []
+        for i in range(ops // threads):
+            start = time.perf_counter()
+            if i % 4 == 0 or not ids:
+                ids.append(str(uuid.uuid4()))
+                insert(ids[-1])
+            else:
+                read(ids[i % len(ids)])
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return {"ops_per_s": len(latencies) / elapsed, "p50": percentile(latencies, 50), "p99": percentile(latencies, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"\n{'mode':<18}{'ops/s':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}")
+    for label, factory in (("connect-per-call", connect_per_call), ("pooled-wal", pooled)):
+        r = run(label, factory, args.threads, args.ops)
+        print(f"{label:<18}{r['ops_per_s']:>10.0f}{r['p50'] * 1000:>10.2f}{r['p99'] * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
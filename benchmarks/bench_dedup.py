@@ -0,0 +1,102 @@
+"""
+Work done per real incident when webhooks are retried and customers resend
+the same complaint through a second channel, with duplicate suppression off
+and on.
+
+Each real incident is sent once by email with an idempotency key. A share
+of them is retried with the same key (the webhook retry), and a share is
+resent by SMS with different casing and punctuation and no key (the second
+channel). All requests are shuffled and sent concurrently.
+
+    python benchmarks/bench_dedup.py --incidents 300 --retry-rate 0.3 --resend-rate 0.3
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from stubs import StubBackends, load_sample_requests, percentile  # noqa: E402
+
+
+def workload(incidents: int, retry_rate: float, resend_rate: float, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    samples = load_sample_requests()
+    requests = []
+    for i in range(incidents):
+        body = samples[i % len(samples)]
+        original = {**body, "customer_id": f"dedup-{i}", "channel": "email",
+                    "message": f"{body['message']} (order {i})", "idempotency_key": f"delivery-{i}"}
+        requests.append(original)
+        if rng.random() < retry_rate:
+            requests.append(dict(original))
+        if rng.random() < resend_rate:
+            requests.append({**original, "channel": "sms", "idempotency_key": None,
+                             "message": original["message"].upper().replace(".", "!")})
+    rng.shuffle(requests)
+    return requests
+
+
+async def drive(app, requests: list, concurrency: int) -> tuple:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    async with app.app.router.lifespan_context(app.app), \
+            httpx.AsyncClient(app=app.app, base_url="http://bench", timeout=None) as client:
+        async def one(body):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/api/incidents", json=body)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(body) for body in requests))
+        elapsed = time.perf_counter() - start
+    return latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--incidents", type=int, default=300, help="real incidents")
+    parser.add_argument("--retry-rate", type=float, default=0.3, help="share retried with the same key")
+    parser.add_argument("--resend-rate", type=float, default=0.3, help="share resent through a second channel")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--gemini-latency", type=float, default=0.2)
+    parser.add_argument("--ticket-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    stubs = StubBackends(gemini_latency=args.gemini_latency, ticket_latency=args.ticket_latency,
+                         smtp_latency=0.0).install()
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["FAST_PATH_ENABLED"] = "false"  # every pipeline run goes to Gemini
+    import app
+
+    requests = workload(args.incidents, args.retry_rate, args.resend_rate)
+    print(f"{len(requests)} requests for {args.incidents} real incidents")
+    print(f"\n{'dedup':<8}{'incidents':>11}{'gemini':>8}{'tickets':>9}{'acks':>7}{'req/s':>9}"
+          f"{'p50 (s)':>9}{'p99 (s)':>9}")
+    for mode in ("off", "on"):
+        workdir = tempfile.mkdtemp(prefix=f"bench-dedup-{mode}-")
+        os.chdir(workdir)
+        app.db.pool = app.db.ConnectionPool(os.path.join(workdir, "incidents.db"))
+        app.incident_dedup.window_seconds = 3600 if mode == "on" else 0
+        app.incident_dedup.key_ttl_seconds = 86400 if mode == "on" else 0
+        app.classification_cache._memory.clear()
+        stubs.gemini_calls = stubs.ticket_calls = 0
+
+        latencies, elapsed = asyncio.run(drive(app, requests, args.concurrency))
+        incidents = app.db.fetch_one("SELECT COUNT(*) FROM incidents")[0]
+        acks = app.db.fetch_one("SELECT COUNT(*) FROM notifications")[0]
+        print(f"{mode:<8}{incidents:>11}{stubs.gemini_calls:>8}{stubs.ticket_calls:>9}{acks:>7}"
+              f"{len(requests) / elapsed:>9.1f}{percentile(latencies, 50):>9.3f}{percentile(latencies, 99):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
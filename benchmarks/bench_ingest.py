@@ -0,0 +1,73 @@
+"""
+Incident ingestion throughput: looping over POST /api/incidents versus one
+POST /api/incidents/batch and an NDJSON POST /api/incidents/stream, against
+stubbed Gemini, ticket and SMTP backends.
+
+    python benchmarks/bench_ingest.py --incidents 500 --gemini-latency 0.05
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from stubs import StubBackends, load_sample_requests  # noqa: E402
+
+
+def run_single(client, bodies: list) -> int:
+    return sum(client.post("/api/incidents", json=body).status_code == 201 for body in bodies)
+
+
+def run_batch(client, bodies: list, batch_size: int) -> int:
+    created = 0
+    for start in range(0, len(bodies), batch_size):
+        created += client.post("/api/incidents/batch", json=bodies[start:start + batch_size]).json()["created"]
+    return created
+
+
+def run_stream(client, bodies: list) -> int:
+    payload = "".join(json.dumps(body) + "\n" for body in bodies)
+    response = client.post("/api/incidents/stream", content=payload,
+                           headers={"content-type": "application/x-ndjson"})
+    return sum(json.loads(line)["status"] == 201 for line in response.text.splitlines())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--incidents", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--gemini-latency", type=float, default=0.05)
+    parser.add_argument("--ticket-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    StubBackends(gemini_latency=args.gemini_latency, ticket_latency=args.ticket_latency).install()
+    os.chdir(tempfile.mkdtemp(prefix="bench-ingest-"))
+    import app
+    from fastapi.testclient import TestClient
+
+    app.CLASSIFY_BATCH_ENABLED = True
+    samples = load_sample_requests()
+
+    print(f"\n{'mode':<10}{'incidents':>10}{'created':>10}{'seconds':>10}{'incidents/s':>14}")
+    with TestClient(app.app) as client:
+        for mode in ("single", "batch", "stream"):
+            # Distinct texts per mode so the classification cache never answers
+            bodies = [{**samples[i % len(samples)], "message": f"{samples[i % len(samples)]['message']} ({mode} {i})"}
+                      for i in range(args.incidents)]
+            start = time.perf_counter()
+            if mode == "single":
+                created = run_single(client, bodies)
+            elif mode == "batch":
+                created = run_batch(client, bodies, args.batch_size)
+            else:
+                created = run_stream(client, bodies)
+            elapsed = time.perf_counter() - start
+            print(f"{mode:<10}{args.incidents:>10}{created:>10}{elapsed:>10.2f}{args.incidents / elapsed:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
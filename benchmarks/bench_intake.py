@@ -0,0 +1,121 @@
+"""
+Caller-facing latency of POST /api/incidents when the pipeline runs inside
+the request (201) and when the incident is only queued and the intake
+workers run the pipeline afterwards (202).
+
+For the asynchronous mode it also reports how long the workers took to
+drain the backlog, and how long incidents waited in the queue. With
+--restart the app is shut down right after the last 202 and started again,
+so the backlog is finished by the next lease holder, as after a deploy.
+
+    python benchmarks/bench_intake.py --requests 500 --concurrency 50 --workers 16,50
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from stubs import StubBackends, load_sample_requests, percentile  # noqa: E402
+
+import intake  # noqa: E402
+
+
+async def send(app, bodies: list, concurrency: int, headers: dict) -> tuple:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(app=app.app, base_url="http://bench", timeout=None) as client:
+        async def one(body):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/api/incidents", json=body, headers=headers)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(body) for body in bodies))
+    return latencies, time.perf_counter() - start
+
+
+async def wait_for_backlog(app, timeout: float = 600.0) -> float:
+    start = time.perf_counter()
+    while app.db.fetch_one("SELECT COUNT(*) FROM incident_intake WHERE status != 'failed'")[0]:
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError("intake backlog did not drain")
+        await asyncio.sleep(0.05)
+    return time.perf_counter() - start
+
+
+async def run(app, bodies: list, concurrency: int, mode: str, restart: bool) -> dict:
+    lifespan = app.app.router.lifespan_context
+    headers = {"Prefer": "respond-async"} if mode != "sync" else {}
+    async with lifespan(app.app):
+        latencies, elapsed = await send(app, bodies, concurrency, headers)
+        if mode == "sync":
+            return {"latencies": latencies, "elapsed": elapsed, "done": elapsed}
+        if not restart:
+            return {"latencies": latencies, "elapsed": elapsed, "done": elapsed + await wait_for_backlog(app)}
+        # Shut down as if killed: runs in flight are cancelled, not finished
+        drain = app.intake_queue.drain
+        app.intake_queue.drain = lambda timeout=0: drain(0)
+    try:
+        async with lifespan(app.app):
+            return {"latencies": latencies, "elapsed": elapsed, "done": elapsed + await wait_for_backlog(app)}
+    finally:
+        app.intake_queue.drain = drain
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--workers", default="16", help="comma-separated INTAKE_WORKERS values to compare")
+    parser.add_argument("--gemini-latency", type=float, default=0.2)
+    parser.add_argument("--ticket-latency", type=float, default=0.05)
+    parser.add_argument("--restart", action="store_true", help="restart the app after the last 202")
+    args = parser.parse_args()
+
+    StubBackends(gemini_latency=args.gemini_latency, ticket_latency=args.ticket_latency, smtp_latency=0.0).install()
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["FAST_PATH_ENABLED"] = "false"  # every pipeline run goes to Gemini
+    os.environ["INTAKE_POLL_SECONDS"] = "0.1"
+    import app
+
+    waits = []
+    intake.WAIT_SECONDS.observe = lambda seconds, **labels: waits.append(seconds)
+
+    samples = load_sample_requests()
+    bodies = [{**samples[i % len(samples)], "customer_id": f"intake-{i}",
+               "message": f"{samples[i % len(samples)]['message']} (order {i})"} for i in range(args.requests)]
+
+    print(f"{args.requests} incidents, {args.concurrency} concurrent callers, Gemini {args.gemini_latency}s, "
+          f"ticket API {args.ticket_latency}s")
+    print(f"\n{'mode':<18}{'p50 (ms)':>10}{'p99 (ms)':>10}{'accepted/s':>12}{'all done (s)':>14}"
+          f"{'queue wait p50':>16}{'p99':>8}{'stored':>8}")
+    modes = [("sync", None)] + [(f"async, {workers} workers", int(workers)) for workers in args.workers.split(",")]
+    for mode, workers in modes:
+        workdir = tempfile.mkdtemp(prefix="bench-intake-")
+        os.chdir(workdir)
+        app.db.pool = app.db.ConnectionPool(os.path.join(workdir, "incidents.db"))
+        app.classification_cache._memory.clear()
+        if workers:
+            app.intake_queue.workers = workers
+        waits.clear()
+
+        result = asyncio.run(run(app, bodies, args.concurrency, mode, args.restart))
+        latencies = result["latencies"]
+        stored = app.db.fetch_one("SELECT COUNT(*) FROM incidents")[0]
+        wait = (f"{percentile(waits, 50) * 1000:>14.0f}ms{percentile(waits, 99) * 1000:>6.0f}ms" if workers
+                else f"{'-':>16}{'-':>8}")
+        print(f"{mode:<18}{percentile(latencies, 50) * 1000:>10.1f}{percentile(latencies, 99) * 1000:>10.1f}"
+              f"{len(latencies) / result['elapsed']:>12.1f}{result['done']:>14.2f}{wait}{stored:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Load test of the whole API: replays the Sample_data.json requests, plus
+synthetic variants of them, at a fixed concurrency across a weighted mix of
+endpoints. Gemini, the ticket API and SMTP are stubbed with configurable
+latency, jitter and error rates.
+
+Reports throughput and p50/p95/p99 per endpoint (client side) and per
+pipeline stage (from the Server-Timing header), and writes the run to
+benchmarks/results/<git rev>.json so commits can be compared:
+
+    python benchmarks/bench_load.py --requests 2000 --concurrency 50
+    python benchmarks/bench_load.py --mix create=1 --synthetic 1.0 --gemini-error-rate 0.05
+    python benchmarks/bench_load.py --compare benchmarks/results/<older rev>.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(__file__))
+from stubs import StubBackends, load_sample_requests, percentile  # noqa: E402
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+DEFAULT_MIX = "create=55,batch=5,get=15,history=10,notifications=5,search=5,stats=3,timeseries=2"
+BATCH_SIZE = 20
+
+# Phrases spliced into sample messages so synthetic variants miss the classification cache
+OPENERS = ["", "Hi, ", "Hello team, ", "Urgent: ", "Please help. ", "Good morning. "]
+CLOSERS = ["", " Please fix this.", " This is the second time.", " Thanks.", " I need this sorted today.",
+           " Reference order #{n}.", " My account ends in {n}."]
+CHANNELS = ["email", "sms", "chat", "phone"]
+SEARCH_TERMS = ["deducted", "refund", "locked", "fraud", "balance twice", "payment failed"]
+
+
+def synthetic_variant(body: dict, n: int, rng: random.Random) -> dict:
+    """A sample request reworded and reassigned to another customer"""
+    message = rng.choice(OPENERS) + body["message"] + rng.choice(CLOSERS).format(n=1000 + n)
+    return {**body, "message": message, "customer_id": f"load-{rng.randrange(500)}",
+            "channel": rng.choice(CHANNELS)}
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise SystemExit(f"unknown operation {name!r} (choose from {', '.join(OPERATIONS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def parse_server_timing(header: str) -> dict:
+    """{'sentiment': seconds, ...} from 'sentiment;dur=1.92, classify;dur=0.05, total;dur=2.10'"""
+    stages = {}
+    for entry in filter(None, (part.strip() for part in (header or "").split(","))):
+        name, _, params = entry.partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur" and name != "total":
+                stages[name] = stages.get(name, 0.0) + float(value) / 1000
+    return stages
+
+
+class LoadState:
+    """Request bodies to draw from and IDs created so far, for the read operations"""
+
+    def __init__(self, samples: list, synthetic: float, seed: int):
+        self.samples = samples
+        self.synthetic = synthetic
+        self.rng = random.Random(seed)
+        self.counter = 0
+        self.incident_ids = []
+        self.customer_ids = []
+
+    def body(self) -> dict:
+        self.counter += 1
+        sample = self.samples[self.counter % len(self.samples)]
+        if self.rng.random() < self.synthetic:
+            return synthetic_variant(sample, self.counter, self.rng)
+        # Verbatim text from a new customer: the classification cache answers, duplicate suppression doesn't
+        return {**sample, "customer_id": f"load-sample-{self.counter}"}
+
+    def remember(self, incident_id: str, customer_id: str):
+        self.incident_ids.append(incident_id)
+        self.customer_ids.append(customer_id)
+
+
+async def op_create(client, state):
+    body = state.body()
+    response = await client.post("/api/incidents", json=body)
+    if response.status_code == 201:
+        state.remember(response.json()["incident_id"], body["customer_id"])
+    return "POST /api/incidents", response
+
+
+async def op_batch(client, state):
+    bodies = [state.body() for _ in range(BATCH_SIZE)]
+    response = await client.post("/api/incidents/batch", json=bodies)
+    if response.status_code == 200:
+        for item in response.json()["results"]:
+            if item.get("incident"):
+                state.remember(item["incident"]["incident_id"], bodies[item["index"]]["customer_id"])
+    return "POST /api/incidents/batch", response
+
+
+async def op_get(client, state):
+    if not state.incident_ids:
+        return await op_create(client, state)
+    incident_id = state.rng.choice(state.incident_ids)
+    return "GET /api/incidents/{id}", await client.get(f"/api/incidents/{incident_id}")
+
+
+async def op_history(client, state):
+    if not state.customer_ids:
+        return await op_create(client, state)
+    customer_id = state.rng.choice(state.customer_ids)
+    return "GET /api/incidents/customer/{id}", await client.get(f"/api/incidents/customer/{customer_id}")
+
+
+async def op_notifications(client, state):
+    if not state.incident_ids:
+        return await op_create(client, state)
+    incident_id = state.rng.choice(state.incident_ids)
+    return "GET /api/notifications/{id}", await client.get(f"/api/notifications/{incident_id}")
+
+
+async def op_search(client, state):
+    params = {"q": state.rng.choice(SEARCH_TERMS)}
+    return "GET /api/incidents/search", await client.get("/api/incidents/search", params=params)
+
+
+async def op_stats(client, state):
+    return "GET /api/stats", await client.get("/api/stats")
+
+
+async def op_timeseries(client, state):
+    return "GET /api/stats/timeseries", await client.get("/api/stats/timeseries")
+
+
+OPERATIONS = {
+    "create": op_create,
+    "batch": op_batch,
+    "get": op_get,
+    "history": op_history,
+    "notifications": op_notifications,
+    "search": op_search,
+    "stats": op_stats,
+    "timeseries": op_timeseries,
+}
+
+
+async def drive(app, state: LoadState, mix: dict, total: int, concurrency: int, warmup: int) -> dict:
+    """Run `warmup` untimed creates, then `total` operations from `concurrency` workers"""
+    names, weights = list(mix), list(mix.values())
+    endpoints, stages = {}, {}
+    errors = {}
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=None) as client:
+            for _ in range(warmup):
+                await op_create(client, state)
+
+            remaining = total
+
+            async def worker():
+                nonlocal remaining
+                while remaining > 0:
+                    remaining -= 1
+                    operation = OPERATIONS[state.rng.choices(names, weights)[0]]
+                    start = time.perf_counter()
+                    endpoint, response = await operation(client, state)
+                    endpoints.setdefault(endpoint, []).append(time.perf_counter() - start)
+                    if response.status_code >= 400:
+                        errors[endpoint] = errors.get(endpoint, 0) + 1
+                    for stage, seconds in parse_server_timing(response.headers.get("server-timing")).items():
+                        stages.setdefault(stage, []).append(seconds)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+
+    return {
+        "elapsed_s": elapsed,
+        "throughput": total / elapsed,
+        "endpoints": {name: {**summarize(values), "errors": errors.get(name, 0)}
+                      for name, values in sorted(endpoints.items())},
+        "stages": {name: summarize(values) for name, values in sorted(stages.items())},
+    }
+
+
+def summarize(latencies: list) -> dict:
+    """Count, mean and p50/p95/p99 in milliseconds"""
+    return {
+        "count": len(latencies),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def git_revision() -> tuple:
+    """(short commit hash, whether the tree has uncommitted changes)"""
+    try:
+        rev = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                      stderr=subprocess.DEVNULL).decode().strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"],
+                                             cwd=REPO_ROOT).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return rev, dirty
+
+
+def print_report(result: dict, baseline: dict = None):
+    print(f"\n{result['rev']}{' (dirty)' if result['dirty'] else ''}: "
+          f"{result['throughput']:.1f} req/s over {result['requests']} requests")
+    if baseline:
+        change = (result["throughput"] / baseline["throughput"] - 1) * 100
+        print(f"{baseline['rev']}: {baseline['throughput']:.1f} req/s ({change:+.1f}%)")
+
+    for section in ("endpoints", "stages"):
+        print(f"\n{section[:-1]:<36}{'count':>7}{'errors':>8}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}")
+        for name, row in result[section].items():
+            line = (f"{name:<36}{row['count']:>7}{row.get('errors', ''):>8}"
+                    f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}")
+            before = (baseline or {}).get(section, {}).get(name)
+            if before and before["p95_ms"]:
+                line += f"   p95 {(row['p95_ms'] / before['p95_ms'] - 1) * 100:+.0f}% vs {baseline['rev']}"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000, help="timed operations (a batch counts as one)")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=50, help="untimed creates before the run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation=weight list (%(default)s)")
+    parser.add_argument("--synthetic", type=float, default=0.5,
+                        help="fraction of bodies that are reworded variants rather than verbatim samples")
+    parser.add_argument("--fixtures", help="JSON file in the Sample_data.json format (default: Sample_data.json)")
+    parser.add_argument("--gemini-latency", type=float, default=0.2)
+    parser.add_argument("--ticket-latency", type=float, default=0.05)
+    parser.add_argument("--smtp-latency", type=float, default=0.1)
+    parser.add_argument("--jitter", type=float, default=0.2, help="latency spread, as a fraction of each latency")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--ticket-error-rate", type=float, default=0.0)
+    parser.add_argument("--smtp-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<rev>.json)")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    stubs = StubBackends(args.gemini_latency, args.ticket_latency, args.smtp_latency, seed=args.seed,
+                         error_rates={"gemini": args.gemini_error_rate, "ticket": args.ticket_error_rate,
+                                      "smtp": args.smtp_error_rate},
+                         jitter=args.jitter).install()
+    samples = load_sample_requests(args.fixtures)
+    rev, dirty = git_revision()
+
+    workdir = tempfile.mkdtemp(prefix="bench-load-")
+    os.chdir(workdir)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    import app
+    import structured_log
+
+    # Stubbed failures log warnings; keep them out of the report
+    log_file = open(os.path.join(workdir, "app.log"), "w")
+    app.configure_logging = lambda: structured_log.configure(level="WARNING", stream=log_file)
+
+    state = LoadState(samples, args.synthetic, args.seed)
+    run = asyncio.run(drive(app.app, state, mix, args.requests, args.concurrency, args.warmup))
+
+    result = {
+        "rev": rev,
+        "dirty": dirty,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "requests": args.requests,
+        **run,
+        "stub_calls": {"gemini": stubs.gemini_calls, "failures": stubs.failures},
+    }
+
+    print_report(result, baseline)
+
+    output = output or os.path.join(RESULTS_DIR, f"{rev}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nSaved {output} (app log: {os.path.join(workdir, 'app.log')})")
+
+
+if __name__ == "__main__":
+    main()
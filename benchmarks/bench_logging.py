@@ -0,0 +1,131 @@
+"""
+Per-request cost of logging on POST /api/incidents: logging off (WARNING),
+structured INFO through the background queue, INFO written synchronously
+from the request path, and DEBUG with payloads. Backends are stubbed with
+zero latency so the logging overhead is not hidden behind network waits;
+log lines go to a file in a temp directory. --sink-latency-ms simulates a
+log destination that blocks on write.
+
+    python benchmarks/bench_logging.py --requests 1000
+    python benchmarks/bench_logging.py --requests 200 --sink-latency-ms 1
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from stubs import StubBackends, load_sample_requests, percentile  # noqa: E402
+
+
+async def drive(app, bodies: list) -> list:
+    latencies = []
+    async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=None) as client:
+        for body in bodies:
+            start = time.perf_counter()
+            response = await client.post("/api/incidents", json=body)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+class SlowSink:
+    """File wrapper whose writes stall, like stdout piped into a backed-up log shipper"""
+
+    def __init__(self, stream, latency: float):
+        self.stream = stream
+        self.latency = latency
+
+    def write(self, data: str):
+        time.sleep(self.latency)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def use_sync_handler(structured_log, stream, level: str) -> logging.Handler:
+    """Format and write on the calling thread, as a plain StreamHandler would"""
+    structured_log.shutdown()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(structured_log.JSONFormatter())
+    handler.addFilter(structured_log.CorrelationFilter())
+    logging.getLogger().addHandler(handler)
+    logging.getLogger().setLevel(level)
+    return handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per mode")
+    parser.add_argument("--rounds", type=int, default=5, help="modes are interleaved over this many rounds")
+    parser.add_argument("--sink-latency-ms", type=float, default=0.0, help="stall every log write by this much")
+    args = parser.parse_args()
+
+    StubBackends(gemini_latency=0, ticket_latency=0, smtp_latency=0).install()
+    workdir = tempfile.mkdtemp(prefix="bench-logging-")
+    os.chdir(workdir)
+    import app
+    import structured_log
+
+    # Schema only: the lifespan hook's workers and log shutdown would interfere with the per-mode runs
+    app.db.init_db()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # the benchmark's client, not the app
+    samples = load_sample_requests()
+
+    # Warm caches, the sentiment engine and connection pools before timing anything
+    structured_log.configure(level="WARNING", stream=open(os.devnull, "w"))
+    asyncio.run(drive(app.app, [{**body, "message": f"{body['message']} (warmup {i})"}
+                                for i, body in enumerate(samples * 20)]))
+    app._classification_batcher = None
+
+    modes = ("off", "info (queued)", "info (sync)", "debug + payloads")
+    latencies = {mode: [] for mode in modes}
+    lines = dict.fromkeys(modes, 0)
+    per_round = max(1, args.requests // args.rounds)
+
+    for round_number in range(args.rounds):
+        for mode in modes:
+            path = os.path.join(workdir, f"{modes.index(mode)}.log")
+            with open(path, "a") as stream:
+                sink = SlowSink(stream, args.sink_latency_ms / 1000) if args.sink_latency_ms else stream
+                sync_handler = None
+                if mode == "info (sync)":
+                    sync_handler = use_sync_handler(structured_log, sink, "INFO")
+                else:
+                    level = {"off": "WARNING", "debug + payloads": "DEBUG"}.get(mode, "INFO")
+                    structured_log.configure(level=level, stream=sink)
+                app.LOG_DEBUG_PAYLOADS = mode == "debug + payloads"
+
+                offset = round_number * per_round
+                bodies = [{**samples[i % len(samples)],
+                           "message": f"{samples[i % len(samples)]['message']} ({mode} {offset + i})"}
+                          for i in range(per_round)]
+                latencies[mode] += asyncio.run(drive(app.app, bodies))
+                app._classification_batcher = None  # bound to the finished loop
+                time.sleep(0.1)  # let background email/outbox records land in this mode's file
+                structured_log.shutdown()
+                if sync_handler:
+                    logging.getLogger().removeHandler(sync_handler)
+
+    print(f"\n{'mode':<20}{'mean (ms)':>12}{'p50 (ms)':>10}{'p99 (ms)':>10}{'log lines':>11}")
+    baseline = sum(latencies["off"]) / len(latencies["off"])
+    for mode in modes:
+        with open(os.path.join(workdir, f"{modes.index(mode)}.log")) as f:
+            lines[mode] = sum(1 for _ in f)
+        mean = sum(latencies[mode]) / len(latencies[mode])
+        print(f"{mode:<20}{mean * 1000:>12.3f}{percentile(latencies[mode], 50) * 1000:>10.3f}"
+              f"{percentile(latencies[mode], 99) * 1000:>10.3f}{lines[mode]:>11}"
+              f"   (+{(mean - baseline) * 1e6:.0f} us/request)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Emails per second against a local SMTP stand-in: one connection + login per
+email (the original pattern) versus the pooled MailDispatcher.
+
+    python benchmarks/bench_mailer.py --emails 500 --concurrency 8 --connect-latency 0.05
+"""
+
+import argparse
+import os
+import smtplib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from stubs import LocalSMTPServer  # noqa: E402
+
+from mailer import MailDispatcher, SMTPConnectionPool  # noqa: E402
+
+
+def connect_per_email(port: int, dispatcher: MailDispatcher, n: int):
+    server = smtplib.SMTP("127.0.0.1", port)
+    server.login("bench@example.com", "bench")
+    server.send_message(dispatcher.build_message(f"customer{n}@example.com", "Ticket", "body"))
+    server.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--connect-latency", type=float, default=0.05, help="seconds per handshake + login")
+    parser.add_argument("--message-latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    stand_in = LocalSMTPServer(args.connect_latency, args.message_latency).start()
+    dispatcher = MailDispatcher(
+        SMTPConnectionPool("127.0.0.1", stand_in.port, "bench@example.com", "bench",
+                           use_ssl=False, size=args.concurrency),
+        sender="bench@example.com",
+        concurrency=args.concurrency,
+    )
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lambda n: connect_per_email(stand_in.port, dispatcher, n), range(args.emails)))
+    per_email_rate = args.emails / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    futures = [dispatcher.submit(f"customer{n}@example.com", "Ticket", "body") for n in range(args.emails)]
+    for future in futures:
+        future.result()
+    pooled_rate = args.emails / (time.perf_counter() - start)
+    dispatcher.stop()
+    stand_in.stop()
+
+    print(f"\n{'mode':<22}{'emails/s':>10}")
+    print(f"{'connect per email':<22}{per_email_rate:>10.1f}")
+    print(f"{'pooled dispatcher':<22}{pooled_rate:>10.1f}")
+    print(f"\nDispatcher: {dispatcher.stats()}   stand-in connections: {stand_in.connections}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Throughput / latency comparison of POST /api/incidents between two
+revisions of app.py, with every external backend stubbed out.
+
+    python benchmarks/bench_pipeline.py --baseline c98345b --requests 200 --concurrency 50
+
+While incidents are in flight a probe polls /health, which shows whether
+the event loop stays responsive under load.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(__file__))
+from stubs import StubBackends, load_sample_requests, percentile  # noqa: E402
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+import db  # noqa: E402
+
+
+def load_app(rev: str = None):
+    """Import app.py from the working tree, or from a git revision"""
+    if rev:
+        source = subprocess.check_output(["git", "show", f"{rev}:app.py"], cwd=REPO_ROOT).decode()
+    else:
+        with open(os.path.join(REPO_ROOT, "app.py")) as f:
+            source = f.read()
+    module = types.ModuleType(f"app_{rev or 'worktree'}")
+    module.__file__ = os.path.join(REPO_ROOT, "app.py")
+    exec(compile(source, f"{rev or 'worktree'}:app.py", "exec"), module.__dict__)
+    return module
+
+
+async def drive(app, bodies: list, total: int, concurrency: int) -> dict:
+    """Fire `total` incidents at the app and probe /health meanwhile"""
+    latencies, health_latencies = [], []
+    semaphore = asyncio.Semaphore(concurrency)
+    done = asyncio.Event()
+
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(app=app, base_url="http://bench", timeout=None) as client:
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                body = bodies[i % len(bodies)]
+                # Distinct messages, so revisions that suppress duplicates still run every request
+                body = {**body, "message": f"{body['message']} (run {i})"}
+                response = await client.post("/api/incidents", json=body)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        async def probe():
+            # Measured from the intended send time, so time spent waiting for
+            # a blocked event loop counts against /health
+            while not done.is_set():
+                intended = time.perf_counter() + 0.05
+                await asyncio.sleep(0.05)
+                await client.get("/health")
+                health_latencies.append(time.perf_counter() - intended)
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    return {
+        "throughput": total / elapsed,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "health_p99": percentile(health_latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default="HEAD", help="git revision to compare against")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--gemini-latency", type=float, default=0.2)
+    parser.add_argument("--ticket-latency", type=float, default=0.05)
+    parser.add_argument("--smtp-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    StubBackends(args.gemini_latency, args.ticket_latency, args.smtp_latency).install()
+    bodies = load_sample_requests()
+
+    results = {}
+    for label, rev in (("baseline", args.baseline), ("current", None)):
+        workdir = tempfile.mkdtemp(prefix=f"bench-{label}-")
+        os.chdir(workdir)
+        # Both runs share the db module; don't let the second reuse connections to the first's file
+        db.pool = db.ConnectionPool(os.path.join(workdir, "incidents.db"))
+        module = load_app(rev)
+        results[label] = asyncio.run(drive(module.app, bodies, args.requests, args.concurrency))
+
+    print(f"\n{'run':<10}{'req/s':>10}{'p50 (s)':>10}{'p99 (s)':>10}{'/health p99 (s)':>18}")
+    for label, r in results.items():
+        print(f"{label:<10}{r['throughput']:>10.1f}{r['p50']:>10.3f}{r['p99']:>10.3f}{r['health_p99']:>18.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Query latency of the API's read paths on a large incidents table, before
+(schema v1, original queries) and after (latest schema: keyset pages and the
+stats rollup table) the migrations.
+
+    python benchmarks/bench_queries.py --rows 1000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from stubs import percentile  # noqa: E402
+
+import db  # noqa: E402
+
+# The read paths as they were before keyset pagination
+LEGACY_CUSTOMER_INCIDENTS = f'''SELECT {db.INCIDENT_COLUMNS}
+    FROM incidents WHERE customer_id = ? ORDER BY created_at DESC'''
+# Before accept-then-process (v12) there was no incident_intake table to look in
+LEGACY_INCIDENT = f'SELECT {db.INCIDENT_COLUMNS} FROM incidents WHERE id = ?'
+LEGACY_NOTIFICATIONS = '''SELECT id, incident_id, channel, message, status, sent_at
+    FROM notifications WHERE incident_id = ? ORDER BY sent_at DESC'''
+
+
+def legacy_stats() -> dict:
+    """/api/stats before the rollup table: four scans of incidents"""
+    with db.pool.connection() as conn:
+        return {
+            "total_incidents": conn.execute("SELECT COUNT(*) FROM incidents").fetchone()[0],
+            "open_incidents": conn.execute("SELECT COUNT(*) FROM incidents WHERE status = 'open'").fetchone()[0],
+            "resolved_incidents": conn.execute(
+                "SELECT COUNT(*) FROM incidents WHERE status = 'resolved'").fetchone()[0],
+            "by_classification": conn.execute('''SELECT classification, COUNT(*) as count FROM incidents
+                                                 GROUP BY classification ORDER BY count DESC''').fetchall(),
+        }
+
+
+CATEGORIES = ["duplicate_payment", "failed_payment", "fraud_report", "refund_request",
+              "account_locked", "statement_error", "other"]
+
+
+def populate(rows: int, customers: int, seed: int = 7):
+    """Bulk-load synthetic incidents with two notifications each"""
+    rng = random.Random(seed)
+    batch = 50_000
+    with db.transaction() as conn:
+        for start in range(0, rows, batch):
+            incidents, notifications = [], []
+            for n in range(start, min(rows, start + batch)):
+                incident_id = f"inc-{n:08d}"
+                created = f"2025-{1 + n % 12:02d}-{1 + n % 28:02d} {n % 24:02d}:{n % 60:02d}:00"
+                incidents.append((incident_id, f"cust-{rng.randrange(customers)}", "email", "charged twice",
+                                  rng.choice(CATEGORIES), 0.9, "negative", -0.4, f"TKT-{n}",
+                                  "resolved" if n % 3 else "open", created))
+                for k in range(2):
+                    notifications.append((f"{incident_id}-{k}", incident_id, "email", "ack", created))
+            conn.executemany('''INSERT INTO incidents (id, customer_id, channel, message, classification,
+                                confidence, sentiment, polarity, ticket_id, status, created_at)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', incidents)
+            conn.executemany('''INSERT INTO notifications (id, incident_id, channel, message, sent_at)
+                                VALUES (?, ?, ?, ?, ?)''', notifications)
+
+
+def measure(fn, samples: int) -> dict:
+    latencies = []
+    for i in range(samples):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - start)
+    return {"p50": percentile(latencies, 50), "p99": percentile(latencies, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--samples", type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-queries-"), "incidents.db")
+    db.pool = db.ConnectionPool(path, size=2)
+    db.migrate(target=1)
+    print(f"Loading {args.rows:,} incidents...")
+    populate(args.rows, args.customers)
+
+    def customer(i):
+        return f"cust-{i * 7919 % args.customers}"
+
+    def incident(i):
+        return f"inc-{i * 104729 % args.rows:08d}"
+
+    def reminder_incident(i):
+        return f"inc-{i * 15485863 % args.rows:08d}"
+
+    baseline = {
+        "customer history": lambda i: db.fetch_all(LEGACY_CUSTOMER_INCIDENTS, (customer(i),)),
+        "notifications": lambda i: db.fetch_all(LEGACY_NOTIFICATIONS, (incident(i),)),
+        "reminder status check": lambda i: db.fetch_one(LEGACY_INCIDENT, (reminder_incident(i),)),
+        "stats": lambda i: legacy_stats(),
+    }
+    queries = {
+        "customer history": lambda i: db.fetch_customer_incidents(customer(i), 50),
+        "notifications": lambda i: db.fetch_incident_notifications(incident(i), 50),
+        "reminder status check": lambda i: db.fetch_incident(reminder_incident(i)),
+        "stats": lambda i: db.fetch_stats(),
+    }
+
+    results = {}
+    for label in ("v1 (no indexes)", f"v{db.LATEST_VERSION} (indexed)"):
+        active = queries
+        if label.startswith(f"v{db.LATEST_VERSION}"):
+            start = time.perf_counter()
+            db.migrate()
+            print(f"Migration took {time.perf_counter() - start:.1f}s")
+        else:
+            active = {**queries, **baseline}
+        results[label] = {name: measure(fn, args.samples) for name, fn in active.items()}
+
+    print(f"\n{'query':<24}" + "".join(f"{label:>32}" for label in results))
+    for name in queries:
+        cells = "".join(f"{r[name]['p50'] * 1000:>14.2f} / {r[name]['p99'] * 1000:>8.2f} ms" for r in results.values())
+        print(f"{name:<24}{cells}   (p50 / p99)")
+
+
+if __name__ == "__main__":
+    main()
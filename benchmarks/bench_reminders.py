@@ -0,0 +1,87 @@
+"""
+Reminder scheduler: how late reminders are delivered, and how often the
+timer thread queries the reminders table once nothing is due.
+
+Schedules --reminders reminders due --delay seconds from now, waits for
+them all to be delivered, then watches the idle thread for --idle seconds.
+An idle thread should sleep until the next due reminder or
+max_sleep_seconds, so it makes at most a few queries. Exits non-zero if it
+keeps polling (a timer stuck on a due time already in the past).
+
+    python benchmarks/bench_reminders.py --reminders 200 --delay 1 --idle 3
+"""
+
+import argparse
+import calendar
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from stubs import percentile  # noqa: E402
+
+import db  # noqa: E402
+from reminders import ReminderScheduler  # noqa: E402
+
+# An idle timer wakes once per max_sleep_seconds at most; allow for the wake that ends the delivery run
+IDLE_QUERY_LIMIT = 3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reminders", type=int, default=200)
+    parser.add_argument("--delay", type=int, default=1, help="seconds until the reminders are due")
+    parser.add_argument("--idle", type=float, default=3.0, help="seconds to watch the thread after delivery")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-reminders-")
+    db.pool = db.ConnectionPool(os.path.join(workdir, "incidents.db"))
+    db.init_db()
+    db.store_incidents([(f"rem-{i}", "bench", "email", "charged twice", "duplicate_payment", 0.9, "negative", -0.5,
+                         f"TKT-{i}", "gemini") for i in range(args.reminders)])
+
+    lags = []
+
+    def deliver(incident_id, email, channel, ticket_id):
+        lags.append(time.time() - due_at)
+
+    scheduler = ReminderScheduler(deliver, delay_seconds=args.delay)
+    queries = 0
+    earliest_pending = scheduler._earliest_pending
+
+    def counted_earliest_pending():
+        nonlocal queries
+        queries += 1
+        return earliest_pending()
+
+    scheduler._earliest_pending = counted_earliest_pending
+    scheduler.start()
+    scheduler.schedule_many([(f"rem-{i}", "customer@example.com", "email", f"TKT-{i}")
+                             for i in range(args.reminders)])
+    # due_at has one-second resolution; lag is measured from the start of that second
+    due_at = calendar.timegm(datetime.strptime(db.fetch_one("SELECT MIN(due_at) FROM reminders")[0],
+                                               '%Y-%m-%d %H:%M:%S').timetuple())
+
+    deadline = time.time() + args.delay + 30
+    while len(lags) < args.reminders and time.time() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.2)  # let the delivery run finish and the thread go back to sleep
+    queries_before_idle = queries
+    time.sleep(args.idle)
+    idle_queries = queries - queries_before_idle
+    scheduler.stop()
+
+    print(f"{args.reminders} reminders due in {args.delay}s: delivered {len(lags)}, "
+          f"lag p50 {percentile(lags, 50) * 1000:.0f} ms, p99 {percentile(lags, 99) * 1000:.0f} ms")
+    print(f"queries while idle for {args.idle:g}s: {idle_queries}")
+    if len(lags) < args.reminders:
+        sys.exit("not every reminder was delivered")
+    if idle_queries > IDLE_QUERY_LIMIT:
+        sys.exit(f"timer thread kept polling after delivery ({idle_queries} queries in {args.idle:g}s)")
+
+
+if __name__ == "__main__":
+    main()
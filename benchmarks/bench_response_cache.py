@@ -0,0 +1,162 @@
+"""
+Dashboard polling of GET /api/incidents/{id} and GET /api/notifications/{id}
+with the response cache off, on, and on with clients revalidating their
+copies (If-None-Match, answered 304 while unchanged).
+
+The database holds --incidents incidents with two notifications each.
+Dashboards poll a hot set of --watched open incidents, --rate reads a
+second in total, each read started on schedule whether or not earlier ones
+have finished (as browsers polling on a timer do). Meanwhile a writer
+changes watched incidents --writes-per-second times a second (notification
+retries, reminders, resolutions), straight through db.py as the background
+workers or another uvicorn worker would. So every invalidation arrives
+through the incident_changes log.
+
+Reports read latency, process CPU time per read (the in-process client's
+share included), and database queries per read: incident and notification
+fetches plus the cache's change-log syncs.
+
+    python benchmarks/bench_response_cache.py --reads 20000 --rate 500 --writes-per-second 20
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from stubs import StubBackends, percentile  # noqa: E402
+
+import metrics  # noqa: E402
+from response_cache import ResponseCache  # noqa: E402
+
+QUERIES = ("fetch_incident", "fetch_incident_notifications", "sync_changes")
+WRITES = (
+    "UPDATE notifications SET status = 'pending', attempts = attempts + 1 WHERE incident_id = ? AND channel = 'email'",
+    "UPDATE notifications SET status = 'sent', sent_at = CURRENT_TIMESTAMP WHERE incident_id = ?",
+    "UPDATE incidents SET reminder_sent = 1 WHERE id = ?",
+    "UPDATE incidents SET status = 'resolved', resolved_at = CURRENT_TIMESTAMP WHERE id = ?",
+)
+
+
+def seed(app, incidents: int):
+    app.db.init_db()
+    rows, notifications = [], []
+    for i in range(incidents):
+        incident_id = f"inc-{i:06d}"
+        rows.append((incident_id, f"cust-{i % 500}", "email", f"My card payment failed again (order {i})",
+                     "payment_failed", 0.9, "negative", -0.6, f"TKT-{i}", "gemini"))
+        for channel in ("email", "sms"):
+            notifications.append((f"{incident_id}-{channel}", incident_id, channel, f"Ticket TKT-{i} created",
+                                  "customer@example.com", f"TKT-{i}"))
+    app.db.store_incidents(rows, notifications)
+    app.db.execute("UPDATE notifications SET status = 'sent', attempts = 1")  # keep the outbox idle
+
+
+def query_counts() -> dict:
+    return {name: metrics.DB_QUERY_SECONDS.count(query=name) for name in QUERIES}
+
+
+async def drive(app, watched: list, reads: int, rate: float, writes_per_second: float,
+                revalidate: bool, seed_value: int = 7) -> dict:
+    rng = random.Random(seed_value)
+    latencies, statuses = [], {}
+    etags = {}
+    done = asyncio.Event()
+    writes = 0
+
+    async with app.app.router.lifespan_context(app.app), \
+            httpx.AsyncClient(app=app.app, base_url="http://bench", timeout=None) as client:
+        async def read(url: str):
+            headers = {"If-None-Match": etags[url]} if revalidate and url in etags else {}
+            start = time.perf_counter()
+            response = await client.get(url, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if "etag" in response.headers:
+                etags[url] = response.headers["etag"]
+
+        async def dashboards():
+            tasks = []
+            for i in range(reads):
+                await asyncio.sleep(max(0.0, start + i / rate - time.perf_counter()))
+                incident_id = rng.choice(watched)
+                url = (f"/api/incidents/{incident_id}" if rng.random() < 0.5
+                       else f"/api/notifications/{incident_id}")
+                tasks.append(asyncio.create_task(read(url)))
+            await asyncio.gather(*tasks)
+
+        async def writer():
+            nonlocal writes
+            loop = asyncio.get_running_loop()
+            interval = 1 / writes_per_second
+            while not done.is_set():
+                sql = rng.choice(WRITES)
+                await loop.run_in_executor(None, app.db.execute, sql, (rng.choice(watched),))
+                writes += 1
+                try:
+                    await asyncio.wait_for(done.wait(), interval)
+                except asyncio.TimeoutError:
+                    pass
+
+        before = query_counts()
+        write_task = asyncio.create_task(writer()) if writes_per_second > 0 else None
+        start, cpu = time.perf_counter(), time.process_time()
+        await dashboards()
+        elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu
+        done.set()
+        if write_task:
+            await write_task
+        after = query_counts()
+
+    return {"latencies": latencies, "elapsed": elapsed, "cpu": cpu, "statuses": statuses, "writes": writes,
+            "queries": {name: after[name] - before[name] for name in QUERIES}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--incidents", type=int, default=5000)
+    parser.add_argument("--watched", type=int, default=300, help="open incidents the dashboards poll")
+    parser.add_argument("--reads", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=500, help="reads started per second")
+    parser.add_argument("--writes-per-second", type=float, default=20)
+    parser.add_argument("--sync-seconds", type=float, default=0.5, help="RESPONSE_CACHE_SYNC_SECONDS")
+    args = parser.parse_args()
+
+    StubBackends().install()
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    import app
+
+    watched = [f"inc-{i:06d}" for i in random.Random(3).sample(range(args.incidents), args.watched)]
+    modes = [("no cache", 0, False), ("cache", 10000, False), ("cache + If-None-Match", 10000, True)]
+
+    print(f"{args.reads} reads of {args.watched} watched incidents ({args.incidents} stored), "
+          f"{args.rate:g} reads/s, {args.writes_per_second:g} writes/s, "
+          f"sync every {args.sync_seconds}s")
+    print(f"\n{'mode':<24}{'p50 (ms)':>10}{'p99 (ms)':>10}{'CPU/read (ms)':>15}{'hit rate':>10}{'304s':>7}"
+          f"{'fetches':>9}{'syncs':>7}{'queries/read':>14}")
+    for mode, size, revalidate in modes:
+        workdir = tempfile.mkdtemp(prefix="bench-response-cache-")
+        os.chdir(workdir)
+        app.db.pool = app.db.ConnectionPool(os.path.join(workdir, "incidents.db"))
+        seed(app, args.incidents)
+        app.response_cache = ResponseCache(max_incidents=size, sync_seconds=args.sync_seconds)
+
+        result = asyncio.run(drive(app, watched, args.reads, args.rate, args.writes_per_second, revalidate))
+        latencies, queries = result["latencies"], result["queries"]
+        fetches = queries["fetch_incident"] + queries["fetch_incident_notifications"]
+        stats = app.response_cache.stats()
+        print(f"{mode:<24}{percentile(latencies, 50) * 1000:>10.2f}{percentile(latencies, 99) * 1000:>10.2f}"
+              f"{result['cpu'] / len(latencies) * 1000:>15.3f}{stats['hit_rate'] * 100:>9.1f}%"
+              f"{result['statuses'].get(304, 0):>7}{fetches:>9}{queries['sync_changes']:>7}"
+              f"{(fetches + queries['sync_changes']) / len(latencies):>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+What happens to urgent, negative and routine incidents when a burst
+outruns Gemini's quota, with the scheduler unthrottled (every request goes
+straight to Gemini, as before), rate limited in arrival order, and rate
+limited by priority.
+
+The Gemini stub enforces the quota: calls beyond it answer 429
+(ResourceExhausted), which the pipeline turns into the "other"/0.3
+fallback. The burst is sent all at once; a share of the messages mention
+fraud (urgent) and a share are negative.
+
+    python benchmarks/bench_scheduler.py --incidents 300 --quota 20 --max-wait 5
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from stubs import StubBackends, percentile  # noqa: E402
+
+from llm_scheduler import PRIORITY_NAMES, ROUTINE, LLMScheduler  # noqa: E402
+
+MESSAGES = {
+    "urgent": "There is an unauthorized transaction on my card that I never made",
+    "elevated": "This is terrible, my payment failed again and I am furious",
+    "routine": "Please send me a copy of my monthly statement",
+}
+
+
+def workload(incidents: int, urgent: float, negative: float, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    bodies = []
+    for i in range(incidents):
+        draw = rng.random()
+        kind = "urgent" if draw < urgent else "elevated" if draw < urgent + negative else "routine"
+        bodies.append((kind, {"customer_id": f"sched-{i}", "channel": "email",
+                              "message": f"{MESSAGES[kind]} (reference {i})"}))
+    return bodies
+
+
+async def drive(app, bodies: list) -> list:
+    """Send every request at once; returns (kind, status, source, seconds) per request"""
+    outcomes = []
+    async with app.app.router.lifespan_context(app.app), \
+            httpx.AsyncClient(app=app.app, base_url="http://bench", timeout=None) as client:
+        async def one(kind, body):
+            start = time.perf_counter()
+            response = await client.post("/api/incidents", json=body)
+            elapsed = time.perf_counter() - start
+            source = None
+            if response.status_code == 201:
+                source = app.db.fetch_one("SELECT classified_by FROM incidents WHERE id = ?",
+                                          (response.json()["incident_id"],))[0]
+            outcomes.append((kind, response.status_code, source, elapsed))
+
+        await asyncio.gather(*(one(kind, body) for kind, body in bodies))
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--incidents", type=int, default=300)
+    parser.add_argument("--urgent", type=float, default=0.15, help="share mentioning fraud")
+    parser.add_argument("--negative", type=float, default=0.35, help="share with negative sentiment")
+    parser.add_argument("--quota", type=int, default=20, help="Gemini calls allowed per second")
+    parser.add_argument("--max-wait", type=float, default=5.0, help="GEMINI_MAX_WAIT_SECONDS")
+    parser.add_argument("--gemini-latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    stubs = StubBackends(gemini_latency=args.gemini_latency, ticket_latency=0.02, smtp_latency=0.0,
+                         gemini_quota=(args.quota, 1.0)).install()
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    os.environ["FAST_PATH_ENABLED"] = "false"  # every incident needs Gemini
+    os.environ["GEMINI_RATE_LIMIT_PAUSE_SECONDS"] = "1"
+    import app
+
+    bodies = workload(args.incidents, args.urgent, args.negative)
+
+    def fifo(message, sentiment):
+        return ROUTINE
+
+    modes = [
+        ("unthrottled, FIFO", 0, None, fifo),
+        ("rate limited, FIFO", args.quota * 60, args.max_wait, fifo),
+        ("rate limited, priority", args.quota * 60, args.max_wait, app.classification_priority),
+    ]
+
+    print(f"{args.incidents} incidents at once, Gemini quota {args.quota}/s, {args.gemini_latency}s per call, "
+          f"max wait {args.max_wait}s")
+    print(f"\n{'mode':<24}{'class':<10}{'count':>6}{'gemini':>8}{'fallback':>10}{'429':>6}"
+          f"{'p50 (s)':>9}{'p95 (s)':>9}{'429 p50':>9}")
+    for mode, rate, max_wait, priority in modes:
+        workdir = tempfile.mkdtemp(prefix="bench-scheduler-")
+        os.chdir(workdir)
+        app.db.pool = app.db.ConnectionPool(os.path.join(workdir, "incidents.db"))
+        app.classification_cache._memory.clear()
+        app.gemini_scheduler = LLMScheduler(rate_per_minute=rate, concurrency=app.CLASSIFY_CONCURRENCY)
+        app.GEMINI_MAX_WAIT_SECONDS = max_wait
+        app.classification_priority = priority
+        stubs.gemini_rate_limited = 0
+
+        outcomes = asyncio.run(drive(app, bodies))
+        for kind in PRIORITY_NAMES:
+            rows = [outcome for outcome in outcomes if outcome[0] == kind]
+            served = [seconds for _, code, source, seconds in rows if source == "gemini"]
+            shed = [seconds for _, code, _, seconds in rows if code == 429]
+            print(f"{mode if kind == 'urgent' else '':<24}{kind:<10}{len(rows):>6}{len(served):>8}"
+                  f"{sum(1 for _, _, source, _ in rows if source == 'fallback'):>10}"
+                  f"{len(shed):>6}{percentile(served, 50):>9.2f}{percentile(served, 95):>9.2f}"
+                  f"{percentile(shed, 50):>9.2f}")
+        print(f"{'':<24}Gemini 429s: {stubs.gemini_rate_limited}")
+
+
+if __name__ == "__main__":
+    main()
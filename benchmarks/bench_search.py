@@ -0,0 +1,146 @@
+"""
+Full-text search latency on a large incidents table: the FTS5 index behind
+GET /api/incidents/search against the LIKE scan that was the only way to
+find messages before. Also reports what the index costs: build time when
+the migration runs, database size and insert throughput with the sync
+triggers.
+
+Messages are sample texts plus words drawn from a Zipf-distributed
+vocabulary, so terms range from very common to rare.
+
+    python benchmarks/bench_search.py --rows 3000000
+"""
+
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from stubs import load_sample_requests, percentile  # noqa: E402
+
+import db  # noqa: E402
+
+SEARCH_VERSION = 11  # schema version that adds incidents_fts
+CATEGORIES = ["duplicate_payment", "failed_payment", "fraud_report", "refund_request",
+              "account_locked", "statement_error", "other"]
+SENTIMENTS = ["negative", "neutral", "positive"]
+VOCABULARY = 20_000
+RANKS = range(VOCABULARY)
+CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in RANKS))
+
+LIKE_SEARCH = f'''SELECT {db.INCIDENT_COLUMNS} FROM incidents WHERE message LIKE ?
+    ORDER BY created_at DESC LIMIT 50'''
+
+
+def word(rank: int) -> str:
+    """Synthetic vocabulary word; low ranks are the frequent ones"""
+    return f"w{rank}x"
+
+
+def rows(start: int, count: int, rng: random.Random, samples: list):
+    for n in range(start, start + count):
+        extra = " ".join(word(rank) for rank in rng.choices(RANKS, cum_weights=CUM_WEIGHTS, k=6))
+        created = f"2025-{1 + n % 12:02d}-{1 + n % 28:02d} {n % 24:02d}:{n % 60:02d}:00"
+        yield (f"inc-{n:08d}", f"cust-{rng.randrange(100_000)}", "email", f"{samples[n % len(samples)]} {extra}",
+               rng.choice(CATEGORIES), 0.9, rng.choice(SENTIMENTS), -0.4, f"TKT-{n}",
+               "resolved" if n % 3 else "open", created)
+
+
+def insert(start: int, count: int, rng: random.Random, samples: list, batch: int = 50_000) -> float:
+    """Insert `count` incidents in `batch`-row transactions; returns rows per second"""
+    began = time.perf_counter()
+    for offset in range(start, start + count, batch):
+        with db.transaction() as conn:
+            conn.executemany('''INSERT INTO incidents (id, customer_id, channel, message, classification,
+                                confidence, sentiment, polarity, ticket_id, status, created_at)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                             rows(offset, min(batch, start + count - offset), rng, samples))
+    return count / (time.perf_counter() - began)
+
+
+def measure(fn, samples: int) -> dict:
+    latencies = []
+    for i in range(samples):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - start)
+    return {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95)}
+
+
+def db_size(path: str) -> float:
+    return sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix)) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=3_000_000)
+    parser.add_argument("--write-rows", type=int, default=20_000, help="rows timed for insert throughput")
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--rank-window", type=int, default=10_000, help="SEARCH_RANK_WINDOW to compare")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    samples = [body["message"] for body in load_sample_requests()]
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-search-"), "incidents.db")
+    db.pool = db.ConnectionPool(path, size=2)
+    db.migrate(target=SEARCH_VERSION - 1)
+
+    print(f"Loading {args.rows:,} incidents...")
+    insert(0, args.rows - args.write_rows, rng, samples)
+    plain_rate = insert(args.rows - args.write_rows, args.write_rows, rng, samples, batch=100)
+    with db.transaction() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    size_before = db_size(path)
+
+    start = time.perf_counter()
+    db.migrate(target=SEARCH_VERSION)
+    build = time.perf_counter() - start
+    indexed_rate = insert(args.rows, args.write_rows, rng, samples, batch=100)
+    with db.transaction() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    print(f"Index build (migration v{SEARCH_VERSION}): {build:.1f}s; database {size_before:.0f} MB -> "
+          f"{db_size(path):.0f} MB")
+    print(f"Inserts in 100-row transactions: {plain_rate:,.0f} rows/s without the index, "
+          f"{indexed_rate:,.0f} rows/s with it")
+
+    def rare(i):
+        return word(15_000 + i * 37 % 5000)
+
+    def medium(i):
+        return word(200 + i * 13 % 300)
+
+    # (label, FTS5 query, filters, order, LIKE pattern for the old way or None)
+    cases = [
+        ("rare word (~0.01%)", lambda i: f'"{rare(i)}"', {}, "rank", lambda i: f"%{rare(i)}%"),
+        ("medium word (~0.5%)", lambda i: f'"{medium(i)}"', {}, "rank", lambda i: f"%{medium(i)}%"),
+        ("common word (~30%)", lambda i: '"deducted"', {}, "rank", lambda i: "%deducted%"),
+        ("common word, newest", lambda i: '"deducted"', {}, "newest", None),
+        ("two words", lambda i: f'"fraud" "{medium(i)}"', {}, "rank", None),
+        ("phrase", lambda i: '"account is locked"', {}, "rank", None),
+        ("prefix", lambda i: f"{medium(i)[:-2]}*", {}, "rank", None),
+        ("medium word + 3 filters", lambda i: f'"{medium(i)}"',
+         {"classification": "fraud_report", "status": "open", "created_after": "2025-06-01 00:00:00"}, "rank", None),
+        ("common word + 3 filters", lambda i: '"deducted"',
+         {"classification": "fraud_report", "status": "open", "created_after": "2025-06-01 00:00:00"}, "rank", None),
+    ]
+
+    print(f"\n{'query':<26}{'FTS5, all ranked':>22}{f'newest {args.rank_window} ranked':>24}"
+          f"{'LIKE scan':>22}   (p50 / p95 ms, page of 50)")
+    for label, match, filters, order, like in cases:
+        line = f"{label:<26}"
+        for window in (None, args.rank_window):
+            fts = measure(lambda i: db.search_incidents(match(i), filters, order, 51, 0, window), args.samples)
+            line += f"{fts['p50'] * 1000:>12.2f} / {fts['p95'] * 1000:>8.2f}"
+        if like is not None:
+            scan = measure(lambda i: db.fetch_all(LIKE_SEARCH, (like(i),)), max(3, args.samples // 5))
+            line += f"{scan['p50'] * 1000:>12.1f} / {scan['p95'] * 1000:>8.1f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
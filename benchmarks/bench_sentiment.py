@@ -0,0 +1,80 @@
+"""
+Per-request sentiment cost: a fresh SentimentIntensityAnalyzer per call (the
+original pattern) versus the shared SentimentEngine, single and batched.
+
+    python benchmarks/bench_sentiment.py --messages 2000 --threads 4 --repeat-ratio 0.5
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from stubs import load_sample_requests, percentile  # noqa: E402
+
+from sentiment import SentimentEngine  # noqa: E402
+
+
+def per_call_analyzer(message: str) -> float:
+    import nltk
+    from nltk.sentiment import SentimentIntensityAnalyzer
+
+    nltk.data.find('sentiment/vader_lexicon')
+    return SentimentIntensityAnalyzer().polarity_scores(message)['compound']
+
+
+def timed(fn, messages: list, threads: int) -> list:
+    def one(message):
+        start = time.perf_counter()
+        fn(message)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(one, messages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--repeat-ratio", type=float, default=0.5, help="share of messages that repeat a sample")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    samples = [body["message"] for body in load_sample_requests()]
+    messages = [rng.choice(samples) if rng.random() < args.repeat_ratio else f"{rng.choice(samples)} #{i}"
+                for i in range(args.messages)]
+
+    engine = SentimentEngine()
+    start = time.perf_counter()
+    engine.warm()
+    print(f"One-time lexicon load: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    # The per-call pattern is slow; a slice is enough for stable numbers
+    per_call = timed(per_call_analyzer, messages[:max(50, args.messages // 20)], args.threads)
+    shared = timed(engine.score, messages, args.threads)
+
+    unmemoized = SentimentEngine(memo_size=0)
+    unmemoized.warm()
+    no_memo = timed(unmemoized.score, messages, args.threads)
+
+    batch_engine = SentimentEngine()
+    batch_engine.warm()
+    start = time.perf_counter()
+    batch_engine.score_batch(messages)
+    batch_per_message = (time.perf_counter() - start) / len(messages)
+
+    print(f"\n{'mode':<28}{'p50 (ms)':>10}{'p99 (ms)':>10}")
+    for label, latencies in (("analyzer per call", per_call), ("shared engine, no memo", no_memo),
+                             ("shared engine", shared)):
+        print(f"{label:<28}{percentile(latencies, 50) * 1000:>10.3f}{percentile(latencies, 99) * 1000:>10.3f}")
+    print(f"{'shared engine, batched':<28}{batch_per_message * 1000:>10.3f}{'(mean)':>10}")
+    print(f"\nMemo: {engine.stats()}")
+
+
+if __name__ == "__main__":
+    main()
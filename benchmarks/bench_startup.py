@@ -0,0 +1,90 @@
+"""
+Cold start of the app: time to import app.py, to finish the startup hooks
+(when uvicorn would start accepting connections, so /health answers) and to
+be ready (/ready answers 200: DB migrated, VADER lexicon and Gemini handle
+warmed). Each sample is a fresh interpreter on a fresh database; revisions
+are checked out with `git archive` and alternated.
+
+    python benchmarks/bench_startup.py --baseline HEAD~1 --runs 5
+
+Revisions without /ready have no readiness signal; their ready point is
+taken as the startup hooks having returned and the VADER lexicon (warmed in
+the background there) having loaded.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def child(tree: str):
+    """Measure one cold start of the app in `tree`, printing a JSON line"""
+    sys.path.insert(0, tree)
+    os.chdir(tempfile.mkdtemp(prefix="bench-startup-"))
+    os.environ["LOG_LEVEL"] = "WARNING"
+    import httpx  # the probe client, not part of the app's start-up
+
+    start = time.perf_counter()
+    import app
+    imported = time.perf_counter() - start
+
+    async def run():
+        async with app.app.router.lifespan_context(app.app):
+            live = time.perf_counter() - start
+            async with httpx.AsyncClient(app=app.app, base_url="http://bench") as client:
+                while True:
+                    response = await client.get("/ready")
+                    if response.status_code == 200:
+                        break
+                    if response.status_code == 404 and app.sentiment_engine._analyzer is not None:
+                        break
+                    await asyncio.sleep(0.005)
+            return live, time.perf_counter() - start
+
+    live, ready = asyncio.run(run())
+    print(json.dumps({"import": imported, "live": live, "ready": ready}))
+
+
+def checkout(rev: str) -> str:
+    """Extract a revision of the repository into a temporary directory"""
+    tree = tempfile.mkdtemp(prefix=f"bench-startup-{rev.replace('/', '_')}-")
+    archive = subprocess.run(["git", "archive", rev], cwd=REPO_ROOT, check=True, capture_output=True).stdout
+    subprocess.run(["tar", "-x", "-C", tree], input=archive, check=True)
+    return tree
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default="HEAD", help="git revision to compare against")
+    parser.add_argument("--runs", type=int, default=5, help="cold starts per revision")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    trees = {f"baseline ({args.baseline})": checkout(args.baseline), "current": REPO_ROOT}
+    samples = {label: [] for label in trees}
+    for _ in range(args.runs):
+        for label, tree in trees.items():
+            output = subprocess.run([sys.executable, __file__, "--child", tree], check=True,
+                                    capture_output=True, text=True).stdout
+            samples[label].append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"\n{'run':<24}{'import (s)':>12}{'live (s)':>10}{'ready (s)':>11}   (medians of {args.runs})")
+    for label, runs in samples.items():
+        medians = [statistics.median(run[key] for run in runs) for key in ("import", "live", "ready")]
+        print(f"{label:<24}{medians[0]:>12.3f}{medians[1]:>10.3f}{medians[2]:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Ticket creation against a local mock ticket API: a bare requests.post per
+incident (the original pattern) versus the pooled TicketClient, followed by
+an outage showing how fast the circuit breaker falls back and how the
+reconciler catches up afterwards.
+
+    python benchmarks/bench_ticketing.py --tickets 300 --concurrency 16
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from stubs import LocalTicketServer, percentile  # noqa: E402
+
+import requests  # noqa: E402
+
+import db  # noqa: E402
+from ticketing import CircuitBreaker, TicketClient, TicketReconciler  # noqa: E402
+
+
+def timed_map(fn, n: int, concurrency: int) -> list:
+    def one(i):
+        start = time.perf_counter()
+        result = fn(i)
+        return time.perf_counter() - start, result
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, range(n)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--timeout", type=float, default=1.0, help="client timeout during the outage")
+    args = parser.parse_args()
+
+    server = LocalTicketServer(args.latency).start()
+    client = TicketClient(server.url, timeout=args.timeout, pool_size=args.concurrency,
+                          breaker=CircuitBreaker(failure_threshold=5, reset_seconds=60))
+
+    def bare_post(i):
+        return requests.post(server.url, json={"name": f"Incident {i}"}, timeout=args.timeout).status_code
+
+    print(f"\n{'mode':<30}{'tickets/s':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}{'connections':>13}")
+    for label, fn in (("requests.post per ticket", bare_post),
+                      ("pooled client", lambda i: client.create_ticket(f"inc-{i}", "other", "m"))):
+        before = server.connections
+        start = time.perf_counter()
+        latencies = [lat for lat, _ in timed_map(fn, args.tickets, args.concurrency)]
+        rate = args.tickets / (time.perf_counter() - start)
+        print(f"{label:<30}{rate:>10.1f}{percentile(latencies, 50) * 1000:>10.2f}"
+              f"{percentile(latencies, 99) * 1000:>10.2f}{server.connections - before:>13}")
+
+    # Outage: the API hangs past the timeout until the breaker opens
+    server.hang = True
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-tickets-"), "incidents.db")
+    db.pool = db.ConnectionPool(path, size=2)
+    db.init_db()
+    results = timed_map(lambda i: client.create_ticket(f"inc-out-{i}", "other", "m"), args.tickets, args.concurrency)
+    latencies = [lat for lat, _ in results]
+    print(f"\nOutage: {args.tickets} incidents, breaker={client.breaker.state}, "
+          f"p50 {percentile(latencies, 50) * 1000:.2f} ms, p99 {percentile(latencies, 99) * 1000:.0f} ms "
+          f"(timeout {args.timeout * 1000:.0f} ms)")
+
+    for i, (_, ticket_id) in enumerate(results):
+        db.store_incident(f"inc-out-{i}", "c", "email", "m", "other", 0.3, "neutral", 0.0, ticket_id)
+
+    # Recovery: reconcile local IDs once the API is back
+    server.hang = False
+    client.breaker.reset_seconds = 0
+    reconciler = TicketReconciler(client, batch_size=args.tickets)
+    start = time.perf_counter()
+    reconciled = reconciler.reconcile_batch()
+    print(f"Recovery: reconciled {reconciled} local ticket IDs in {time.perf_counter() - start:.2f}s, "
+          f"breaker={client.breaker.state}")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
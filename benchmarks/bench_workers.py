@@ -0,0 +1,155 @@
+"""
+Throughput of POST /api/incidents when uvicorn runs 1, 2, 4 and 8 worker
+processes over a shared incidents.db. Backends are stubbed inside every
+worker; load comes over real HTTP from several client processes.
+
+After each run the database is checked for coordination problems: every
+notification must be sent exactly once (none left pending or claimed, none
+attempted twice). "duty owners" is how many processes ended up holding a
+background lease; each lease itself has one holder by construction.
+
+    python benchmarks/bench_workers.py --workers 1,2,4,8 --requests 2000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(BENCH_DIR, ".."))
+sys.path.insert(0, BENCH_DIR)
+from stubs import load_sample_requests, percentile  # noqa: E402
+
+# Imported by every uvicorn worker process in place of app.py
+WORKER_MODULE = """import sys
+sys.path[:0] = [{bench_dir!r}, {repo_root!r}]
+from stubs import StubBackends
+StubBackends({gemini}, {ticket}, {smtp}, jitter=0.2).install()
+from app import app  # noqa: E402,F401
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir: str, workers: int, port: int):
+    env = {**os.environ, "LOG_LEVEL": "WARNING", "INCIDENTS_DB": os.path.join(workdir, "incidents.db"),
+           "OUTBOX_SMS_WORKERS": "8", "OUTBOX_EMAIL_WORKERS": "8", "WEB_CONCURRENCY": str(workers)}
+    log = open(os.path.join(workdir, "server.log"), "w")
+    return subprocess.Popen([sys.executable, "-m", "uvicorn", "bench_app:app",
+                             "--port", str(port), "--log-level", "warning"],
+                            cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_ready(base_url: str, workers: int, timeout: float = 60.0):
+    """Wait until /ready has answered 200 enough times in a row to have reached every worker"""
+    deadline = time.monotonic() + timeout
+    streak = 0
+    while streak < workers * 4:
+        if time.monotonic() > deadline:
+            raise RuntimeError("server did not become ready")
+        try:
+            streak = streak + 1 if httpx.get(f"{base_url}/ready", timeout=2).status_code == 200 else 0
+        except httpx.TransportError:
+            streak = 0
+        time.sleep(0.05)
+
+
+def client_process(args: tuple) -> list:
+    """One load-generating process: `count` creates at `concurrency`, returns latencies"""
+    base_url, bodies, offset, count, concurrency = args
+
+    async def run():
+        latencies = []
+        semaphore = asyncio.Semaphore(concurrency)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+            async def one(i):
+                body = bodies[i % len(bodies)]
+                body = {**body, "message": f"{body['message']} (load {offset + i})"}
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.post("/api/incidents", json=body)
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+            await asyncio.gather(*(one(i) for i in range(count)))
+        return latencies
+
+    return asyncio.run(run())
+
+
+def check_database(path: str, timeout: float = 30.0) -> dict:
+    """Wait for the outbox to drain, then count anything that went wrong"""
+    conn = sqlite3.connect(path)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        outstanding = conn.execute("SELECT COUNT(*) FROM notifications WHERE status IN ('pending', 'sending')")
+        if outstanding.fetchone()[0] == 0:
+            break
+        time.sleep(0.2)
+    counts = dict(conn.execute("SELECT status, COUNT(*) FROM notifications GROUP BY status").fetchall())
+    counts["attempted_twice"] = conn.execute("SELECT COUNT(*) FROM notifications WHERE attempts > 1").fetchone()[0]
+    counts["incidents"] = conn.execute("SELECT COUNT(*) FROM incidents").fetchone()[0]
+    counts["duty_owners"] = conn.execute("SELECT COUNT(DISTINCT owner) FROM leases").fetchone()[0]
+    conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4,8", help="comma-separated uvicorn worker counts")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64, help="in-flight requests across all clients")
+    parser.add_argument("--clients", type=int, default=4, help="load-generating processes")
+    parser.add_argument("--gemini-latency", type=float, default=0.2)
+    parser.add_argument("--ticket-latency", type=float, default=0.05)
+    parser.add_argument("--smtp-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    bodies = load_sample_requests()
+    per_client = args.requests // args.clients
+    print(f"{os.cpu_count()} CPUs; {args.clients} client processes, {args.concurrency} requests in flight")
+    print(f"\n{'workers':>8}{'req/s':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}{'sent':>8}{'failed':>8}"
+          f"{'unsent':>8}{'retried':>9}{'duty owners':>13}")
+
+    for workers in (int(n) for n in args.workers.split(",")):
+        workdir = tempfile.mkdtemp(prefix=f"bench-workers-{workers}-")
+        with open(os.path.join(workdir, "bench_app.py"), "w") as f:
+            f.write(WORKER_MODULE.format(bench_dir=BENCH_DIR, repo_root=REPO_ROOT, gemini=args.gemini_latency,
+                                         ticket=args.ticket_latency, smtp=args.smtp_latency))
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = start_server(workdir, workers, port)
+        try:
+            wait_ready(base_url, workers)
+            jobs = [(base_url, bodies, c * per_client, per_client, max(1, args.concurrency // args.clients))
+                    for c in range(args.clients)]
+            with multiprocessing.Pool(args.clients) as pool:
+                start = time.perf_counter()
+                latencies = [t for result in pool.map(client_process, jobs) for t in result]
+                elapsed = time.perf_counter() - start
+            counts = check_database(os.path.join(workdir, "incidents.db"))
+        finally:
+            server.terminate()
+            server.wait(30)
+
+        unsent = counts.get("pending", 0) + counts.get("sending", 0)
+        print(f"{workers:>8}{len(latencies) / elapsed:>10.1f}{percentile(latencies, 50) * 1000:>10.1f}"
+              f"{percentile(latencies, 99) * 1000:>10.1f}{counts.get('sent', 0):>8}{counts.get('failed', 0):>8}"
+              f"{unsent:>8}{counts['attempted_twice']:>9}{counts['duty_owners']:>13}")
+
+
+if __name__ == "__main__":
+    main()
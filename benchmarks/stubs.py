@@ -0,0 +1,343 @@
+"""
+Local stand-ins for the external backends used by app.py.
+
+Gemini, the ticket API and Gmail SMTP are replaced at the library boundary
+(google.generativeai, requests, smtplib), so any revision of app.py can be
+benchmarked without network access or credentials.
+"""
+
+import asyncio
+import collections
+import http.server
+import json
+import os
+import random
+import re
+import smtplib
+import socketserver
+import threading
+import time
+import uuid
+
+import google.generativeai as genai
+import requests
+
+
+CANNED_CATEGORIES = {
+    "twice": "duplicate_payment",
+    "fraud": "fraud_report",
+    "unauthorized": "fraud_report",
+    "refund": "refund_request",
+    "log in": "account_locked",
+    "locked": "account_locked",
+    "balance": "statement_error",
+    "failed": "failed_payment",
+}
+
+
+BATCH_LINE = re.compile(r'^(\d+)\. (".*")$', re.MULTILINE)
+SINGLE_LINE = re.compile(r'^Customer Message: "(.*)"$', re.MULTILINE)
+
+
+def prompt_text(prompt) -> str:
+    """Flatten a prompt (a string, or a list of {"role", "parts"} turns) into its text"""
+    if isinstance(prompt, (list, tuple)):
+        return "\n".join(prompt_text(turn["parts"] if isinstance(turn, dict) else turn) for turn in prompt)
+    return str(prompt)
+
+
+def canned_category(text: str) -> str:
+    """Pick a plausible category for a prompt so responses look realistic"""
+    lowered = text.lower()
+    for keyword, category in CANNED_CATEGORIES.items():
+        if keyword in lowered:
+            return category
+    return "other"
+
+
+class ResourceExhausted(Exception):
+    """What google.api_core raises when Gemini answers 429"""
+    code = 429
+
+
+class _Part:
+    def __init__(self, text):
+        self.text = text
+
+
+class _Content:
+    def __init__(self, text):
+        self.parts = [_Part(text)]
+
+
+class _Candidate:
+    def __init__(self, text):
+        self.content = _Content(text)
+
+
+class _Response:
+    def __init__(self, text):
+        self.candidates = [_Candidate(text)]
+
+
+class StubBackends:
+    """Patch Gemini, the ticket API and SMTP with fixed-latency fakes.
+
+    `error_rates` overrides `error_rate` per backend ("gemini", "ticket",
+    "smtp"); `jitter` spreads each latency uniformly over +/- that fraction.
+    `gemini_quota` = (calls, seconds) makes Gemini answer ResourceExhausted
+    beyond that many calls in any sliding window of that length.
+    """
+
+    def __init__(self, gemini_latency=0.2, ticket_latency=0.05, smtp_latency=0.1, error_rate=0.0, seed=7,
+                 error_rates=None, jitter=0.0, gemini_quota=None):
+        self.gemini_latency = gemini_latency
+        self.ticket_latency = ticket_latency
+        self.smtp_latency = smtp_latency
+        self.error_rate = error_rate
+        self.error_rates = error_rates or {}
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.gemini_calls = 0
+        self.gemini_prompt_chars = 0
+        self.ticket_calls = 0
+        self.failures = {"gemini": 0, "ticket": 0, "smtp": 0}
+        self.gemini_quota = gemini_quota
+        self.gemini_rate_limited = 0
+        self._gemini_window = collections.deque()
+
+    def _check_quota(self):
+        if not self.gemini_quota:
+            return
+        calls, seconds = self.gemini_quota
+        now = time.monotonic()
+        while self._gemini_window and self._gemini_window[0] <= now - seconds:
+            self._gemini_window.popleft()
+        if len(self._gemini_window) >= calls:
+            self.gemini_rate_limited += 1
+            raise ResourceExhausted("429 Resource has been exhausted (e.g. check quota).")
+        self._gemini_window.append(now)
+
+    def _maybe_fail(self, backend: str):
+        rate = self.error_rates.get(backend, self.error_rate)
+        if rate and self.random.random() < rate:
+            self.failures[backend] += 1
+            raise RuntimeError(f"stub {backend} failure")
+
+    def _delay(self, latency: float) -> float:
+        if self.jitter and latency:
+            return latency * self.random.uniform(1 - self.jitter, 1 + self.jitter)
+        return latency
+
+    def install(self):
+        stubs = self
+
+        class StubModel:
+            def __init__(self, model_name="gemini-stub", *args, **kwargs):
+                self.model_name = model_name
+                self.system_instruction = kwargs.get("system_instruction") or ""
+
+            def _reply(self, prompt):
+                prompt = prompt_text(prompt)
+                stubs.gemini_calls += 1
+                stubs.gemini_prompt_chars += len(self.system_instruction) + len(prompt)
+                stubs._maybe_fail("gemini")
+                numbered = BATCH_LINE.findall(prompt) if "Customer Messages:" in prompt else []
+                if numbered:
+                    return _Response(json.dumps([
+                        {"index": int(i), "category": canned_category(json.loads(m)), "confidence": 0.95,
+                         "reason": "stub reply"}
+                        for i, m in numbered
+                    ]))
+                single = SINGLE_LINE.search(prompt)
+                category = canned_category(single.group(1) if single else prompt)
+                return _Response(json.dumps({"category": category, "confidence": 0.95, "reason": "stub reply"}))
+
+            def generate_content(self, prompt, **kwargs):
+                stubs._check_quota()
+                time.sleep(stubs._delay(stubs.gemini_latency))
+                return self._reply(prompt)
+
+            async def generate_content_async(self, prompt, **kwargs):
+                stubs._check_quota()
+                await asyncio.sleep(stubs._delay(stubs.gemini_latency))
+                return self._reply(prompt)
+
+        class StubTicketResponse:
+            status_code = 201
+
+            def json(self):
+                return {"id": str(uuid.uuid4())[:8]}
+
+        def stub_post(url, *args, **kwargs):
+            stubs.ticket_calls += 1
+            time.sleep(stubs._delay(stubs.ticket_latency))
+            stubs._maybe_fail("ticket")
+            return StubTicketResponse()
+
+        def stub_session_post(session, url, *args, **kwargs):
+            return stub_post(url, *args, **kwargs)
+
+        class StubSMTP:
+            def __init__(self, *args, **kwargs):
+                time.sleep(stubs._delay(stubs.smtp_latency))
+
+            def login(self, user, password):
+                pass
+
+            def send_message(self, msg):
+                stubs._maybe_fail("smtp")
+
+            def noop(self):
+                return 250, b"OK"
+
+            def quit(self):
+                pass
+
+            def close(self):
+                pass
+
+        genai.GenerativeModel = StubModel
+        requests.post = stub_post
+        requests.Session.post = stub_session_post
+        smtplib.SMTP_SSL = StubSMTP
+        os.environ.setdefault("SENDER_EMAIL", "bench@example.com")
+        os.environ.setdefault("SENDER_PASSWORD", "bench")
+        return self
+
+
+class LocalSMTPServer:
+    """Minimal plaintext SMTP server for exercising the mail pool locally.
+
+    Accepts any AUTH, counts delivered messages, and can add latency to the
+    greeting (standing in for the TLS handshake and login) and to each DATA.
+    """
+
+    def __init__(self, connect_latency: float = 0.05, message_latency: float = 0.005):
+        stand_in = self
+        self.connect_latency = connect_latency
+        self.message_latency = message_latency
+        self.messages = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode() + b"\r\n")
+
+            def handle(self):
+                with stand_in._lock:
+                    stand_in.connections += 1
+                time.sleep(stand_in.connect_latency)
+                self.reply("220 localhost stub ESMTP")
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode(errors="replace").strip().upper()
+                    if command.startswith(("EHLO", "HELO")):
+                        self.reply("250-localhost")
+                        self.reply("250 AUTH PLAIN LOGIN")
+                    elif command.startswith("AUTH"):
+                        self.reply("235 2.7.0 Authentication successful")
+                    elif command == "DATA":
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                            pass
+                        time.sleep(stand_in.message_latency)
+                        with stand_in._lock:
+                            stand_in.messages += 1
+                        self.reply("250 OK queued")
+                    elif command == "QUIT":
+                        self.reply("221 Bye")
+                        return
+                    else:  # MAIL, RCPT, RSET, NOOP
+                        self.reply("250 OK")
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+            request_queue_size = 128
+
+        self._server = Server(("127.0.0.1", 0), Handler)
+        self.port = self._server.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class LocalTicketServer:
+    """Local ticket API: POST returns 201 {"id": ...} after `latency` seconds.
+
+    Set `down = True` to answer 503 (or `hang = True` to stall past the
+    client timeout) to simulate an outage.
+    """
+
+    def __init__(self, latency: float = 0.01):
+        stand_in = self
+        self.latency = latency
+        self.down = False
+        self.hang = False
+        self.requests = 0
+        self.connections = 0
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                stand_in.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                stand_in.requests += 1
+                if stand_in.hang:
+                    time.sleep(30)
+                time.sleep(stand_in.latency)
+                status, body = (503, b"{}") if stand_in.down else (201, json.dumps({"id": uuid.uuid4().hex[:8]}).encode())
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        class Server(http.server.ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 128
+
+        self._server = Server(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/api/tickets"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def load_sample_requests(path: str = None) -> list:
+    """Return the request bodies from Sample_data.json"""
+    path = path or os.path.join(os.path.dirname(__file__), "..", "Sample_data.json")
+    with open(path) as f:
+        data = json.load(f)
+    return [case["request"] for case in data["test_cases"] if "request" in case]
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
@@ -0,0 +1,70 @@
+"""
+Micro-batching for LLM classification.
+
+Concurrent requests submit their message and await a future. Messages
+arriving within `window_seconds` (or until `max_batch` are queued) go out as
+one request, and each result is routed back to its caller. The handler
+returns one entry per message; a None entry means that message could not be
+classified in the batch, and the caller falls back to a single request.
+"""
+
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Collect items for a short window and process them in one call"""
+
+    def __init__(self, handler, max_batch: int = 8, window_seconds: float = 0.05):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.window_seconds = window_seconds
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+        self.batches_sent = 0
+        self.items_sent = 0
+
+    async def submit(self, item):
+        """Queue an item and wait for its result (None if the batch failed for it)"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list):
+        self.batches_sent += 1
+        self.items_sent += len(batch)
+        try:
+            results = await self.handler([item for item, _ in batch])
+        except Exception as e:
+            log.error("classification batch of %d failed: %s", len(batch), e)
+            results = []
+
+        for index, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(results[index] if index < len(results) else None)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches_sent,
+            "items": self.items_sent,
+            "avg_batch_size": round(self.items_sent / self.batches_sent, 2) if self.batches_sent else 0.0,
+        }
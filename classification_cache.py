@@ -0,0 +1,116 @@
+"""
+Two-tier cache for Gemini classifications.
+
+Keys are a SHA-256 of the normalized message text, the prompt version and
+the model name, so a prompt or model change never serves stale answers.
+Tier 1 is an in-process LRU; tier 2 is the `classification_cache` table in
+incidents.db, shared across restarts and workers. Entries expire after a
+TTL, and both tiers are bounded by size.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import db
+
+
+def normalize_message(message: str) -> str:
+    """Case- and whitespace-insensitive form used for cache keys"""
+    return " ".join(message.lower().split())
+
+
+class ClassificationCache:
+    """In-process LRU in front of a persistent SQLite table"""
+
+    def __init__(self, memory_size: int = 10000, max_rows: int = 100000, ttl_seconds: int = 7 * 86400,
+                 prune_every: int = 500):
+        self.memory_size = memory_size
+        self.max_rows = max_rows
+        self.ttl_seconds = ttl_seconds
+        self.prune_every = prune_every
+        self._memory = OrderedDict()  # key -> (stored_at, result)
+        self._lock = threading.Lock()
+        self._puts_since_prune = 0
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(message: str, prompt_version: str, model_name: str) -> str:
+        material = "\x1f".join((normalize_message(message), prompt_version, model_name))
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, stored_at: float, result: dict):
+        with self._lock:
+            self._memory[key] = (stored_at, result)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def get_memory(self, key: str):
+        """Tier 1 lookup; never touches the database"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            stored_at, result = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return dict(result)
+
+    def get_persistent(self, key: str):
+        """Tier 2 lookup; promotes hits into the LRU and counts misses"""
+        row = db.fetch_one('SELECT category, confidence, reason, created_at FROM classification_cache WHERE key = ?',
+                           (key,))
+        if row is None or time.time() - row[3] > self.ttl_seconds:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        result = {"category": row[0], "confidence": row[1], "reason": row[2]}
+        self._remember(key, row[3], result)
+        with self._lock:
+            self.persistent_hits += 1
+        return dict(result)
+
+    def put(self, key: str, result: dict):
+        """Store a successful classification in both tiers"""
+        stored_at = time.time()
+        entry = {"category": result["category"], "confidence": result["confidence"],
+                 "reason": result.get("reason", "")}
+        self._remember(key, stored_at, entry)
+        db.execute('''INSERT OR REPLACE INTO classification_cache (key, category, confidence, reason, created_at)
+                      VALUES (?, ?, ?, ?, ?)''',
+                   (key, entry["category"], entry["confidence"], entry["reason"], stored_at))
+
+        with self._lock:
+            self._puts_since_prune += 1
+            should_prune = self._puts_since_prune >= self.prune_every
+            if should_prune:
+                self._puts_since_prune = 0
+        if should_prune:
+            self.prune()
+
+    def prune(self):
+        """Drop expired rows, then the oldest rows beyond `max_rows`"""
+        with db.transaction() as conn:
+            conn.execute('DELETE FROM classification_cache WHERE created_at < ?', (time.time() - self.ttl_seconds,))
+            conn.execute('''DELETE FROM classification_cache WHERE key IN (
+                                SELECT key FROM classification_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)''',
+                         (self.max_rows,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.persistent_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.persistent_hits) / lookups, 3) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
@@ -0,0 +1,728 @@
+"""
+SQLite data-access layer shared by the API and the background workers.
+
+Connections are opened once and reused from a small pool. Each one is
+switched to WAL so readers no longer block behind writers, and keeps
+sqlite3's per-connection statement cache warm: every query below is a
+constant SQL string, so repeat calls reuse the prepared statement.
+"""
+
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+
+DB_PATH = os.getenv("INCIDENTS_DB", "incidents.db")
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+# How long a thread waits for a pooled connection when all of them are in use
+POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+# How long a write waits for another connection or worker process to commit before failing
+BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",  # durable across app crashes; fsync only at checkpoints
+    "PRAGMA cache_size = -16000",   # ~16 MB page cache per connection
+    "PRAGMA temp_store = MEMORY",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+)
+
+
+class PoolTimeout(Exception):
+    """No pooled connection became free within the pool's timeout"""
+
+
+class ConnectionPool:
+    """Fixed-size pool of SQLite connections that threads borrow and return"""
+
+    def __init__(self, path: str = DB_PATH, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT_SECONDS):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Borrow an idle connection, opening a new one while below `size`.
+
+        Raises PoolTimeout if none is returned within `timeout` seconds.
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeout(f"no database connection free after {self.timeout:g}s") from None
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        """Close idle connections (used at shutdown and by tests)"""
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._created -= 1
+
+
+pool = ConnectionPool()
+
+
+@contextmanager
+def transaction(immediate: bool = False):
+    """Yield a pooled connection and commit on success, roll back on error.
+
+    `immediate` takes the write lock up front, which avoids lock-upgrade
+    failures for read-then-write sequences.
+    """
+    with pool.connection() as conn:
+        if immediate:
+            conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def utc_timestamp(seconds_from_now: float = 0) -> str:
+    """UTC time formatted like CURRENT_TIMESTAMP, so values compare as strings"""
+    return (datetime.utcnow() + timedelta(seconds=seconds_from_now)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def fetch_one(sql: str, params: tuple = ()):
+    with pool.connection() as conn:
+        return conn.execute(sql, params).fetchone()
+
+
+def fetch_all(sql: str, params: tuple = ()) -> list:
+    with pool.connection() as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def execute(sql: str, params: tuple = ()) -> int:
+    """Run one write statement in its own transaction; returns rows affected"""
+    with transaction() as conn:
+        return conn.execute(sql, params).rowcount
+
+
+# ============================================================================
+# SCHEMA
+# ============================================================================
+
+def _bump_counter(dimension: str, key: str, delta: int) -> str:
+    """Trigger statement adding `delta` to a stats_counters row"""
+    return f'''INSERT INTO stats_counters (dimension, key, count) VALUES ({dimension}, {key}, {delta})
+               ON CONFLICT (dimension, key) DO UPDATE SET count = count + {delta};'''
+
+
+def _bump_buckets(dimension: str, key: str, timestamp: str) -> str:
+    """Trigger statements counting one event into its hour and day stats_buckets rows"""
+    return "\n".join(
+        f'''INSERT INTO stats_buckets (granularity, dimension, bucket, key, count)
+               VALUES ('{granularity}', {dimension}, strftime('{bucket_format}', {timestamp}), {key}, 1)
+               ON CONFLICT (granularity, dimension, bucket, key) DO UPDATE SET count = count + 1;'''
+        for granularity, bucket_format in STATS_GRANULARITIES.items()
+    )
+
+
+# Bucket labels sort and compare as strings
+STATS_GRANULARITIES = {"hour": "%Y-%m-%d %H:00", "day": "%Y-%m-%d"}
+STATS_DIMENSIONS = ("classification", "sentiment", "channel", "resolved")
+
+# Writes that change what GET /api/incidents/{id} or /api/notifications/{id} returns:
+# (trigger name, event, table, incident ID). See response_cache.py.
+INCIDENT_CHANGE_EVENTS = (
+    ("incidents_update", "UPDATE", "incidents", "NEW.id"),
+    ("incidents_delete", "DELETE", "incidents", "OLD.id"),
+    ("intake_update", "UPDATE OF status", "incident_intake", "NEW.incident_id"),
+    ("intake_delete", "DELETE", "incident_intake", "OLD.incident_id"),
+    ("notifications_insert", "INSERT", "notifications", "NEW.incident_id"),
+    ("notifications_update", "UPDATE OF status, sent_at", "notifications", "NEW.incident_id"),
+)
+# incident_changes keeps the newest this many rows; a worker further behind drops its whole cache
+INCIDENT_CHANGES_KEPT = 100000
+
+
+# Versioned schema changes, applied in order. The applied version is kept in
+# PRAGMA user_version. Never edit a shipped step: append a new one instead.
+MIGRATIONS = [
+    (1, "initial schema", [
+        '''CREATE TABLE IF NOT EXISTS incidents (
+            id TEXT PRIMARY KEY,
+            customer_id TEXT NOT NULL,
+            channel TEXT NOT NULL,
+            message TEXT NOT NULL,
+            classification TEXT NOT NULL,
+            confidence REAL NOT NULL,
+            sentiment TEXT,
+            polarity REAL,
+            ticket_id TEXT,
+            status TEXT DEFAULT 'open',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            resolved_at TIMESTAMP,
+            reminder_sent BOOLEAN DEFAULT 0
+        )''',
+        '''CREATE TABLE IF NOT EXISTS notifications (
+            id TEXT PRIMARY KEY,
+            incident_id TEXT NOT NULL,
+            channel TEXT NOT NULL,
+            message TEXT NOT NULL,
+            status TEXT DEFAULT 'sent',
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(incident_id) REFERENCES incidents(id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS reminders (
+            incident_id TEXT PRIMARY KEY,
+            channel TEXT NOT NULL,
+            email TEXT,
+            ticket_id TEXT,
+            due_at TIMESTAMP NOT NULL,
+            status TEXT DEFAULT 'pending',
+            FOREIGN KEY(incident_id) REFERENCES incidents(id)
+        )''',
+        """CREATE INDEX IF NOT EXISTS idx_reminders_pending_due
+           ON reminders(due_at) WHERE status = 'pending'""",
+    ]),
+    (2, "indexes matching the customer history, notification and stats queries", [
+        # get_customer_incidents: WHERE customer_id = ? ORDER BY created_at
+        "CREATE INDEX IF NOT EXISTS idx_incidents_customer_created ON incidents(customer_id, created_at)",
+        # get_incident_notifications: WHERE incident_id = ? ORDER BY sent_at
+        "CREATE INDEX IF NOT EXISTS idx_notifications_incident_sent ON notifications(incident_id, sent_at)",
+        # get_stats: status counts and GROUP BY classification become index-only scans
+        "CREATE INDEX IF NOT EXISTS idx_incidents_status ON incidents(status)",
+        "CREATE INDEX IF NOT EXISTS idx_incidents_classification ON incidents(classification)",
+        "ANALYZE",
+    ]),
+    (3, "persistent tier of the classification cache", [
+        '''CREATE TABLE IF NOT EXISTS classification_cache (
+            key TEXT PRIMARY KEY,
+            category TEXT NOT NULL,
+            confidence REAL NOT NULL,
+            reason TEXT,
+            created_at REAL NOT NULL
+        )''',
+        "CREATE INDEX IF NOT EXISTS idx_classification_cache_created ON classification_cache(created_at)",
+    ]),
+    (4, "record which classifier produced each label", [
+        # gemini | cache | fast_path | fallback; only Gemini labels train the fast path
+        "ALTER TABLE incidents ADD COLUMN classified_by TEXT",
+    ]),
+    (5, "turn notifications into a transactional outbox", [
+        # status: pending -> sending -> sent | failed (pending again between retries)
+        "ALTER TABLE notifications ADD COLUMN recipient TEXT",
+        "ALTER TABLE notifications ADD COLUMN ticket_id TEXT",
+        "ALTER TABLE notifications ADD COLUMN attempts INTEGER DEFAULT 0",
+        "ALTER TABLE notifications ADD COLUMN next_attempt_at TIMESTAMP",
+        "ALTER TABLE notifications ADD COLUMN last_error TEXT",
+        """CREATE INDEX IF NOT EXISTS idx_notifications_outbox
+           ON notifications(channel, next_attempt_at) WHERE status = 'pending'""",
+    ]),
+    (6, "find incidents still holding a local fallback ticket ID", [
+        """CREATE INDEX IF NOT EXISTS idx_incidents_local_tickets
+           ON incidents(created_at) WHERE ticket_id LIKE 'TKT-%'""",
+    ]),
+    (7, "keyset pagination on (created_at, id)", [
+        # sent_at moves when the outbox delivers, so notifications get a stable creation time
+        "ALTER TABLE notifications ADD COLUMN created_at TIMESTAMP",
+        "UPDATE notifications SET created_at = sent_at",
+        """CREATE INDEX IF NOT EXISTS idx_notifications_incident_created
+           ON notifications(incident_id, created_at, id)""",
+        "DROP INDEX IF EXISTS idx_notifications_incident_sent",
+        """CREATE INDEX IF NOT EXISTS idx_incidents_customer_created_id
+           ON incidents(customer_id, created_at, id)""",
+        "DROP INDEX IF EXISTS idx_incidents_customer_created",
+    ]),
+    (8, "rollup counters and time buckets maintained by triggers", [
+        # dimension: total | status | classification
+        '''CREATE TABLE IF NOT EXISTS stats_counters (
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (dimension, key)
+        ) WITHOUT ROWID''',
+        # granularity: hour | day; dimension: classification | sentiment | channel | resolved
+        '''CREATE TABLE IF NOT EXISTS stats_buckets (
+            granularity TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            key TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (granularity, dimension, bucket, key)
+        ) WITHOUT ROWID''',
+        '''INSERT INTO stats_counters (dimension, key, count)
+           SELECT 'total', 'total', COUNT(*) FROM incidents
+           UNION ALL SELECT 'status', status, COUNT(*) FROM incidents GROUP BY status
+           UNION ALL SELECT 'classification', classification, COUNT(*) FROM incidents GROUP BY classification''',
+        *[f'''INSERT INTO stats_buckets (granularity, dimension, bucket, key, count)
+              SELECT '{granularity}', '{dimension}', strftime('{bucket_format}', created_at), {key}, COUNT(*)
+              FROM incidents GROUP BY 3, 4'''
+          for granularity, bucket_format in STATS_GRANULARITIES.items()
+          for dimension, key in (("classification", "classification"), ("sentiment", "COALESCE(sentiment, 'unknown')"),
+                                 ("channel", "channel"))],
+        *[f'''INSERT INTO stats_buckets (granularity, dimension, bucket, key, count)
+              SELECT '{granularity}', 'resolved', strftime('{bucket_format}', resolved_at), 'resolved', COUNT(*)
+              FROM incidents WHERE status = 'resolved' AND resolved_at IS NOT NULL GROUP BY 3'''
+          for granularity, bucket_format in STATS_GRANULARITIES.items()],
+        f'''CREATE TRIGGER IF NOT EXISTS trg_incidents_stats_insert AFTER INSERT ON incidents
+           BEGIN
+               {_bump_counter("'total'", "'total'", 1)}
+               {_bump_counter("'status'", "NEW.status", 1)}
+               {_bump_counter("'classification'", "NEW.classification", 1)}
+               {_bump_buckets("'classification'", "NEW.classification", "NEW.created_at")}
+               {_bump_buckets("'sentiment'", "COALESCE(NEW.sentiment, 'unknown')", "NEW.created_at")}
+               {_bump_buckets("'channel'", "NEW.channel", "NEW.created_at")}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_incidents_stats_status AFTER UPDATE OF status ON incidents
+           WHEN OLD.status IS NOT NEW.status
+           BEGIN
+               {_bump_counter("'status'", "OLD.status", -1)}
+               {_bump_counter("'status'", "NEW.status", 1)}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_incidents_stats_resolved AFTER UPDATE OF status ON incidents
+           WHEN NEW.status = 'resolved' AND OLD.status IS NOT 'resolved'
+           BEGIN
+               {_bump_buckets("'resolved'", "'resolved'", "COALESCE(NEW.resolved_at, CURRENT_TIMESTAMP)")}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_incidents_stats_delete AFTER DELETE ON incidents
+           BEGIN
+               {_bump_counter("'total'", "'total'", -1)}
+               {_bump_counter("'status'", "OLD.status", -1)}
+               {_bump_counter("'classification'", "OLD.classification", -1)}
+           END''',
+    ]),
+    (9, "leases that assign background duties to one worker process", [
+        '''CREATE TABLE IF NOT EXISTS leases (
+               name TEXT PRIMARY KEY,
+               owner TEXT NOT NULL,
+               expires_at REAL NOT NULL
+           ) WITHOUT ROWID''',
+    ]),
+    (10, "index of idempotency keys and message fingerprints for duplicate incidents", [
+        '''CREATE TABLE IF NOT EXISTS incident_dedup (
+               key TEXT PRIMARY KEY,
+               incident_id TEXT NOT NULL,
+               response TEXT,
+               expires_at REAL NOT NULL
+           ) WITHOUT ROWID''',
+        'CREATE INDEX IF NOT EXISTS idx_incident_dedup_incident ON incident_dedup(incident_id)',
+        'CREATE INDEX IF NOT EXISTS idx_incident_dedup_expires ON incident_dedup(expires_at)',
+    ]),
+    # External-content FTS5 index: it stores only the index, reading text from incidents by rowid.
+    # VACUUM may renumber the rowids of a table without INTEGER PRIMARY KEY, so call
+    # rebuild_search_index() after one.
+    (11, "full-text index over incident messages", [
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS incidents_fts USING fts5(
+               message, content='incidents', content_rowid='rowid',
+               tokenize='porter unicode61 remove_diacritics 2'
+           )''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_incidents_fts_insert AFTER INSERT ON incidents
+           BEGIN
+               INSERT INTO incidents_fts (rowid, message) VALUES (NEW.rowid, NEW.message);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_incidents_fts_delete AFTER DELETE ON incidents
+           BEGIN
+               INSERT INTO incidents_fts (incidents_fts, rowid, message) VALUES ('delete', OLD.rowid, OLD.message);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_incidents_fts_update AFTER UPDATE OF message ON incidents
+           BEGIN
+               INSERT INTO incidents_fts (incidents_fts, rowid, message) VALUES ('delete', OLD.rowid, OLD.message);
+               INSERT INTO incidents_fts (rowid, message) VALUES (NEW.rowid, NEW.message);
+           END''',
+        "INSERT INTO incidents_fts (incidents_fts) VALUES ('rebuild')",
+    ]),
+    (12, "durable queue of incidents accepted with 202", [
+        # status: received -> processing -> (stored in incidents, row deleted) | failed; see intake.py
+        '''CREATE TABLE IF NOT EXISTS incident_intake (
+               incident_id TEXT PRIMARY KEY,
+               customer_id TEXT NOT NULL,
+               channel TEXT NOT NULL,
+               message TEXT NOT NULL,
+               email TEXT,
+               status TEXT NOT NULL DEFAULT 'received',
+               attempts INTEGER NOT NULL DEFAULT 0,
+               last_error TEXT,
+               received_at REAL NOT NULL,
+               next_attempt_at REAL NOT NULL,
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+           )''',
+        """CREATE INDEX IF NOT EXISTS idx_incident_intake_due
+           ON incident_intake(next_attempt_at) WHERE status = 'received'""",
+    ]),
+    (13, "log of incident writes that invalidates cached responses", [
+        # AUTOINCREMENT never reuses a sequence number, so a reader can resume after the last one it saw
+        '''CREATE TABLE IF NOT EXISTS incident_changes (
+               seq INTEGER PRIMARY KEY AUTOINCREMENT,
+               incident_id TEXT NOT NULL
+           )''',
+        *[f'''CREATE TRIGGER IF NOT EXISTS trg_{name}_changed AFTER {event} ON {table}
+              BEGIN
+                  INSERT INTO incident_changes (incident_id) VALUES ({incident_id});
+              END'''
+          for name, event, table, incident_id in INCIDENT_CHANGE_EVENTS],
+        f'''CREATE TRIGGER IF NOT EXISTS trg_incident_changes_prune AFTER INSERT ON incident_changes
+           BEGIN
+               DELETE FROM incident_changes WHERE seq <= NEW.seq - {INCIDENT_CHANGES_KEPT};
+           END''',
+    ]),
+    (14, "intake queue depth by status in the rollup counters", [
+        # stats_counters dimension 'intake', keyed by incident_intake.status; see IntakeQueue.stats
+        '''INSERT INTO stats_counters (dimension, key, count)
+           SELECT 'intake', status, COUNT(*) FROM incident_intake GROUP BY status''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_intake_stats_insert AFTER INSERT ON incident_intake
+           BEGIN
+               {_bump_counter("'intake'", "NEW.status", 1)}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_intake_stats_status AFTER UPDATE OF status ON incident_intake
+           WHEN OLD.status IS NOT NEW.status
+           BEGIN
+               {_bump_counter("'intake'", "OLD.status", -1)}
+               {_bump_counter("'intake'", "NEW.status", 1)}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_intake_stats_delete AFTER DELETE ON incident_intake
+           BEGIN
+               {_bump_counter("'intake'", "OLD.status", -1)}
+           END''',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version() -> int:
+    return fetch_one("PRAGMA user_version")[0]
+
+
+def migrate(target: int = LATEST_VERSION) -> int:
+    """Apply pending migrations up to `target`; returns the resulting version.
+
+    Runs under BEGIN IMMEDIATE, so concurrent processes serialize and each
+    step is applied exactly once. Databases created before migrations
+    existed start at version 0; step 1 is idempotent for them.
+    """
+    with transaction(immediate=True) as conn:
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        for version, description, statements in MIGRATIONS:
+            if version <= current or version > target:
+                continue
+            for sql in statements:
+                conn.execute(sql)
+            conn.execute(f"PRAGMA user_version = {version}")
+            current = version
+            log.info("schema migrated to v%d: %s", version, description)
+    return current
+
+
+def init_db():
+    """Bring the SQLite schema up to date"""
+    migrate()
+
+
+# ============================================================================
+# INCIDENTS & NOTIFICATIONS
+# ============================================================================
+
+# SELECT in EXACT database column order
+INCIDENT_COLUMNS = '''id, customer_id, channel, message, classification, confidence,
+                        sentiment, polarity, ticket_id, status, created_at, resolved_at, reminder_sent'''
+
+SQL_INSERT_INCIDENT = '''INSERT INTO incidents
+    (id, customer_id, channel, message, classification, confidence, sentiment, polarity, ticket_id, status,
+     classified_by)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'open', ?)'''
+SQL_SELECT_INCIDENT = f'SELECT {INCIDENT_COLUMNS} FROM incidents WHERE id = ?'
+# An incident accepted with 202 is in incident_intake until a worker stores it, never in both tables
+SQL_SELECT_INCIDENT_OR_INTAKE = f'''{SQL_SELECT_INCIDENT}
+    UNION ALL
+    SELECT incident_id, customer_id, channel, message, NULL, NULL, NULL, NULL, NULL, status, created_at, NULL, 0
+    FROM incident_intake WHERE incident_id = ?'''
+SQL_INSERT_RECEIVED_INCIDENT = '''INSERT INTO incidents
+    (id, customer_id, channel, message, classification, confidence, sentiment, polarity, ticket_id, status,
+     classified_by, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'open', ?, ?)'''
+SQL_DELETE_INTAKE = 'DELETE FROM incident_intake WHERE incident_id = ?'
+# Repeats of an incident accepted with 202 are answered with its "received" body until it is stored
+SQL_REPLACE_DEDUP_RESPONSE = 'UPDATE incident_dedup SET response = ? WHERE incident_id = ? AND response IS NOT NULL'
+SQL_SELECT_INTAKE_STATUS = 'SELECT status FROM incident_intake WHERE incident_id = ?'
+# Keyset pages, newest first: the *_AFTER variants continue below a (created_at, id) cursor.
+# LIMIT -1 means no limit.
+SQL_SELECT_CUSTOMER_INCIDENTS = f'''SELECT {INCIDENT_COLUMNS}
+    FROM incidents WHERE customer_id = ?
+    ORDER BY created_at DESC, id DESC LIMIT ?'''
+SQL_SELECT_CUSTOMER_INCIDENTS_AFTER = f'''SELECT {INCIDENT_COLUMNS}
+    FROM incidents WHERE customer_id = ? AND (created_at, id) < (?, ?)
+    ORDER BY created_at DESC, id DESC LIMIT ?'''
+# Full-text search: the FTS5 match drives the query and incidents rows are joined by rowid.
+# `rank` is bm25 (lower is better). Rowid order is insertion order, so "newest" streams
+# without a sort; "rank" scores the newest N matches (N = -1: all of them), then sorts.
+SEARCH_COLUMNS = ", ".join(f"i.{column.strip()}" for column in INCIDENT_COLUMNS.split(","))
+SEARCH_FILTERS = {
+    "classification": "i.classification = ?",
+    "sentiment": "i.sentiment = ?",
+    "status": "i.status = ?",
+    "created_after": "i.created_at >= ?",
+    "created_before": "i.created_at < ?",
+}
+SQL_SEARCH_NEWEST = f'''SELECT {SEARCH_COLUMNS}, incidents_fts.rank
+    FROM incidents_fts JOIN incidents i ON i.rowid = incidents_fts.rowid
+    WHERE incidents_fts MATCH ?{{filters}}
+    ORDER BY incidents_fts.rowid DESC LIMIT ? OFFSET ?'''
+SQL_SEARCH_RANKED = f'''SELECT {SEARCH_COLUMNS}, page.rank FROM (
+        SELECT match_rowid, rank FROM (
+            SELECT incidents_fts.rowid AS match_rowid, incidents_fts.rank AS rank FROM incidents_fts{{join}}
+            WHERE incidents_fts MATCH ?{{filters}}
+            ORDER BY incidents_fts.rowid DESC LIMIT ?
+        ) ORDER BY rank, match_rowid LIMIT ? OFFSET ?
+    ) page JOIN incidents i ON i.rowid = page.match_rowid
+    ORDER BY page.rank, page.match_rowid'''
+SEARCH_JOIN = " JOIN incidents i ON i.rowid = incidents_fts.rowid"
+SQL_REBUILD_SEARCH_INDEX = "INSERT INTO incidents_fts (incidents_fts) VALUES ('rebuild')"
+SQL_RESOLVE_INCIDENT = '''UPDATE incidents SET status = 'resolved', resolved_at = CURRENT_TIMESTAMP
+    WHERE id = ?'''
+SQL_INSERT_REMINDER = '''INSERT OR REPLACE INTO reminders (incident_id, channel, email, ticket_id, due_at, status)
+    VALUES (?, ?, ?, ?, ?, 'pending')'''
+SQL_CANCEL_REMINDER = "UPDATE reminders SET status = 'cancelled' WHERE incident_id = ? AND status = 'pending'"
+# A resolved incident no longer absorbs repeats of its message (see dedup.py)
+SQL_FORGET_FINGERPRINT = "DELETE FROM incident_dedup WHERE incident_id = ? AND key LIKE 'fp:%'"
+SQL_SELECT_STATS_COUNTERS = '''SELECT dimension, key, count FROM stats_counters
+    ORDER BY dimension, count DESC'''
+SQL_SELECT_STATS_BUCKETS = '''SELECT bucket, key, count FROM stats_buckets
+    WHERE granularity = ? AND dimension = ? AND bucket BETWEEN ? AND ?
+    ORDER BY bucket, key'''
+SQL_INSERT_NOTIFICATION = '''INSERT INTO notifications
+    (id, incident_id, channel, message, recipient, ticket_id, status, next_attempt_at, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, 'pending', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)'''
+SQL_SELECT_NOTIFICATIONS = '''SELECT id, incident_id, channel, message, status, sent_at, created_at
+    FROM notifications WHERE incident_id = ?
+    ORDER BY created_at DESC, id DESC LIMIT ?'''
+SQL_SELECT_NOTIFICATIONS_AFTER = '''SELECT id, incident_id, channel, message, status, sent_at, created_at
+    FROM notifications WHERE incident_id = ? AND (created_at, id) < (?, ?)
+    ORDER BY created_at DESC, id DESC LIMIT ?'''
+
+
+def store_incident(incident_id: str, customer_id: str, channel: str, message: str, category: str,
+                   confidence: float, sentiment: str, polarity: float, ticket_id: str, classified_by: str = None,
+                   notifications: list = (), received_at: str = None, response: dict = None,
+                   reminder: tuple = None):
+    """Insert a processed incident and its outbox notifications in one transaction.
+
+    `notifications` rows are (id, incident_id, channel, message, recipient, ticket_id).
+    `received_at` marks an incident accepted with 202; `response` is then its final
+    response body and `reminder` its reminders row (see store_received_incident).
+    """
+    incident = (incident_id, customer_id, channel, message, category, confidence, sentiment, polarity,
+                ticket_id, classified_by)
+    if received_at is None:
+        store_incidents([incident], notifications)
+    else:
+        store_received_incident(incident, received_at, notifications, response, reminder)
+
+
+@metrics.timed_query
+def store_incidents(incidents: list, notifications: list = ()):
+    """Bulk insert incidents and their outbox notifications in one transaction.
+
+    `incidents` rows follow SQL_INSERT_INCIDENT's column order.
+    """
+    with transaction() as conn:
+        conn.executemany(SQL_INSERT_INCIDENT, incidents)
+        conn.executemany(SQL_INSERT_NOTIFICATION, notifications)
+
+
+@metrics.timed_query
+def store_received_incident(incident: tuple, received_at: str, notifications: list = (), response: dict = None,
+                            reminder: tuple = None):
+    """Store an incident from the intake queue, keeping the time it was accepted as created_at.
+
+    Its intake row is deleted in the same transaction, `response` replaces the 202
+    body its dedup keys replay to repeats, and `reminder` (SQL_INSERT_REMINDER's
+    parameters) is scheduled. Once this commits, nothing is left that could fail.
+    """
+    with transaction() as conn:
+        conn.execute(SQL_INSERT_RECEIVED_INCIDENT, (*incident, received_at))
+        conn.executemany(SQL_INSERT_NOTIFICATION, notifications)
+        conn.execute(SQL_DELETE_INTAKE, (incident[0],))
+        if response is not None:
+            conn.execute(SQL_REPLACE_DEDUP_RESPONSE, (json.dumps(response), incident[0]))
+        if reminder is not None:
+            conn.execute(SQL_INSERT_REMINDER, reminder)
+
+
+@metrics.timed_query
+def fetch_incident(incident_id: str):
+    """Fetch one incident row (shaped from its intake row while still queued), or None"""
+    return fetch_one(SQL_SELECT_INCIDENT_OR_INTAKE, (incident_id, incident_id))
+
+
+def _page_query(sql: str, sql_after: str, key: str, limit: int = None, after: tuple = None):
+    """Pick the first-page or continuation query for a keyset page"""
+    limit = -1 if limit is None else limit
+    if after is None:
+        return sql, (key, limit)
+    return sql_after, (key, *after, limit)
+
+
+def iter_pages(sql: str, sql_after: str, key: str, limit: int = None, after: tuple = None,
+               position=None, batch_size: int = 500):
+    """Yield a keyset listing in batches of up to `batch_size` rows, one page query per batch.
+
+    The pooled connection goes back between batches, so a client reading a
+    stream slowly never holds one. `position` maps a row to its (created_at,
+    id) keyset position, where the next batch continues.
+    """
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        rows = fetch_all(*_page_query(sql, sql_after, key, size, after))
+        if rows:
+            yield rows
+        if len(rows) < size:
+            return
+        after = position(rows[-1])
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+@metrics.timed_query
+def fetch_customer_incidents(customer_id: str, limit: int = None, after: tuple = None) -> list:
+    """Fetch incident rows for a customer, newest first.
+
+    `after` is the (created_at, id) of the last row of the previous page.
+    """
+    return fetch_all(*_page_query(SQL_SELECT_CUSTOMER_INCIDENTS, SQL_SELECT_CUSTOMER_INCIDENTS_AFTER,
+                                  customer_id, limit, after))
+
+
+def iter_customer_incidents(customer_id: str, limit: int = None, after: tuple = None):
+    """Like fetch_customer_incidents, but yields batches of rows (see iter_pages)"""
+    return iter_pages(SQL_SELECT_CUSTOMER_INCIDENTS, SQL_SELECT_CUSTOMER_INCIDENTS_AFTER, customer_id, limit, after,
+                      position=lambda row: (row[10], row[0]))
+
+
+@metrics.timed_query
+def search_incidents(match: str, filters: dict = None, order: str = "rank", limit: int = 50,
+                     offset: int = 0, rank_window: int = None) -> list:
+    """Incident rows whose message matches an FTS5 query, each followed by its bm25 rank.
+
+    `filters` maps SEARCH_FILTERS names to values. `order` is "rank" or "newest". Ranking
+    scores every match, so `rank_window` limits it to the newest that many matches (at
+    least offset + limit), which keeps very common terms cheap; None ranks them all.
+    """
+    filters = filters or {}
+    where = "".join(f" AND {SEARCH_FILTERS[name]}" for name in filters)
+    if order == "newest":
+        return fetch_all(SQL_SEARCH_NEWEST.format(filters=where), (match, *filters.values(), limit, offset))
+    window = max(rank_window, offset + limit) if rank_window else -1
+    # Scored rows carry only rowid and rank; incidents columns are read for the final page only
+    sql = SQL_SEARCH_RANKED.format(join=SEARCH_JOIN if filters else "", filters=where)
+    return fetch_all(sql, (match, *filters.values(), window, limit, offset))
+
+
+def rebuild_search_index():
+    """Re-index every incident message (needed after VACUUM, which can renumber rowids)"""
+    with transaction() as conn:
+        conn.execute(SQL_REBUILD_SEARCH_INDEX)
+
+
+@metrics.timed_query
+def mark_incident_resolved(incident_id: str) -> int:
+    """Resolve an incident; returns the number of rows updated"""
+    with transaction() as conn:
+        rows_updated = conn.execute(SQL_RESOLVE_INCIDENT, (incident_id,)).rowcount
+        # Cancel the pending reminder so the scheduler never wakes up for it
+        conn.execute(SQL_CANCEL_REMINDER, (incident_id,))
+        conn.execute(SQL_FORGET_FINGERPRINT, (incident_id,))
+    return rows_updated
+
+
+@metrics.timed_query
+def fetch_intake_status(incident_id: str):
+    """Status of an incident accepted with 202 and not stored yet (received, processing or failed), or None"""
+    row = fetch_one(SQL_SELECT_INTAKE_STATUS, (incident_id,))
+    return row[0] if row else None
+
+
+@metrics.timed_query
+def enqueue_notifications(notifications: list):
+    """Add rows (id, incident_id, channel, message, recipient, ticket_id) to the outbox"""
+    with transaction() as conn:
+        conn.executemany(SQL_INSERT_NOTIFICATION, notifications)
+
+
+@metrics.timed_query
+def fetch_incident_notifications(incident_id: str, limit: int = None, after: tuple = None) -> list:
+    """Fetch notification rows for an incident, newest first; `after` as for fetch_customer_incidents"""
+    return fetch_all(*_page_query(SQL_SELECT_NOTIFICATIONS, SQL_SELECT_NOTIFICATIONS_AFTER,
+                                  incident_id, limit, after))
+
+
+def iter_incident_notifications(incident_id: str, limit: int = None, after: tuple = None):
+    """Like fetch_incident_notifications, but yields batches of rows (see iter_pages)"""
+    return iter_pages(SQL_SELECT_NOTIFICATIONS, SQL_SELECT_NOTIFICATIONS_AFTER, incident_id, limit, after,
+                      position=lambda row: (row[6], row[0]))
+
+
+@metrics.timed_query
+def fetch_stats() -> dict:
+    """Aggregate incident counts from the trigger-maintained rollup table"""
+    counters = {}
+    classification_stats = []
+    for dimension, key, count in fetch_all(SQL_SELECT_STATS_COUNTERS):
+        if dimension == 'classification':
+            if count:
+                classification_stats.append({"category": key, "count": count})
+        else:
+            counters[dimension, key] = count
+
+    return {
+        "total_incidents": counters.get(('total', 'total'), 0),
+        "open_incidents": counters.get(('status', 'open'), 0),
+        "resolved_incidents": counters.get(('status', 'resolved'), 0),
+        "by_classification": classification_stats
+    }
+
+
+@metrics.timed_query
+def fetch_stats_buckets(granularity: str, dimension: str, start: str, end: str) -> list:
+    """(bucket, key, count) rows for start <= bucket <= end, oldest first"""
+    return fetch_all(SQL_SELECT_STATS_BUCKETS, (granularity, dimension, start, end))
@@ -0,0 +1,141 @@
+"""
+Duplicate suppression for incoming incidents.
+
+Webhooks get retried, and customers resend the same complaint through a
+second channel. Before the pipeline runs, each incident is indexed in
+`incident_dedup` under up to two keys:
+
+- the caller's idempotency key, if one was sent, kept for `key_ttl_seconds`
+- a fingerprint of customer_id plus the normalized message, kept for
+  `window_seconds`; resolving the incident drops it (see
+  db.mark_incident_resolved)
+
+A request with a key that is already indexed gets the original's stored
+response. Sentiment, Gemini, the ticket POST, the acknowledgements and the
+reminder do not run a second time. Keys are claimed inside one write
+transaction, so concurrent copies cannot both win, even in different
+worker processes. A claim that is never completed, because the original
+failed or its process died, is released or lapses after `pending_seconds`.
+"""
+
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from typing import NamedTuple, Optional
+
+import db
+import metrics
+
+SQL_LOOKUP = 'SELECT incident_id, response FROM incident_dedup WHERE key = ? AND expires_at >= ?'
+SQL_CLAIM = 'INSERT OR REPLACE INTO incident_dedup (key, incident_id, response, expires_at) VALUES (?, ?, NULL, ?)'
+SQL_COMPLETE = 'UPDATE incident_dedup SET response = ?, expires_at = ? WHERE key = ? AND incident_id = ?'
+SQL_RELEASE = 'DELETE FROM incident_dedup WHERE key = ? AND incident_id = ?'
+SQL_PURGE = 'DELETE FROM incident_dedup WHERE expires_at < ?'
+
+PURGE_INTERVAL_SECONDS = 60
+
+DUPLICATES = metrics.REGISTRY.counter(
+    "incident_duplicates_total", "Incoming incidents answered from the dedup index", ("matched",))
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize(message: str) -> str:
+    """Case, width, punctuation and whitespace folded away"""
+    text = unicodedata.normalize("NFKC", message).casefold()
+    return " ".join(_PUNCTUATION.sub(" ", text).split())
+
+
+def fingerprint(customer_id: str, message: str) -> str:
+    return hashlib.sha256(f"{customer_id}\x1f{normalize(message)}".encode()).hexdigest()
+
+
+class Duplicate(NamedTuple):
+    """The indexed original of a repeated incident"""
+    incident_id: str
+    response: Optional[dict]  # None while the original is still being processed
+    matched: str              # "idempotency_key" or "fingerprint"
+
+
+class IncidentDeduplicator:
+    """Claims dedup keys for new incidents and answers repeats from the index"""
+
+    def __init__(self, window_seconds: float = 3600, key_ttl_seconds: float = 86400,
+                 pending_seconds: float = 120):
+        self.window_seconds = window_seconds
+        self.key_ttl_seconds = key_ttl_seconds
+        self.pending_seconds = pending_seconds
+        self._last_purge = 0.0
+
+    def keys(self, customer_id: str, message: str, idempotency_key: str = None) -> list:
+        """Index keys for an incident; empty when both mechanisms are off"""
+        keys = []
+        if idempotency_key and self.key_ttl_seconds > 0:
+            keys.append(f"key:{customer_id}:{idempotency_key}")
+        if self.window_seconds > 0:
+            keys.append(f"fp:{fingerprint(customer_id, message)}")
+        return keys
+
+    def _ttl(self, key: str) -> float:
+        return self.key_ttl_seconds if key.startswith("key:") else self.window_seconds
+
+    @staticmethod
+    def _duplicate(key: str, row) -> Duplicate:
+        return Duplicate(row[0], json.loads(row[1]) if row[1] else None,
+                         "idempotency_key" if key.startswith("key:") else "fingerprint")
+
+    @metrics.timed_query
+    def claim(self, items: list) -> list:
+        """Claim the keys of each (incident_id, keys) item, in order.
+
+        Returns, per item, None if it was claimed (run the pipeline) or the
+        Duplicate it repeats. A repeat of an earlier item in the same call
+        comes back as a Duplicate of that item, still pending.
+        """
+        now = time.time()
+        results = []
+        with db.transaction(immediate=True) as conn:
+            if now - self._last_purge >= PURGE_INTERVAL_SECONDS:
+                conn.execute(SQL_PURGE, (now,))
+                self._last_purge = now
+            for incident_id, keys in items:
+                duplicate = None
+                for key in keys:
+                    row = conn.execute(SQL_LOOKUP, (key, now)).fetchone()
+                    if row is not None:
+                        duplicate = self._duplicate(key, row)
+                        break
+                if duplicate is None:
+                    conn.executemany(SQL_CLAIM, [(key, incident_id, now + self.pending_seconds) for key in keys])
+                else:
+                    DUPLICATES.inc(matched=duplicate.matched)
+                results.append(duplicate)
+        return results
+
+    @metrics.timed_query
+    def complete(self, items: list):
+        """Store the response of each (incident_id, keys, response) item so repeats can replay it"""
+        now = time.time()
+        with db.transaction() as conn:
+            conn.executemany(SQL_COMPLETE, [(json.dumps(response), now + self._ttl(key), key, incident_id)
+                                            for incident_id, keys, response in items for key in keys])
+
+    @metrics.timed_query
+    def release(self, items: list):
+        """Drop the claims of (incident_id, keys) items whose pipeline failed, so a retry runs again"""
+        with db.transaction() as conn:
+            conn.executemany(SQL_RELEASE, [(key, incident_id) for incident_id, keys in items for key in keys])
+
+    def lookup(self, keys: list) -> Optional[Duplicate]:
+        """The live index entry for the first of `keys` that has one"""
+        now = time.time()
+        for key in keys:
+            row = db.fetch_one(SQL_LOOKUP, (key, now))
+            if row is not None:
+                return self._duplicate(key, row)
+        return None
+
+    def stats(self) -> dict:
+        return {matched: int(DUPLICATES.value(matched=matched)) for matched in ("idempotency_key", "fingerprint")}
@@ -0,0 +1,235 @@
+"""
+Local fast-path classifier that answers confident cases without Gemini.
+
+Two signals are combined:
+  * keyword/regex rules for the phrasings listed in the Gemini prompt
+  * a multinomial Naive Bayes model over unigrams and bigrams, trained
+    offline from incidents that Gemini already labeled
+
+If the rules and the model agree, or only one of them has an opinion, the
+result carries a confidence score. Anything below the caller's threshold
+goes to the LLM. A rule match on its own scores RULE_CONFIDENCE, below the
+default threshold, so only the model's probability can skip the LLM unless
+the threshold is lowered on purpose.
+
+    python fast_classifier.py train  [--db incidents.db] [--out fast_classifier_model.json]
+    python fast_classifier.py report [--db incidents.db] [--threshold 0.9]
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import zlib
+from collections import Counter
+
+import db
+
+
+RULE_CONFIDENCE = 0.85
+MIN_KNOWN_FEATURES = 2
+
+RULES = {
+    "duplicate_payment": re.compile(
+        r"\b(charged|billed|deducted|debited|paid|taken)\b.{0,30}\b(twice|two times|double|2x)\b"
+        r"|\bdouble[- ]?(charged|billed|charge)\b|\bduplicate (charge|payment|transaction)s?\b"),
+    "failed_payment": re.compile(
+        r"\b(payment|transaction|transfer)\b.{0,30}\b(failed|declined|did ?n[o']t go through)\b"
+        r".{0,40}\b(charged|deducted|debited|taken|gone)\b"),
+    "fraud_report": re.compile(
+        r"\b(unauthori[sz]ed|fraud|fraudulent|stolen card)\b|\bdid ?n[o']?t make (this|that|the|these)\b"
+        r"|\bsuspicious (activity|transaction|charge)s?\b"),
+    "refund_request": re.compile(
+        r"\brefund\b|\breverse the charge\b|\bmoney back\b|\breturn my money\b|\bchargeback\b"),
+    "account_locked": re.compile(
+        r"\b(can'?t|cannot|unable to) (log ?in|sign ?in|access (my )?account)\b"
+        r"|\baccount (is |was |got )?(locked|blocked|frozen|suspended)\b"
+        r"|\bpassword (is )?not working\b|\blocked out\b"),
+    "statement_error": re.compile(
+        r"\b(balance|statement)\b.{0,30}\b(wrong|incorrect|does ?n[o']t match|mismatch)\b"
+        r"|\bmissing (transaction|deposit|payment)s?\b"),
+}
+
+
+def features(message: str) -> list:
+    """Unigram and bigram tokens of a message"""
+    tokens = re.findall(r"[a-z0-9']+", message.lower())
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class NaiveBayesModel:
+    """Multinomial Naive Bayes with add-one smoothing"""
+
+    def __init__(self, classes: dict, vocab_size: int):
+        self.classes = classes  # category -> {"docs": int, "total": int, "counts": {feature: int}}
+        self.vocab_size = vocab_size
+        total_docs = sum(c["docs"] for c in classes.values())
+        self._log_prior = {k: math.log(c["docs"] / total_docs) for k, c in classes.items()}
+        self._log_unseen = {k: math.log(1 / (c["total"] + vocab_size)) for k, c in classes.items()}
+
+    @classmethod
+    def train(cls, examples: list) -> "NaiveBayesModel":
+        """`examples` is a list of (message, category) pairs"""
+        classes = {}
+        vocab = set()
+        for message, category in examples:
+            feats = features(message)
+            vocab.update(feats)
+            entry = classes.setdefault(category, {"docs": 0, "total": 0, "counts": Counter()})
+            entry["docs"] += 1
+            entry["total"] += len(feats)
+            entry["counts"].update(feats)
+        for entry in classes.values():
+            entry["counts"] = dict(entry["counts"])
+        return cls(classes, len(vocab))
+
+    def predict(self, message: str):
+        """Return (category, probability), or (None, 0.0) without enough known features"""
+        feats = [f for f in features(message) if any(f in c["counts"] for c in self.classes.values())]
+        if len(feats) < MIN_KNOWN_FEATURES:
+            return None, 0.0
+
+        scores = {}
+        for category, entry in self.classes.items():
+            denominator = entry["total"] + self.vocab_size
+            counts = entry["counts"]
+            score = self._log_prior[category]
+            for f in feats:
+                count = counts.get(f)
+                score += math.log((count + 1) / denominator) if count else self._log_unseen[category]
+            scores[category] = score
+
+        best = max(scores, key=scores.get)
+        normalizer = sum(math.exp(s - scores[best]) for s in scores.values())
+        return best, 1 / normalizer
+
+    def to_dict(self) -> dict:
+        return {"version": 1, "vocab_size": self.vocab_size, "classes": self.classes}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "NaiveBayesModel":
+        return cls(data["classes"], data["vocab_size"])
+
+
+class FastClassifier:
+    """Rules plus an optional trained model; counts how often it answers"""
+
+    def __init__(self, model: NaiveBayesModel = None, threshold: float = 0.9):
+        self.model = model
+        self.threshold = threshold
+        self.attempts = 0
+        self.hits = 0
+
+    @classmethod
+    def load(cls, path: str, threshold: float = 0.9) -> "FastClassifier":
+        """Load a trained model if present; rules alone work without one"""
+        model = None
+        if path and os.path.exists(path):
+            with open(path) as f:
+                model = NaiveBayesModel.from_dict(json.load(f))
+        return cls(model, threshold)
+
+    def predict(self, message: str) -> dict:
+        """Best local guess with a confidence score, whatever the threshold"""
+        lowered = message.lower()
+        matched = [category for category, rule in RULES.items() if rule.search(lowered)]
+        rule_category = matched[0] if len(matched) == 1 else None
+        model_category, probability = self.model.predict(message) if self.model else (None, 0.0)
+
+        if rule_category and model_category == rule_category:
+            return {"category": rule_category, "confidence": round(max(RULE_CONFIDENCE, probability), 2),
+                    "reason": "fast path: rule + model"}
+        if rule_category and model_category is None:
+            return {"category": rule_category, "confidence": RULE_CONFIDENCE, "reason": "fast path: rule"}
+        if model_category and not matched:
+            return {"category": model_category, "confidence": round(probability, 2), "reason": "fast path: model"}
+        # Rules conflict with each other or with the model: leave it to the LLM
+        return {"category": rule_category or model_category or "other", "confidence": 0.0,
+                "reason": "fast path: ambiguous"}
+
+    def classify(self, message: str):
+        """Return a result when confidence clears the threshold, else None"""
+        self.attempts += 1
+        result = self.predict(message)
+        if result["confidence"] >= self.threshold:
+            self.hits += 1
+            return result
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "attempts": self.attempts,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.attempts, 3) if self.attempts else 0.0,
+            "model_loaded": self.model is not None,
+            "threshold": self.threshold,
+        }
+
+
+# ============================================================================
+# OFFLINE TRAINING & REPORTING
+# ============================================================================
+
+def load_labeled_incidents(db_path: str) -> list:
+    """(id, message, category) for incidents classified by Gemini, excluding error fallbacks"""
+    with db.ConnectionPool(db_path, size=1).connection() as conn:
+        return conn.execute('''SELECT id, message, classification FROM incidents
+                               WHERE classified_by IN ('gemini', 'cache') AND confidence > 0.3''').fetchall()
+
+
+def _holdout(incident_id: str) -> bool:
+    """Stable 20% split so the report never scores the model on its training rows"""
+    return zlib.crc32(incident_id.encode()) % 5 == 0
+
+
+def train(db_path: str, out_path: str, exclude_holdout: bool = False) -> NaiveBayesModel:
+    rows = load_labeled_incidents(db_path)
+    examples = [(message, category) for incident_id, message, category in rows
+                if not (exclude_holdout and _holdout(incident_id))]
+    if not examples:
+        raise SystemExit("No Gemini-labeled incidents to train on")
+    model = NaiveBayesModel.train(examples)
+    if out_path:
+        with open(out_path, "w") as f:
+            json.dump(model.to_dict(), f)
+    print(f"✓ Trained on {len(examples)} incidents across {len(model.classes)} categories")
+    return model
+
+
+def report(db_path: str, threshold: float):
+    """Fast-path hit rate and agreement with Gemini on held-out history"""
+    rows = load_labeled_incidents(db_path)
+    holdout = [(message, category) for incident_id, message, category in rows if _holdout(incident_id)]
+    model = train(db_path, None, exclude_holdout=True)
+
+    print(f"\nHeld-out incidents: {len(holdout)}   threshold: {threshold}")
+    print(f"{'classifier':<14}{'hit rate':>10}{'agreement':>12}")
+    for label, classifier in (("rules only", FastClassifier(None, threshold)),
+                              ("rules + model", FastClassifier(model, threshold))):
+        agreed = 0
+        for message, category in holdout:
+            result = classifier.classify(message)
+            if result and result["category"] == category:
+                agreed += 1
+        hit_rate = classifier.hits / len(holdout) if holdout else 0.0
+        agreement = agreed / classifier.hits if classifier.hits else 0.0
+        print(f"{label:<14}{hit_rate:>10.1%}{agreement:>12.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["train", "report"])
+    parser.add_argument("--db", default=os.getenv("INCIDENTS_DB", "incidents.db"))
+    parser.add_argument("--out", default=os.getenv("FAST_PATH_MODEL", "fast_classifier_model.json"))
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("FAST_PATH_THRESHOLD", "0.9")))
+    args = parser.parse_args()
+
+    if args.command == "train":
+        train(args.db, args.out)
+    else:
+        report(args.db, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
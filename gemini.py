@@ -0,0 +1,135 @@
+"""
+Gemini model handles with fixed instructions, plus token accounting.
+
+The SDK is slow to import, so it is imported and configured on first use.
+Each InstructedModel creates its GenerativeModel once. The model carries
+the static part of a prompt (role, taxonomy, output format), and a request
+adds only the per-call content. With SDK releases that support it, the
+static part is the model's system instruction. Older releases (0.3.x has
+no system instructions) send it as a fixed opening user/model exchange,
+built once and reused by every request.
+
+Token counts come from the response's usage metadata when the API returns
+it. When it doesn't (0.3.x responses carry none), they are estimated from
+text length and labelled `estimated`.
+"""
+
+import inspect
+import logging
+import math
+import os
+import threading
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4  # rough average for English text, used only when usage metadata is missing
+
+TOKENS = metrics.REGISTRY.histogram(
+    "gemini_tokens", "Tokens per Gemini call", ("model", "direction"),
+    buckets=(16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192))
+TOKENS_TOTAL = metrics.REGISTRY.counter(
+    "gemini_tokens_total", "Tokens sent to and received from Gemini (reported by the API or estimated)",
+    ("model", "direction", "source"))
+
+_sdk = None
+_sdk_lock = threading.Lock()
+
+
+def sdk():
+    """google.generativeai, imported and configured on first use"""
+    global _sdk
+    if _sdk is None:
+        with _sdk_lock:
+            if _sdk is None:
+                import google.generativeai as genai
+
+                genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+                _sdk = genai
+    return _sdk
+
+
+def response_text(response) -> str:
+    """Text of the first candidate, or '' if the reply has none"""
+    if not response or not response.candidates or not response.candidates[0].content \
+            or not response.candidates[0].content.parts:
+        return ""
+    return response.candidates[0].content.parts[0].text
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """True for the API's 429 (google.api_core ResourceExhausted) or a client-side equivalent"""
+    return type(error).__name__ in ("ResourceExhausted", "TooManyRequests") or getattr(error, "code", None) == 429
+
+
+class InstructedModel:
+    """One Gemini model handle bound to fixed instructions and default generation settings"""
+
+    def __init__(self, name: str, model_name: str, instructions: str, generation_config: dict = None):
+        self.name = name  # metric label, e.g. "classify"
+        self.model_name = model_name
+        self.instructions = instructions
+        self.generation_config = generation_config or {}
+        self._model = None
+        self._prefix = []  # fixed opening turns when the SDK has no system instructions
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.estimated_calls = 0
+
+    def handle(self):
+        """The GenerativeModel, created on first use"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    genai = sdk()
+                    if "system_instruction" in inspect.signature(genai.GenerativeModel).parameters:
+                        self._model = genai.GenerativeModel(self.model_name, system_instruction=self.instructions)
+                    else:
+                        self._prefix = [{"role": "user", "parts": [self.instructions]},
+                                        {"role": "model", "parts": ["Understood."]}]
+                        self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    async def generate(self, content: str, **generation_config):
+        """Send `content` after the fixed instructions; generation_config overrides the defaults"""
+        model = self.handle()
+        response = await model.generate_content_async(
+            self._prefix + [{"role": "user", "parts": [content]}],
+            generation_config={**self.generation_config, **generation_config},
+        )
+        self._account(content, response)
+        return response
+
+    def _account(self, content: str, response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None and getattr(usage, "prompt_token_count", None):
+            input_tokens, output_tokens, source = usage.prompt_token_count, usage.candidates_token_count, "reported"
+        else:
+            # System instructions and opening turns are billed as input on every call too
+            sent = len(self.instructions) + len(content) + sum(len(turn["parts"][0]) for turn in self._prefix[1:])
+            input_tokens = math.ceil(sent / CHARS_PER_TOKEN)
+            output_tokens = math.ceil(len(response_text(response)) / CHARS_PER_TOKEN)
+            source = "estimated"
+
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.estimated_calls += source == "estimated"
+        TOKENS.observe(input_tokens, model=self.name, direction="input")
+        TOKENS.observe(output_tokens, model=self.name, direction="output")
+        TOKENS_TOTAL.inc(input_tokens, model=self.name, direction="input", source=source)
+        TOKENS_TOTAL.inc(output_tokens, model=self.name, direction="output", source=source)
+        log.debug("gemini call", extra={"model": self.name, "input_tokens": input_tokens,
+                                        "output_tokens": output_tokens, "token_source": source})
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "estimated_calls": self.estimated_calls,
+        }
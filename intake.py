@@ -0,0 +1,202 @@
+"""
+Durable intake queue for incidents accepted with 202.
+
+In asynchronous mode POST /api/incidents only writes the raw incident to the
+`incident_intake` table as `received` and answers 202. Workers in the
+process holding the `intake` lease then claim due rows (`processing`), run
+sentiment, classification, the ticket and the acknowledgements, and store
+the incident. Inserting the incident, its acknowledgements and its reminder
+and deleting its intake row happen in one transaction
+(db.store_received_incident), so GET /api/incidents/{id} always finds
+exactly one of them: received -> processing -> open. A run that raises
+before that goes back to `received` with exponential backoff, and after
+`max_attempts` the row stays as `failed`.
+
+The table is the queue, so accepted incidents survive a restart. Rows that
+a dead process left `processing` go back to `received` when the next lease
+holder starts. At most `workers` incidents are in flight, and the backlog
+waits in SQLite rather than in memory.
+
+The pipeline stages are coroutines, so the workers are asyncio tasks on the
+app's event loop. start() and stop() may be called from the lease thread;
+they hand over to the loop.
+"""
+
+import asyncio
+import logging
+import time
+
+import db
+import metrics
+
+log = logging.getLogger(__name__)
+
+SQL_ACCEPT = '''INSERT INTO incident_intake
+    (incident_id, customer_id, channel, message, email, status, received_at, next_attempt_at, created_at)
+    VALUES (?, ?, ?, ?, ?, 'received', ?, ?, CURRENT_TIMESTAMP)'''
+SQL_CLAIM = '''SELECT incident_id, customer_id, channel, message, email, attempts, received_at, created_at
+    FROM incident_intake WHERE status = 'received' AND next_attempt_at <= ?
+    ORDER BY next_attempt_at LIMIT ?'''
+SQL_MARK_PROCESSING = "UPDATE incident_intake SET status = 'processing' WHERE incident_id = ?"
+SQL_MARK_RETRY = '''UPDATE incident_intake SET status = 'received', attempts = ?, last_error = ?, next_attempt_at = ?
+    WHERE incident_id = ?'''
+SQL_MARK_FAILED = "UPDATE incident_intake SET status = 'failed', attempts = ?, last_error = ? WHERE incident_id = ?"
+SQL_REQUEUE = "UPDATE incident_intake SET status = 'received' WHERE status = 'processing'"
+# A failed incident must not answer resubmissions of itself (see dedup.py)
+SQL_RELEASE_DEDUP = 'DELETE FROM incident_dedup WHERE incident_id = ?'
+# Kept by triggers on incident_intake (schema v14), so reading it costs no scan of the queue
+SQL_COUNTS = "SELECT key, count FROM stats_counters WHERE dimension = 'intake'"
+
+WAIT_SECONDS = metrics.REGISTRY.histogram(
+    "incident_intake_wait_seconds", "Time from 202 to a worker starting on the incident",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0))
+
+
+class IntakeQueue:
+    """Accepted incidents in SQLite, drained by a bounded pool of asyncio workers"""
+
+    def __init__(self, process, workers: int = 16, max_attempts: int = 5, backoff_seconds: float = 2.0,
+                 max_backoff_seconds: float = 300.0, poll_seconds: float = 1.0):
+        self.process = process  # async process(incident_id, customer_id, channel, message, email, created_at)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.poll_seconds = poll_seconds
+        self._loop = None
+        self._wakeup = None
+        self._dispatcher = None
+        self._tasks = set()
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Run the workers on `loop` (the app's event loop); call before start()"""
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+
+    @metrics.timed_query
+    def accept(self, incident_id: str, customer_id: str, channel: str, message: str, email: str = None):
+        """Persist a raw incident as `received`"""
+        now = time.time()
+        db.execute(SQL_ACCEPT, (incident_id, customer_id, channel, message, email, now, now))
+
+    def start(self):
+        """Requeue rows left `processing` and start claiming"""
+        db.execute(SQL_REQUEUE)
+        self._loop.call_soon_threadsafe(self._start_dispatcher)
+
+    def stop(self):
+        """Stop claiming; runs in flight finish, or are requeued at the next start if the loop ends first"""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._stop_dispatcher)
+
+    async def drain(self, timeout: float = 10.0):
+        """Stop claiming and give runs in flight `timeout` seconds to finish (call on the loop at shutdown)"""
+        self._stop_dispatcher()
+        if self._tasks:
+            _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+            for task in pending:
+                task.cancel()
+
+    def wake(self):
+        """Claim now instead of at the next poll (call after accepting)"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _start_dispatcher(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = self._loop.create_task(self._run())
+
+    def _stop_dispatcher(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            free = self.workers - len(self._tasks)
+            if free > 0:
+                try:
+                    rows = await self._loop.run_in_executor(None, self._claim, free)
+                except Exception as e:
+                    log.error("intake poll error: %s", e)
+                    rows = []
+                for row in rows:
+                    task = self._loop.create_task(self._process_one(row))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._finished)
+            # Woken by wake(), or by a worker freeing its slot
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def _finished(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        self._wakeup.set()
+
+    def _claim(self, limit: int) -> list:
+        with db.transaction(immediate=True) as conn:
+            rows = conn.execute(SQL_CLAIM, (time.time(), limit)).fetchall()
+            conn.executemany(SQL_MARK_PROCESSING, [(row[0],) for row in rows])
+        return rows
+
+    async def _process_one(self, row: tuple):
+        incident_id, customer_id, channel, message, email, attempts, received_at, created_at = row
+        if not attempts:
+            WAIT_SECONDS.observe(time.time() - received_at)
+        attempts += 1
+        try:
+            await self.process(incident_id, customer_id, channel, message, email, created_at)
+        except Exception as e:
+            permanent = attempts >= self.max_attempts
+            try:
+                recorded = await self._loop.run_in_executor(None, self._record_failure, incident_id, attempts,
+                                                            str(e), permanent)
+            except Exception as record_error:
+                # The row stays `processing` and is requeued at the next start
+                log.error("intake record error: %s", record_error, extra={"incident_id": incident_id})
+                return
+            if not recorded:
+                # The incident was stored (taking it off the queue) before the error; there is nothing to retry
+                self.processed += 1
+                log.error("error after incident was stored: %s", e, extra={"incident_id": incident_id})
+                return
+            if permanent:
+                self.failed += 1
+                log.error("incident processing failed: %s", e, extra={"incident_id": incident_id,
+                                                                       "attempts": attempts})
+            else:
+                self.retried += 1
+                log.warning("incident processing will be retried: %s", e,
+                            extra={"incident_id": incident_id, "attempts": attempts})
+            return
+        self.processed += 1
+
+    def _record_failure(self, incident_id: str, attempts: int, error: str, permanent: bool) -> bool:
+        """Mark a run failed or due for retry; False if the incident is no longer queued"""
+        with db.transaction() as conn:
+            if permanent:
+                if not conn.execute(SQL_MARK_FAILED, (attempts, error, incident_id)).rowcount:
+                    return False
+                conn.execute(SQL_RELEASE_DEDUP, (incident_id,))
+            else:
+                delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (attempts - 1))
+                if not conn.execute(SQL_MARK_RETRY, (attempts, error, time.time() + delay, incident_id)).rowcount:
+                    return False
+        return True
+
+    def stats(self) -> dict:
+        """Queue depth by status (from the table, so every process's incidents) and this process's outcomes"""
+        counts = dict(db.fetch_all(SQL_COUNTS))
+        return {
+            "received": counts.get("received", 0),
+            "processing": counts.get("processing", 0),
+            "failed": counts.get("failed", 0),
+            "in_flight": len(self._tasks),
+            "processed": self.processed,
+            "retried": self.retried,
+        }
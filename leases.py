@@ -0,0 +1,103 @@
+"""
+Leases that let several API worker processes share one incidents.db.
+
+Background duties (the reminder timer, the outbox pollers, the ticket
+reconciler) must run in exactly one process. Each duty has a row in the
+`leases` table; the process holding it runs the duty and renews the lease
+every `renew_seconds`. If the holder dies or hangs, the lease lapses after
+`ttl_seconds` and another worker takes the duty over. Leases are released
+at shutdown, so a restarted worker does not have to wait out the TTL.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+import db
+
+log = logging.getLogger(__name__)
+
+SQL_ACQUIRE = '''INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)
+    ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+    WHERE leases.owner = excluded.owner OR leases.expires_at < ?'''
+SQL_RELEASE = 'DELETE FROM leases WHERE name = ? AND owner = ?'
+
+
+class LeaseCoordinator:
+    """Runs each registered duty in whichever process holds its lease"""
+
+    def __init__(self, ttl_seconds: float = 30.0, renew_seconds: float = 10.0, owner: str = None):
+        self.ttl_seconds = ttl_seconds
+        self.renew_seconds = renew_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._duties = {}   # name -> (start, stop)
+        self._held = {}     # name -> local expiry (monotonic) of the last successful renewal
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def add(self, name: str, start, stop):
+        """Register a duty: `start()` when this process gains the lease, `stop()` when it loses it"""
+        self._duties[name] = (start, stop)
+
+    def start(self):
+        """Claim what is free right away, then keep renewing in the background"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self.renew_all()
+        self._thread = threading.Thread(target=self._run, name="lease-coordinator", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop held duties and release their leases for the next worker"""
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout)
+        for name in list(self._held):
+            self._drop(name)
+            try:
+                db.execute(SQL_RELEASE, (name, self.owner))
+            except Exception as e:
+                log.warning("lease release failed: %s", e, extra={"lease": name})
+
+    def held(self) -> list:
+        return sorted(self._held)
+
+    def _run(self):
+        while not self._stopping.wait(self.renew_seconds):
+            self.renew_all()
+
+    def renew_all(self):
+        for name in self._duties:
+            try:
+                acquired = self._try_acquire(name)
+            except Exception as e:
+                # DB busy or unavailable: keep running only while our last renewal is still valid
+                log.warning("lease renewal failed: %s", e, extra={"lease": name})
+                if name in self._held and time.monotonic() >= self._held[name] - self.renew_seconds:
+                    self._drop(name)
+                continue
+
+            if acquired:
+                if name not in self._held:
+                    log.info("lease acquired", extra={"lease": name, "owner": self.owner})
+                    self._duties[name][0]()
+                self._held[name] = time.monotonic() + self.ttl_seconds
+            elif name in self._held:
+                log.warning("lease lost", extra={"lease": name, "owner": self.owner})
+                self._drop(name)
+
+    def _try_acquire(self, name: str) -> bool:
+        now = time.time()
+        with db.transaction() as conn:
+            return conn.execute(SQL_ACQUIRE, (name, self.owner, now + self.ttl_seconds, now)).rowcount == 1
+
+    def _drop(self, name: str):
+        self._held.pop(name, None)
+        try:
+            self._duties[name][1]()
+        except Exception as e:
+            log.error("stopping %s failed: %s", name, e)
@@ -0,0 +1,198 @@
+"""
+Priority scheduler in front of Gemini.
+
+Every Gemini request first takes a slot from the scheduler. A slot needs a
+token from a token bucket (`rate_per_minute`, bursting up to `burst`) and a
+place under the concurrency cap. The default burst of 1 paces calls evenly,
+which no sliding-window quota of the same rate rejects. Requests that have
+to wait are served by priority, then in arrival order, so a flood of
+routine messages cannot push a fraud report into the model's rate limit.
+
+Backpressure: on arrival a request estimates its wait from the queue ahead
+of it. If that estimate, or its actual wait, exceeds `max_wait`, it gets
+SchedulerBusy with a retry-after hint instead of a slot. The API answers
+429 rather than holding a request until it times out. Routine traffic is
+shed first, because more requests are queued ahead of it. Callers that
+can wait (the intake workers) pass max_wait=None.
+
+When Gemini itself answers 429, penalize() empties the bucket for a pause,
+so queued requests wait instead of failing too.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import metrics
+
+URGENT, ELEVATED, ROUTINE = 0, 1, 2
+PRIORITY_NAMES = ("urgent", "elevated", "routine")
+
+WAIT_SECONDS = metrics.REGISTRY.histogram(
+    "llm_scheduler_wait_seconds", "Time Gemini requests queued for a scheduler slot", ("priority",))
+REJECTED = metrics.REGISTRY.counter(
+    "llm_scheduler_rejected_total", "Gemini requests turned away because the queue was too long", ("priority",))
+
+
+class SchedulerBusy(Exception):
+    """No slot within the caller's max_wait; retry after `retry_after` seconds"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Classifier busy, retry in {math.ceil(retry_after)}s")
+        self.retry_after = retry_after
+
+
+class LLMScheduler:
+    """Token bucket plus concurrency cap, granting slots to the most urgent waiter first"""
+
+    def __init__(self, rate_per_minute: float = 0, burst: int = 1, concurrency: int = 16,
+                 expected_call_seconds: float = 1.0):
+        self.rate = rate_per_minute / 60  # tokens per second; 0 means no rate limit
+        self.burst = burst
+        self.concurrency = concurrency
+        self.call_seconds = expected_call_seconds  # moving average of slot hold times, for wait estimates
+        self.admitted = [0] * len(PRIORITY_NAMES)
+        self._loop = None
+
+    def _reset(self, loop):
+        """Start empty on a new event loop (waiters of a finished loop can never be woken)"""
+        self._loop = loop
+        self._tokens = float(self.burst)
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._queue = []  # heap of (priority, sequence, future)
+        self._sequence = itertools.count()
+        self._timer = None
+
+    @asynccontextmanager
+    async def slot(self, priority: int = ROUTINE, max_wait: Optional[float] = None):
+        """Hold a slot for one Gemini call; raises SchedulerBusy if none is free within max_wait seconds"""
+        await self.acquire(priority, max_wait)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.call_seconds += 0.2 * (time.monotonic() - start - self.call_seconds)
+            self._in_flight -= 1
+            self._pump()
+
+    async def acquire(self, priority: int, max_wait: Optional[float]):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._reset(loop)
+        self.admitted[priority] += 1
+        if not self._queue and self._in_flight < self.concurrency and self._token_wait() == 0:
+            self._take()
+            WAIT_SECONDS.observe(0, priority=PRIORITY_NAMES[priority])
+            return
+
+        if max_wait is not None:
+            estimate = self.estimate_wait(priority)
+            if estimate > max_wait:
+                self._reject(priority)
+                raise SchedulerBusy(estimate)
+
+        start = time.monotonic()
+        future = loop.create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), future))
+        self._pump()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), max_wait)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()  # skipped by _pump
+                self._reject(priority)
+                raise SchedulerBusy(self.estimate_wait(priority))
+        except BaseException:
+            if future.done() and not future.cancelled():
+                self._in_flight -= 1  # granted as the caller went away
+                self._pump()
+            else:
+                future.cancel()
+            raise
+        WAIT_SECONDS.observe(time.monotonic() - start, priority=PRIORITY_NAMES[priority])
+
+    def estimate_wait(self, priority: int) -> float:
+        """Seconds until a new request at `priority` would get a slot, from what is queued ahead of it"""
+        if self._loop is None:
+            return 0.0
+        wait = self._token_wait()
+        ahead = sum(1 for p, _, future in self._queue if p <= priority and not future.done()) + 1
+        if self.rate:
+            wait = max(wait, (ahead - min(self._tokens, self.burst)) / self.rate)
+        busy = ahead - (self.concurrency - self._in_flight)
+        if busy > 0:
+            wait = max(wait, math.ceil(busy / self.concurrency) * self.call_seconds)
+        return wait
+
+    def penalize(self, seconds: float):
+        """Gemini reported its rate limit: grant nothing for `seconds`, then start from an empty bucket"""
+        if self._loop is None:
+            return
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+        self._refilled = self._paused_until
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._pump()
+
+    def _reject(self, priority: int):
+        self.admitted[priority] -= 1
+        REJECTED.inc(priority=PRIORITY_NAMES[priority])
+
+    def _token_wait(self) -> float:
+        """Refill the bucket; seconds until a token is available (0 if one is)"""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if not self.rate:
+            return 0.0
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def _take(self):
+        self._tokens -= 1
+        self._in_flight += 1
+
+    def _pump(self):
+        """Grant slots to the most urgent waiters while tokens and concurrency allow"""
+        while self._queue:
+            future = self._queue[0][2]
+            if future.done():  # timed out or cancelled
+                heapq.heappop(self._queue)
+                continue
+            if self._in_flight >= self.concurrency:
+                return  # the next release pumps again
+            wait = self._token_wait()
+            if wait > 0:
+                if self._timer is None:
+                    self._timer = self._loop.call_later(wait, self._on_timer)
+                return
+            heapq.heappop(self._queue)
+            self._take()
+            future.set_result(None)
+
+    def _on_timer(self):
+        self._timer = None
+        self._pump()
+
+    def stats(self) -> dict:
+        queued = [0] * len(PRIORITY_NAMES)
+        for priority, _, future in (self._queue if self._loop else ()):
+            if not future.done():
+                queued[priority] += 1
+        return {
+            "rate_per_minute": self.rate * 60,
+            "concurrency": self.concurrency,
+            "in_flight": self._in_flight if self._loop else 0,
+            "queued": dict(zip(PRIORITY_NAMES, queued)),
+            "admitted": dict(zip(PRIORITY_NAMES, self.admitted)),
+            "rejected": {name: int(REJECTED.value(priority=name)) for name in PRIORITY_NAMES},
+        }
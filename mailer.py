@@ -0,0 +1,201 @@
+"""
+Outbound mail: pooled SMTP sessions and a send queue.
+
+Opening smtplib.SMTP_SSL means a TCP connect, a TLS handshake and a login
+for every message. The pool keeps authenticated sessions open and checks
+idle ones with NOOP before reuse. A session that drops is reconnected and
+the message retried once. MailDispatcher drains a queue with a fixed number
+of worker threads, so callers only enqueue and get a Future back.
+"""
+
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+
+
+class PreparedTemplate:
+    """Template split once into static text and named fields.
+
+    Rendering joins pre-built segments instead of re-parsing the text.
+    """
+
+    _FIELD = re.compile(r"\{(\w+)\}")
+
+    def __init__(self, text: str):
+        self.segments = []  # (is_field, value)
+        position = 0
+        for match in self._FIELD.finditer(text):
+            self.segments.append((False, text[position:match.start()]))
+            self.segments.append((True, match.group(1)))
+            position = match.end()
+        self.segments.append((False, text[position:]))
+
+    def render(self, **fields) -> str:
+        return "".join(str(fields[value]) if is_field else value for is_field, value in self.segments)
+
+
+class SMTPConnectionPool:
+    """Keeps up to `size` logged-in SMTP sessions for reuse"""
+
+    def __init__(self, host: str, port: int, username: str, password: str, use_ssl: bool = True,
+                 size: int = 4, idle_check_seconds: float = 30.0, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.idle_check_seconds = idle_check_seconds
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.connects = 0
+        self.reconnects = 0
+
+    def _connect(self):
+        import smtplib  # deferred: only needed once mail is actually sent
+
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.username:
+            server.login(self.username, self.password)
+        self.connects += 1
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _checkout(self):
+        """Reuse an idle session (verified with NOOP if it sat idle), else connect"""
+        while True:
+            try:
+                server, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - last_used < self.idle_check_seconds:
+                return server
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except OSError:  # includes SMTPException
+                pass
+            self._close(server)
+
+    def send(self, msg) -> None:
+        """Send a message on a pooled session, reconnecting once if it dropped"""
+        import smtplib
+
+        with self._slots:
+            server = self._checkout()
+            try:
+                with metrics.external_call("smtp"):
+                    try:
+                        server.send_message(msg)
+                    except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError):
+                        self._close(server)
+                        self.reconnects += 1
+                        server = self._connect()
+                        server.send_message(msg)
+            except Exception:
+                # The session may be mid-transaction; don't hand it to the next sender
+                self._close(server)
+                raise
+            self._idle.put((server, time.monotonic()))
+
+    def close_all(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(server)
+
+
+class MailDispatcher:
+    """Queue of outgoing messages drained by `concurrency` worker threads"""
+
+    def __init__(self, pool: SMTPConnectionPool, sender: str, concurrency: int = 4):
+        self.pool = pool
+        self.sender = sender
+        self.concurrency = concurrency
+        self._queue = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+
+    def start(self):
+        with self._lock:
+            if self._workers:
+                return
+            for n in range(self.concurrency):
+                worker = threading.Thread(target=self._run, name=f"mail-worker-{n}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._queue.put(None)
+        for worker in workers:
+            worker.join(timeout)
+        self.pool.close_all()
+
+    def build_message(self, recipient: str, subject: str, body: str):
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.text import MIMEText
+
+        msg = MIMEMultipart('alternative')
+        msg['From'] = self.sender
+        msg['To'] = recipient
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+        return msg
+
+    def submit(self, recipient: str, subject: str, body: str) -> Future:
+        """Queue a message; the Future resolves to True once sent, or raises"""
+        self.start()
+        future = Future()
+        self._queue.put((self.build_message(recipient, subject, body), future))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            msg, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                self.pool.send(msg)
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                future.set_exception(e)
+            else:
+                with self._lock:
+                    self.sent += 1
+                future.set_result(True)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "connects": self.pool.connects,
+            "reconnects": self.pool.reconnects,
+        }
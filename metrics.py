@@ -0,0 +1,222 @@
+"""
+In-process counters and latency histograms, rendered in the Prometheus text
+exposition format for GET /metrics.
+
+Pipeline stages are timed with `stage()`. Besides feeding the
+`incident_stage_seconds` histogram, each stage is appended to the
+per-request timing list held in a context variable, which the API turns
+into a `Server-Timing` header. `timed()` wraps DB queries and external
+calls the same way, without the per-request part.
+"""
+
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (name, seconds) pairs for the request being served; None outside a request
+request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _label_key(labelnames: tuple, labels: dict) -> tuple:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram per label combination"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}  # label key -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += 1
+            series[-1] += seconds
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_label_key(self.labelnames, labels))
+        return series[-2] if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, hits in zip(self.buckets, series):
+                cumulative += hits
+                labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {series[-2]}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-2]}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-1]}"
+
+
+class CallbackMetric:
+    """Values read at scrape time from a function returning {label values tuple: value}"""
+
+    def __init__(self, name: str, metric_type: str, documentation: str, labelnames: tuple, read):
+        self.name = name
+        self.type = metric_type
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.read = read
+
+    def samples(self):
+        for key, value in sorted(self.read().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        self._metrics.setdefault(metric.name, metric)
+        return self._metrics[metric.name]
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._add(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, metric_type: str, documentation: str, labelnames: tuple, read):
+        """Expose a value owned elsewhere (e.g. a component's stats()) without double counting"""
+        self._metrics[name] = CallbackMetric(name, metric_type, documentation, labelnames, read)
+
+    def render(self) -> str:
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "incident_stage_seconds", "Time spent in each incident pipeline stage", ("stage",))
+STAGE_ERRORS = REGISTRY.counter(
+    "incident_stage_errors_total", "Pipeline stages that raised", ("stage",))
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_seconds", "SQLite data-access call latency", ("query",))
+DB_QUERY_ERRORS = REGISTRY.counter(
+    "db_query_errors_total", "SQLite data-access calls that raised", ("query",))
+EXTERNAL_CALL_SECONDS = REGISTRY.histogram(
+    "external_call_seconds", "Latency of calls to Gemini, the ticket API and SMTP", ("service",))
+EXTERNAL_CALL_ERRORS = REGISTRY.counter(
+    "external_call_errors_total", "External calls that failed or returned an unusable reply", ("service",))
+CLASSIFICATIONS = REGISTRY.counter(
+    "classifications_total", "Incident classifications by source (fast_path, cache, gemini, fallback)",
+    ("source",))
+
+
+@contextmanager
+def stage(name: str):
+    """Time one pipeline stage into the histogram and the current request's Server-Timing"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = request_timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+@contextmanager
+def timed(histogram: Histogram, errors: Counter, **labels):
+    """Observe the duration of a block, counting it as an error if it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        errors.inc(**labels)
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+
+def external_call(service: str):
+    """Time a call to Gemini, the ticket API or SMTP"""
+    return timed(EXTERNAL_CALL_SECONDS, EXTERNAL_CALL_ERRORS, service=service)
+
+
+def timed_query(func):
+    """Decorator timing a db.py function under its own name"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with timed(DB_QUERY_SECONDS, DB_QUERY_ERRORS, query=func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def server_timing(timings: list, total: float = None) -> str:
+    """Server-Timing header value, durations in milliseconds"""
+    parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
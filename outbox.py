@@ -0,0 +1,147 @@
+"""
+Notification outbox and per-channel delivery workers.
+
+Notifications are written to the `notifications` table as `pending` in the
+same transaction as the incident, so nothing is announced for an incident
+that was never stored, and nothing is lost if the process dies before
+sending. Each channel (email, sms, whatsapp) has its own poller and thread
+pool. A poller claims due rows, marks them `sending`, delivers them
+concurrently and records the outcomes of the round in one transaction.
+Failures are retried with exponential backoff until `max_attempts`, after
+which the row is `failed`.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import db
+
+log = logging.getLogger(__name__)
+
+SQL_MARK_SENT = '''UPDATE notifications SET status = 'sent', attempts = ?, sent_at = CURRENT_TIMESTAMP
+    WHERE id = ?'''
+SQL_MARK_FAILED = '''UPDATE notifications SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?'''
+SQL_MARK_RETRY = '''UPDATE notifications SET status = 'pending', attempts = ?, last_error = ?, next_attempt_at = ?
+    WHERE id = ?'''
+
+
+class PermanentDeliveryError(Exception):
+    """Delivery can never succeed (e.g. no recipient); don't retry"""
+
+
+class OutboxDispatcher:
+    """Drain pending notifications with one worker pool per channel"""
+
+    def __init__(self, deliver, workers_per_channel: dict, max_attempts: int = 5,
+                 backoff_seconds: float = 2.0, max_backoff_seconds: float = 300.0, poll_seconds: float = 1.0):
+        self.deliver = deliver  # deliver(channel, recipient, incident_id, ticket_id, message)
+        self.workers_per_channel = workers_per_channel
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.poll_seconds = poll_seconds
+        self._wakeups = {channel: threading.Event() for channel in workers_per_channel}
+        self._executors = {}
+        self._threads = []
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        # Rows claimed by a process that died mid-send (or by the previous lease holder) go back to the queue
+        db.execute("UPDATE notifications SET status = 'pending' WHERE status = 'sending'")
+        for channel, workers in self.workers_per_channel.items():
+            self._executors[channel] = ThreadPoolExecutor(max_workers=workers,
+                                                          thread_name_prefix=f"outbox-{channel}")
+            thread = threading.Thread(target=self._run, args=(channel,), name=f"outbox-{channel}-poller",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        for event in self._wakeups.values():
+            event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+        self._threads = []
+
+    def wake(self, channels=None):
+        """Poll now instead of at the next interval (call after enqueueing)"""
+        for channel in channels or self._wakeups:
+            event = self._wakeups.get(channel)
+            if event:
+                event.set()
+
+    def _run(self, channel: str):
+        wakeup = self._wakeups[channel]
+        while not self._stopping.is_set():
+            try:
+                rows = self._claim(channel, self.workers_per_channel[channel])
+            except Exception as e:
+                log.error("outbox poll error: %s", e, extra={"channel": channel})
+                rows = []
+
+            if rows:
+                futures = [self._executors[channel].submit(self._deliver_one, channel, row) for row in rows]
+                wait(futures)
+                try:
+                    self._record([future.result() for future in futures])
+                except Exception as e:
+                    # Rows stay 'sending' and are re-sent after the next restart or lease takeover
+                    log.error("outbox record error: %s", e, extra={"channel": channel})
+                continue
+
+            wakeup.wait(self.poll_seconds)
+            wakeup.clear()
+
+    def _claim(self, channel: str, limit: int) -> list:
+        with db.transaction(immediate=True) as conn:
+            rows = conn.execute(
+                '''SELECT id, incident_id, message, recipient, ticket_id, attempts FROM notifications
+                   WHERE status = 'pending' AND channel = ? AND next_attempt_at <= ?
+                   ORDER BY next_attempt_at LIMIT ?''', (channel, db.utc_timestamp(), limit)).fetchall()
+            conn.executemany("UPDATE notifications SET status = 'sending' WHERE id = ?",
+                             [(row[0],) for row in rows])
+        return rows
+
+    def _record(self, outcomes: list):
+        """Write a round's (sql, params) outcomes in one transaction"""
+        with db.transaction() as conn:
+            for sql, params in outcomes:
+                conn.execute(sql, params)
+
+    def _deliver_one(self, channel: str, row: tuple) -> tuple:
+        """Attempt one delivery; returns the (sql, params) that records the outcome"""
+        notification_id, incident_id, message, recipient, ticket_id, attempts = row
+        attempts += 1
+        try:
+            self.deliver(channel, recipient, incident_id, ticket_id, message)
+        except Exception as e:
+            permanent = isinstance(e, PermanentDeliveryError) or attempts >= self.max_attempts
+            if permanent:
+                with self._lock:
+                    self.failed += 1
+                log.error("notification failed: %s", e,
+                          extra={"incident_id": incident_id, "channel": channel, "notification_id": notification_id,
+                                 "attempts": attempts})
+                return SQL_MARK_FAILED, (attempts, str(e), notification_id)
+            delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (attempts - 1))
+            with self._lock:
+                self.retried += 1
+            return SQL_MARK_RETRY, (attempts, str(e), db.utc_timestamp(delay), notification_id)
+
+        with self._lock:
+            self.sent += 1
+        return SQL_MARK_SENT, (attempts, notification_id)
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "failed": self.failed, "retried": self.retried}
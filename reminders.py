@@ -0,0 +1,137 @@
+"""
+Durable 24-hour reminder scheduler.
+
+Pending reminders live in the `reminders` table of incidents.db, so they
+survive restarts. A single background thread sleeps until the earliest
+pending `due_at`, then delivers due reminders in batches. Resolving an
+incident cancels its reminder row, so the scheduler never wakes for it.
+With several worker processes only one runs the timer, so it also wakes
+every `max_sleep_seconds` to see reminders the other processes scheduled.
+"""
+
+import logging
+import threading
+from datetime import datetime
+
+import db
+
+log = logging.getLogger(__name__)
+
+
+class ReminderScheduler:
+    """Single-thread timer loop over the reminders table"""
+
+    def __init__(self, deliver, delay_seconds: int = 86400, batch_size: int = 100, max_sleep_seconds: float = 60.0):
+        self.deliver = deliver
+        self.delay_seconds = delay_seconds
+        self.batch_size = batch_size
+        self.max_sleep_seconds = max_sleep_seconds
+        self._wakeup = threading.Condition()
+        self._next_due = None
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        """Start the timer thread; reminders persisted before a restart are picked up"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Ask the timer thread to exit and wait for it"""
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def schedule(self, incident_id: str, email: str, channel: str, ticket_id: str):
+        """Persist a reminder due `delay_seconds` from now"""
+        self.schedule_many([(incident_id, email, channel, ticket_id)])
+
+    def schedule_many(self, reminders: list):
+        """Persist (incident_id, email, channel, ticket_id) reminders in one transaction"""
+        rows = [self.reminder_row(*reminder) for reminder in reminders]
+        with db.transaction() as conn:
+            conn.executemany(db.SQL_INSERT_REMINDER, rows)
+        if rows:
+            self.scheduled(rows[0][4])
+
+    def reminder_row(self, incident_id: str, email: str, channel: str, ticket_id: str) -> tuple:
+        """db.SQL_INSERT_REMINDER parameters for a reminder due `delay_seconds` from now.
+
+        For callers that insert it in their own transaction; pass its due_at to
+        scheduled() once that commits.
+        """
+        return incident_id, channel, email, ticket_id, db.utc_timestamp(self.delay_seconds)
+
+    def scheduled(self, due_at: str):
+        """Wake the timer if a reminder due at `due_at` is earlier than what it sleeps on"""
+        with self._wakeup:
+            if self._next_due is None or due_at < self._next_due:
+                self._next_due = due_at
+                self._wakeup.notify()
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                if self._stopping:
+                    return
+                # From here on, _next_due is only set by a schedule() racing with the queries below
+                self._next_due = None
+
+            try:
+                while self._deliver_due_batch() == self.batch_size:
+                    pass
+                next_due = self._earliest_pending()
+            except Exception as e:
+                log.error("reminder scheduler error: %s", e)
+                next_due = None
+
+            with self._wakeup:
+                if self._stopping:
+                    return
+                # A schedule() call may have raced with the query above
+                if self._next_due and (next_due is None or self._next_due < next_due):
+                    next_due = self._next_due
+                self._next_due = next_due
+                wait_seconds = self.max_sleep_seconds
+                if next_due is not None:
+                    due_in = (datetime.strptime(next_due, '%Y-%m-%d %H:%M:%S') - datetime.utcnow()).total_seconds()
+                    wait_seconds = min(wait_seconds, due_in)
+                if wait_seconds > 0:
+                    self._wakeup.wait(wait_seconds)
+
+    def _earliest_pending(self):
+        row = db.fetch_one("SELECT MIN(due_at) FROM reminders WHERE status = 'pending'")
+        return row[0] if row else None
+
+    def _deliver_due_batch(self) -> int:
+        """Deliver one batch of due reminders; returns how many were handled"""
+        now = db.utc_timestamp()
+        rows = db.fetch_all('''SELECT r.incident_id, r.email, r.channel, r.ticket_id, i.status
+                               FROM reminders r LEFT JOIN incidents i ON i.id = r.incident_id
+                               WHERE r.status = 'pending' AND r.due_at <= ?
+                               ORDER BY r.due_at LIMIT ?''', (now, self.batch_size))
+
+        outcomes = []
+        for incident_id, email, channel, ticket_id, incident_status in rows:
+            outcome = 'cancelled'
+            if incident_status == 'open':
+                try:
+                    self.deliver(incident_id, email, channel, ticket_id)
+                    outcome = 'sent'
+                except Exception as e:
+                    log.error("reminder delivery failed: %s", e, extra={"incident_id": incident_id})
+                    outcome = 'failed'
+            outcomes.append((outcome, incident_id))
+
+        # One write transaction per batch rather than per reminder
+        with db.transaction() as conn:
+            conn.executemany('UPDATE reminders SET status = ? WHERE incident_id = ?', outcomes)
+            conn.executemany('UPDATE incidents SET reminder_sent = 1 WHERE id = ?',
+                             [(incident_id,) for outcome, incident_id in outcomes if outcome == 'sent'])
+
+        return len(rows)
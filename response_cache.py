@@ -0,0 +1,163 @@
+"""
+Read-through cache for the per-incident GET endpoints.
+
+Agent dashboards poll GET /api/incidents/{id} and GET /api/notifications/{id}
+far more often than either changes. Each worker keeps an LRU of rendered
+JSON bodies per incident, one per request variant (e.g. a notification
+page's limit and cursor). A hit costs no query and no Pydantic model. Each
+body carries a content-hash ETag, which is the same in every worker, so a
+client that already has the current version gets 304.
+
+Invalidation comes from the database. Triggers on incidents, incident_intake
+and notifications append the incident's ID to `incident_changes` on every
+write, whichever process or module makes it: resolve, reminders, the outbox,
+the ticket reconciler, the intake workers. At most every `sync_seconds`, a
+worker reads the changes after the last sequence number it saw and drops
+those incidents. The API's own writes also invalidate directly, so callers
+read their own changes at once. Writes by background duties and other
+workers show up within `sync_seconds`.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import db
+import metrics
+
+SQL_LATEST_CHANGE = 'SELECT COALESCE(MAX(seq), 0) FROM incident_changes'
+SQL_CHANGES_AFTER = 'SELECT seq, incident_id FROM incident_changes WHERE seq > ? ORDER BY seq LIMIT ?'
+
+SYNC_BATCH = 5000
+
+
+class CachedResponse(NamedTuple):
+    """A rendered JSON body and what is needed to revalidate it"""
+    body: bytes
+    headers: dict
+    etag: str
+    loaded_at: float  # wall-clock time it was read from the database
+
+    def last_modified(self, now: float = None) -> Optional[float]:
+        """Whole second no earlier than the last change; None until that second has passed.
+
+        Withholding it during the second the body was loaded means any client
+        holding a Last-Modified of T received it at or after T, so a body
+        reloaded after a change always gets a later one.
+        """
+        second = math.ceil(self.loaded_at)
+        return second if (time.time() if now is None else now) >= second else None
+
+
+class ResponseCache:
+    """Per-worker LRU of rendered responses, invalidated from the incident_changes log"""
+
+    def __init__(self, max_incidents: int = 10000, sync_seconds: float = 0.5):
+        self.max_incidents = max_incidents
+        self.sync_seconds = sync_seconds
+        self._incidents = OrderedDict()  # incident_id -> {variant: CachedResponse}
+        self._lock = threading.Lock()
+        self._seq = None           # last incident_changes row applied
+        self._next_sync = 0.0
+        self.generation = 0        # bumped on every invalidation; see put()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_entry(body: bytes, headers: dict = None) -> CachedResponse:
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        return CachedResponse(body, dict(headers or {}), etag, time.time())
+
+    def get(self, incident_id: str, variant: tuple = ()) -> Optional[CachedResponse]:
+        with self._lock:
+            variants = self._incidents.get(incident_id)
+            entry = variants.get(variant) if variants else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._incidents.move_to_end(incident_id)
+            self.hits += 1
+            return entry
+
+    def put(self, incident_id: str, variant: tuple, body: bytes, headers: dict = None,
+            generation: int = None) -> CachedResponse:
+        """Cache a body read from the database; returns its entry either way.
+
+        `generation` is the value of self.generation before the read. If
+        anything was invalidated since, the read may predate that change, so
+        it is returned but not cached.
+        """
+        entry = self.make_entry(body, headers)
+        if self.max_incidents <= 0:
+            return entry
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return entry
+            self._incidents.setdefault(incident_id, {})[variant] = entry
+            self._incidents.move_to_end(incident_id)
+            while len(self._incidents) > self.max_incidents:
+                self._incidents.popitem(last=False)
+        return entry
+
+    def invalidate(self, *incident_ids: str):
+        with self._lock:
+            self._drop(incident_ids)
+
+    def _drop(self, incident_ids):
+        self.generation += 1
+        for incident_id in incident_ids:
+            if self._incidents.pop(incident_id, None) is not None:
+                self.invalidations += 1
+
+    def sync_due(self) -> bool:
+        """True at most once per sync_seconds; the caller then runs sync_changes() before serving"""
+        now = time.monotonic()
+        with self._lock:
+            if self.max_incidents <= 0 or now < self._next_sync:
+                return False
+            self._next_sync = now + self.sync_seconds
+            return True
+
+    @metrics.timed_query
+    def sync_changes(self):
+        """Drop incidents written since the last sync, by this or any other process"""
+        try:
+            if self._seq is None:
+                # Start from the end of the log and forget anything read before this point
+                seq = db.fetch_one(SQL_LATEST_CHANGE)[0]
+                with self._lock:
+                    self._incidents.clear()
+                    self.generation += 1
+                    self._seq = seq
+                return
+            while True:
+                rows = db.fetch_all(SQL_CHANGES_AFTER, (self._seq, SYNC_BATCH))
+                if not rows:
+                    return
+                with self._lock:
+                    if rows[0][0] != self._seq + 1:
+                        # The log was pruned past the last change applied here
+                        self._incidents.clear()
+                        self.generation += 1
+                    else:
+                        self._drop({incident_id for _, incident_id in rows})
+                    self._seq = rows[-1][0]
+                if len(rows) < SYNC_BATCH:
+                    return
+        except Exception:
+            self._next_sync = 0.0  # retry on the next read rather than serve unsynced entries
+            raise
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "incidents": len(self._incidents),
+        }
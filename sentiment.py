@@ -0,0 +1,63 @@
+"""
+Shared VADER sentiment engine.
+
+The lexicon is loaded and parsed once per process instead of once per
+request. Scores for repeated texts are memoized, and lists of messages can
+be scored in one call.
+"""
+
+import functools
+import threading
+
+
+def label_for(compound: float) -> str:
+    """Map a VADER compound score onto negative / neutral / positive"""
+    if compound >= 0.05:
+        return "positive"
+    if compound <= -0.05:
+        return "negative"
+    return "neutral"
+
+
+class SentimentEngine:
+    """Lazily initialized, thread-safe wrapper around SentimentIntensityAnalyzer"""
+
+    def __init__(self, memo_size: int = 4096):
+        self._analyzer = None
+        self._lock = threading.Lock()
+        self._score_cached = functools.lru_cache(maxsize=memo_size)(self._score_uncached)
+
+    def warm(self):
+        """Load the VADER lexicon (downloading it if missing) exactly once"""
+        if self._analyzer is not None:
+            return
+        with self._lock:
+            if self._analyzer is not None:
+                return
+            import nltk
+            from nltk.sentiment import SentimentIntensityAnalyzer
+
+            try:
+                # nltk.download() installs the lexicon as a zip
+                nltk.data.find('sentiment/vader_lexicon.zip')
+            except LookupError:
+                nltk.download('vader_lexicon', quiet=True)
+            self._analyzer = SentimentIntensityAnalyzer()
+
+    def _score_uncached(self, message: str) -> tuple:
+        compound = self._analyzer.polarity_scores(message)['compound']
+        return label_for(compound), round(compound, 2)
+
+    def score(self, message: str) -> dict:
+        self.warm()
+        sentiment, compound = self._score_cached(message)
+        return {"sentiment": sentiment, "compound": compound}
+
+    def score_batch(self, messages: list) -> list:
+        """Score several messages; duplicates within the batch are scored once"""
+        self.warm()
+        return [dict(zip(("sentiment", "compound"), self._score_cached(m))) for m in messages]
+
+    def stats(self) -> dict:
+        info = self._score_cached.cache_info()
+        return {"memo_hits": info.hits, "memo_misses": info.misses, "memo_entries": info.currsize}
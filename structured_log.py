@@ -0,0 +1,151 @@
+"""
+Structured logging for the API and its background workers.
+
+Handlers on the request path only build a LogRecord and put it on a queue;
+a writer thread renders queued records (one JSON object per line by default)
+and writes them out in batches, so a slow or blocked log sink never stalls
+a request. The incident being processed is kept in a context variable
+and stamped onto every record as `incident_id`, so all lines belonging to
+one incident can be grepped or joined together.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+
+incident_id_var = contextvars.ContextVar("incident_id", default=None)
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(incident_id)s] %(message)s"
+
+WRITE_BATCH = 512
+
+_writer = None
+
+
+def bind_incident(incident_id: str):
+    """Tag log records from the current context (and executors it hands work to) with an incident"""
+    return incident_id_var.set(incident_id)
+
+
+class CorrelationFilter(logging.Filter):
+    """Copy the bound incident ID onto the record in the logging thread"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "incident_id", None) is None:
+            record.incident_id = incident_id_var.get()
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg, incident_id and any `extra` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread.
+
+    The stock prepare() renders the message in the caller; records here are
+    only read by the listener, so they are queued as-is.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class BatchWriter:
+    """Drain a record queue on one thread, writing each batch with a single write and flush"""
+
+    def __init__(self, records: queue.SimpleQueue, stream, formatter: logging.Formatter):
+        self.records = records
+        self.stream = stream
+        self.formatter = formatter
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Write everything already queued, then end the thread"""
+        self.records.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            batch = [self.records.get()]
+            while len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for record in batch:
+                if record is None:
+                    continue
+                try:
+                    lines.append(self.formatter.format(record))
+                except Exception:
+                    lines.append(json.dumps({"level": "ERROR", "logger": "structured_log",
+                                             "msg": f"unformattable record from {record.name}"}))
+            if lines:
+                try:
+                    self.stream.write("\n".join(lines) + "\n")
+                    self.stream.flush()
+                except Exception:
+                    pass  # a broken sink must not kill the writer
+            if None in batch:
+                return
+
+
+def configure(level: str = "INFO", fmt: str = "json", stream=None) -> BatchWriter:
+    """Route the root logger through a queue to a background writer thread"""
+    global _writer
+    shutdown()
+
+    records = queue.SimpleQueue()
+    handler = DeferredQueueHandler(records)
+    handler.addFilter(CorrelationFilter())
+
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    formatter = JSONFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+    _writer = BatchWriter(records, stream or sys.stdout, formatter)
+    _writer.start()
+    return _writer
+
+
+def shutdown():
+    """Detach the queue handler, then flush queued records and stop the writer thread"""
+    global _writer
+    root = logging.getLogger()
+    for existing in [h for h in root.handlers if isinstance(h, DeferredQueueHandler)]:
+        root.removeHandler(existing)
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+
+
+atexit.register(shutdown)
@@ -0,0 +1,193 @@
+"""
+Ticketing API client with connection pooling and a circuit breaker.
+
+One long-lived requests.Session keeps connections to the ticket API alive
+across incidents. After `failure_threshold` consecutive failures the
+breaker opens, and incidents get a local `TKT-...` ID immediately instead
+of waiting out the timeout. After `reset_seconds` a single trial request is
+let through (half-open); if it succeeds the breaker closes again.
+TicketReconciler later replaces local IDs with real tickets once the API
+is back.
+"""
+
+import logging
+import threading
+import time
+import uuid
+
+import db
+import metrics
+
+log = logging.getLogger(__name__)
+
+
+LOCAL_TICKET_PREFIX = "TKT-"
+
+
+def local_ticket_id() -> str:
+    return f"{LOCAL_TICKET_PREFIX}{str(uuid.uuid4())[:8]}"
+
+
+class CircuitBreaker:
+    """closed -> open after N failures -> half_open after a cooldown -> closed"""
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a request may go out now"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class TicketClient:
+    """Pooled HTTP client for the external ticketing API"""
+
+    def __init__(self, url: str, timeout: float = 5.0, pool_size: int = 16, breaker: CircuitBreaker = None):
+        self.url = url
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.pool_size = pool_size
+        self._session = None
+        self._session_lock = threading.Lock()
+        self.created = 0
+        self.fallbacks = 0
+
+    @property
+    def session(self):
+        """requests.Session with a keep-alive pool, created (and requests imported) on first use"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    def request_ticket(self, incident_id: str, classification: str, message: str):
+        """POST a ticket; returns the remote ID, or None if the API is unavailable"""
+        if not self.breaker.allow():
+            return None
+
+        payload = {
+            "name": f"Incident {incident_id}: {classification}",
+            "description": message,
+            "status": "open"
+        }
+        try:
+            with metrics.external_call("ticket_api"):
+                response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            if response.status_code == 201:
+                self.breaker.record_success()
+                return str(response.json().get('id', str(uuid.uuid4())))
+            metrics.EXTERNAL_CALL_ERRORS.inc(service="ticket_api")
+            log.warning("ticket API error: HTTP %d", response.status_code, extra={"incident_id": incident_id})
+        except Exception as e:
+            log.warning("ticket API error: %s", e, extra={"incident_id": incident_id})
+        self.breaker.record_failure()
+        return None
+
+    def create_ticket(self, incident_id: str, classification: str, message: str) -> str:
+        """Remote ticket ID when possible, else a local ID to reconcile later"""
+        ticket_id = self.request_ticket(incident_id, classification, message)
+        if ticket_id is None:
+            self.fallbacks += 1
+            return local_ticket_id()
+        self.created += 1
+        return ticket_id
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+    def stats(self) -> dict:
+        return {"created": self.created, "fallbacks": self.fallbacks, "breaker": self.breaker.state}
+
+
+class TicketReconciler:
+    """Background thread that swaps local TKT- IDs for real tickets"""
+
+    def __init__(self, client: TicketClient, interval_seconds: float = 60.0, batch_size: int = 50):
+        self.client = client
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self._stopping = threading.Event()
+        self._thread = None
+        self.reconciled = 0
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="ticket-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stopping.wait(self.interval_seconds):
+            try:
+                self.reconcile_batch()
+            except Exception as e:
+                log.error("ticket reconciliation error: %s", e)
+
+    def reconcile_batch(self) -> int:
+        """Reconcile up to `batch_size` incidents; stops early if the API fails again"""
+        rows = db.fetch_all(f'''SELECT id, classification, message, ticket_id FROM incidents
+                                WHERE ticket_id LIKE '{LOCAL_TICKET_PREFIX}%'
+                                ORDER BY created_at LIMIT ?''', (self.batch_size,))
+        done = 0
+        for incident_id, classification, message, local_id in rows:
+            ticket_id = self.client.request_ticket(incident_id, classification, message)
+            if ticket_id is None:
+                break
+            # Everything that can still hand the local ID to the customer switches with the incident:
+            # its pending reminder and the responses replayed to retries and resends
+            with db.transaction() as conn:
+                conn.execute('UPDATE incidents SET ticket_id = ? WHERE id = ? AND ticket_id = ?',
+                             (ticket_id, incident_id, local_id))
+                conn.execute('UPDATE reminders SET ticket_id = ? WHERE incident_id = ? AND ticket_id = ?',
+                             (ticket_id, incident_id, local_id))
+                conn.execute('''UPDATE incident_dedup SET response = json_set(response, '$.ticket_id', ?)
+                                WHERE incident_id = ? AND json_extract(response, '$.ticket_id') = ?''',
+                             (ticket_id, incident_id, local_id))
+            log.info("ticket reconciled", extra={"incident_id": incident_id, "local_ticket_id": local_id,
+                                                 "ticket_id": ticket_id})
+            done += 1
+        self.reconciled += done
+        return done